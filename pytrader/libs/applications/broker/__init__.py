@@ -35,6 +35,7 @@ from pytrader.libs.system import logging
 
 # Other Application Libraries
 from pytrader import BROKER_ID, CLIENT_ID, git_branch
+from pytrader.libs.applications.broker.common.orders import OrderNetting
 from pytrader.libs.applications.broker.ibkr.tws import TwsDataThread
 from pytrader.libs.clients.broker.ibkr.tws import TwsApiClient
 from pytrader.libs.utilities.exceptions import BrokerNotAvailable
@@ -66,9 +67,20 @@ class BrokerProcess():
                  data_queue: dict,
                  address: str = "127.0.0.1",
                  broker_id: str = BROKER_ID,
-                 client_id: int = CLIENT_ID):
+                 client_id: int = CLIENT_ID,
+                 warmup_mode: bool = False,
+                 order_queue: dict = None,
+                 netting_window: float = 0.0):
         """!
         Creates an instance of the BrokerProcess.
+
+        In warm-up mode orders are not placed.
+
+        Each strategy's order queue is serviced by its own thread, so orders never wait behind
+        commands on the command queue.
+
+        With a netting window, market orders for the same contract are netted across strategies
+        before being sent to the broker.
         """
         self.address = address
         self.cmd_queue = cmd_queue
@@ -76,6 +88,7 @@ class BrokerProcess():
         self.available_ports = []
         self.contracts = {}
         self.client_id = client_id
+        self.warmup_mode = warmup_mode
         broker_client_class = {"twsapi": TwsApiClient()}
         broker_class = {"twsapi": TwsDataThread()}
         self.brokerclient = broker_client_class.get(broker_id)
@@ -83,7 +96,15 @@ class BrokerProcess():
         self.broker_queue = queue.Queue()
         self.data_response.set_attributes(self.brokerclient, self.data_queue, self.broker_queue)
         self.data_thread = threading.Thread(target=self.data_response.run, daemon=True)
+        self.order_queue = order_queue if order_queue is not None else {}
+        self.order_threads = {}
         self.strategies = []
+        self.order_netting = None
+
+        if netting_window > 0:
+            self.order_netting = OrderNetting(netting_window, self.data_response.create_order,
+                                              self.broker_queue.put, self.data_response.get_price)
+            self.data_response.set_order_netting(self.order_netting)
 
     def run(self):
         """!
@@ -108,6 +129,9 @@ class BrokerProcess():
                     broker_connection = self.brokerclient.is_connected()
         except KeyboardInterrupt:
             logger.critical("Received Keyboard Interrupt! Shutting down the Broker Client.")
+        finally:
+            for order_queue in self.order_queue.values():
+                order_queue.put("Quit")
 
     def set_strategies(self, strategy_list: list):
         self.strategies = strategy_list
@@ -122,8 +146,19 @@ class BrokerProcess():
         """!
         Send Cancel Order to data_response thread.
         """
+        if self.order_netting is not None and self.order_netting.cancel_order(order_id):
+            return
+
         self.data_response.cancel_order(order_id)
 
+    def _cancel_cmd(self, subcommand: dict, strategy_id: str) -> None:
+        """!
+        Processes any subcommand from the 'cancel' command received from the strategy process.
+        """
+        logger.debug4("Cancel Command: %s", subcommand)
+        if subcommand.get("tickers"):
+            self.data_response.cancel_tickers(subcommand["tickers"], strategy_id)
+
     def _check_if_ports_available(self, port: int) -> bool:
         """!
         Checks if a given port is available
@@ -149,11 +184,41 @@ class BrokerProcess():
 
         return False
 
+    def _modify_order(self, order_request: dict, strategy_id: str):
+        """!
+        Send an amended order to the data_response thread.
+        """
+        logger.debug9("Order Modification Received: %s", order_request)
+
+        if self.warmup_mode:
+            logger.warning("Warm-up mode, not modifying order from %s", strategy_id)
+            return
+
+        self.data_response.modify_order(order_request)
+
+    def _place_bracket(self, order_requests: list, strategy_id: str):
+        """!
+        Send each order of a bracket, parent first, to the data_response thread.
+        """
+        for order_request in order_requests:
+            self._place_order(order_request, strategy_id)
+
     def _place_order(self, order_request: dict, strategy_id: str):
         """!
         Send place order to data_response thread.
         """
         logger.debug9("Order Received: %s", order_request)
+
+        if self.warmup_mode:
+            logger.warning("Warm-up mode, not placing order from %s", strategy_id)
+            return
+
+        if self.order_netting is not None:
+            self.data_response.track_order(order_request["order"].orderId, strategy_id)
+
+            if self.order_netting.add_order(order_request, strategy_id):
+                return
+
         self.data_response.create_order(order_request, strategy_id)
 
     def _process_commands(self, cmd: dict, strategy_id: str) -> None:
@@ -162,11 +227,34 @@ class BrokerProcess():
             self._set_cmd(cmd["set"], strategy_id)
         if cmd.get("req"):
             self._req_cmd(cmd["req"], strategy_id)
+        self._process_order_commands(cmd, strategy_id)
+        if cmd.get("cancel"):
+            self._cancel_cmd(cmd["cancel"], strategy_id)
+
+    def _process_order_commands(self, cmd: dict, strategy_id: str) -> None:
         if cmd.get("place_order"):
             self._place_order(cmd["place_order"], strategy_id)
+        if cmd.get("place_bracket"):
+            self._place_bracket(cmd["place_bracket"], strategy_id)
+        if cmd.get("modify_order"):
+            self._modify_order(cmd["modify_order"], strategy_id)
         if cmd.get("cancel_order"):
             self._cancel_order(cmd["cancel_order"])
 
+    def _process_orders(self, order_queue: Queue) -> None:
+        """!
+        Places and cancels the orders received on a strategy's order queue.
+        """
+        while True:
+            cmd = order_queue.get()
+            logger.debug4("Order Command: %s", cmd)
+
+            if cmd == "Quit":
+                break
+
+            strategy_id = list(cmd.keys())[0]
+            self._process_order_commands(cmd[strategy_id], strategy_id)
+
     def _req_cmd(self, subcommand: dict, strategy_id: str):
         logger.debug4("Request Command: %s", subcommand)
         if subcommand == "bar_history":
@@ -214,8 +302,12 @@ class BrokerProcess():
             self.data_response.set_contracts(subcommand["tickers"], strategy_id)
             self.data_queue[strategy_id].put("Contracts Created")
         if subcommand.get("bar_sizes"):
-            self.data_response.set_bar_sizes(subcommand["bar_sizes"], strategy_id)
+            self.data_response.set_bar_sizes(subcommand["bar_sizes"], strategy_id,
+                                             subcommand.get("warmup_bars", {}),
+                                             subcommand.get("history_start", {}))
             self.data_queue[strategy_id].put("Bar Sizes Set")
+        if subcommand.get("tick_types"):
+            self.data_response.set_tick_types(subcommand["tick_types"], strategy_id)
 
     def _start_threads(self):
         """!
@@ -235,6 +327,12 @@ class BrokerProcess():
                 self.brokerclient.start_thread(self.broker_queue)
 
             self.data_thread.start()
+
+            for strategy_id, order_queue in self.order_queue.items():
+                self.order_threads[strategy_id] = threading.Thread(target=self._process_orders,
+                                                                   args=(order_queue, ),
+                                                                   daemon=True)
+                self.order_threads[strategy_id].start()
         else:
             raise BrokerNotAvailable("No ports detected.")
 
@@ -74,6 +74,9 @@ class BrokerDataThread():
         ## Next Order Id
         self.next_order_id = 0
 
+        ## Nets orders across strategies.  None when orders are placed as they are received.
+        self.order_netting = None
+
     def run(self):
         """!
         Provides the run loop for the data thread.
@@ -89,6 +92,13 @@ class BrokerDataThread():
             else:
                 self._parse_data(response_data)
 
+    @abstractmethod
+    def cancel_tickers(self, tickers: list, strategy_id: str):
+        """!
+        Abstract method to stop sending data for tickers to a strategy.
+        """
+        pass
+
     @abstractmethod
     def create_order(self, order_request):
         """!
@@ -96,6 +106,20 @@ class BrokerDataThread():
         """
         pass
 
+    @abstractmethod
+    def get_price(self, ticker: str):
+        """!
+        Abstract method to get the current price of a ticker with streaming market data.
+        """
+        pass
+
+    @abstractmethod
+    def modify_order(self, order_request: dict):
+        """!
+        Abstract method to send an amended order to the broker.
+        """
+        pass
+
     @abstractmethod
     def request_bar_history(self):
         """!
@@ -146,6 +170,24 @@ class BrokerDataThread():
         message = {"next_order_id": self.next_order_id}
         self.data_queue["Main"].put(message)
 
+    @abstractmethod
+    def send_commission_report(self, commission_report: dict):
+        """!
+        Sends the commission for an execution to the strategy.
+
+        @param commission_report: The commission report, keyed by execution id.
+        """
+        pass
+
+    @abstractmethod
+    def send_order_execution(self, order_execution: dict):
+        """!
+        Sends an order's execution to the strategy.
+
+        @param order_execution: The execution, keyed by order id.
+        """
+        pass
+
     @abstractmethod
     def send_order_status(self, order_status: dict):
         """!
@@ -175,7 +217,11 @@ class BrokerDataThread():
         self.queue = broker_queue
 
     @abstractmethod
-    def set_bar_sizes(self, bar_sizes: list, strategy_id: str):
+    def set_bar_sizes(self,
+                      bar_sizes: list,
+                      strategy_id: str,
+                      warmup_bars: dict = None,
+                      history_start: dict = None):
         """!
         Abstract method to set bar sizes.
         """
@@ -188,6 +234,23 @@ class BrokerDataThread():
         """
         pass
 
+    @abstractmethod
+    def set_tick_types(self, tick_types: list, strategy_id: str):
+        """!
+        Abstract method to set the market data tick types a strategy uses.
+        """
+        pass
+
+    def set_order_netting(self, order_netting) -> None:
+        self.order_netting = order_netting
+
+    @abstractmethod
+    def track_order(self, order_id: int, strategy_id: str):
+        """!
+        Abstract method to send an order's updates to the strategy that placed it.
+        """
+        pass
+
     # def send_ticks(self, contract: Contract, tick):
     #     """!
     #     Sends tick data to the strategies.
@@ -225,5 +288,12 @@ class BrokerDataThread():
             if self.next_order_id == 0:
                 self.next_order_id = response_data["next_order_id"]
                 self.send_order_id()
+        elif self.order_netting is not None and self.order_netting.allocate(response_data):
+            # Messages for a net order are replaced by messages for the orders it replaced.
+            pass
         elif response_data.get("order_status"):
             self.send_order_status(response_data["order_status"])
+        elif response_data.get("order_execution"):
+            self.send_order_execution(response_data["order_execution"])
+        elif response_data.get("commission_report"):
+            self.send_commission_report(response_data["commission_report"])
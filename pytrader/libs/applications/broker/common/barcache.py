@@ -0,0 +1,263 @@
+"""!
+@package pytrader.libs.applications.broker.common.barcache
+
+Stores historical bars on disk, so only new bars need to be requested from the broker.
+
+@author G. S. Derber
+@date 2022-2023
+@copyright GNU Affero General Public License
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU Affero General Public License as
+    published by the Free Software Foundation, either version 3 of the
+    License, or (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU Affero General Public License for more details.
+
+    You should have received a copy of the GNU Affero General Public License
+    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+
+@file pytrader/libs/applications/broker/common/barcache.py
+"""
+# Standard libraries
+import calendar
+import datetime
+import os
+
+# 3rd Party libraries
+import numpy
+
+# System Library Overrides
+from pytrader.libs.system import logging
+
+# Other Application Libraries
+
+# Conditional Libraries
+
+# ==================================================================================================
+#
+# Global Variables
+#
+# ==================================================================================================
+## The Base Logger
+logger = logging.getLogger(__name__)
+
+## Where cached bars are stored
+CACHE_DIR = os.path.expanduser("~") + "/.config/investing/cache"
+
+## Layout of a cached bar.  Matches the bar lists sent to the strategies, except the date is stored
+## in seconds since the epoch and formatted again when the bars are loaded.
+BAR_DTYPE = numpy.dtype([("date", numpy.int64), ("open", numpy.float64), ("high", numpy.float64),
+                         ("low", numpy.float64), ("close", numpy.float64),
+                         ("volume", numpy.float64), ("wap", numpy.float64),
+                         ("bar_count", numpy.int64)])
+
+## The date format of histories whose bar dates are already in seconds since the epoch.
+EPOCH_DATES = "epoch"
+
+
+# ==================================================================================================
+#
+# Classes
+#
+# ==================================================================================================
+class BarCache():
+    """!
+    Caches bar histories, one file per contract id, bar size, data type and trading hours.
+
+    The duration each history was first requested with is stored with it.  A cached history only
+    serves requests for the same duration, and is trimmed to the same number of bars as it grows.
+    """
+
+    def __init__(self, cache_dir: str = CACHE_DIR):
+        self.cache_dir = cache_dir
+
+    def get_bars(self, key: tuple, duration: str):
+        """!
+        Returns the cached bars for a request.
+
+        @param key: The contract id, bar size, data type and regular trading hours flag.
+        @param duration: The duration of the request.
+
+        @return bar_list: The cached bars, oldest first.  None if nothing is cached for the request.
+        """
+        filename = self._get_filename(key)
+
+        if not os.path.exists(filename):
+            return None
+
+        try:
+            with numpy.load(filename, allow_pickle=False) as cache_file:
+                if str(cache_file["duration"]) != duration:
+                    logger.debug3("Cached %s bars are for %s, not %s", key, cache_file["duration"],
+                                  duration)
+                    return None
+
+                if "date_format" not in cache_file:
+                    logger.debug3("Cached %s bars have no date format, ignoring them", key)
+                    return None
+
+                bars = cache_file["bars"]
+                date_format = str(cache_file["date_format"])
+                bar_list = [[_format_date(bar_date, date_format)] + list(cached_bar)
+                            for bar_date, *cached_bar in map(numpy.void.item, bars)]
+        except (OSError, ValueError, KeyError) as msg:
+            logger.warning("Unable to read cached bars from %s: %s", filename, msg)
+            return None
+
+        if len(bar_list) == 0:
+            return None
+
+        return bar_list
+
+    def save_bars(self, key: tuple, duration: str, bar_list: list):
+        """!
+        Saves a bar history.
+
+        @param key: The contract id, bar size, data type and regular trading hours flag.
+        @param duration: The duration the history was requested for.
+        @param bar_list: The bars, oldest first.  Every bar's date has the same format.
+
+        @return None
+        """
+        filename = self._get_filename(key)
+        date_format = _get_date_format(bar_list[0][0]) if bar_list else EPOCH_DATES
+
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            bars = numpy.array([(_parse_date(ohlc_bar[0], date_format), ) + tuple(ohlc_bar[1:])
+                                for ohlc_bar in bar_list],
+                               dtype=BAR_DTYPE)
+
+            # Written to a temporary file first, so an interrupted write never leaves a partial
+            # history behind.
+            with open(filename + ".tmp", "wb") as cache_file:
+                numpy.savez(cache_file,
+                            bars=bars,
+                            duration=numpy.array(duration),
+                            date_format=numpy.array(date_format))
+
+            os.replace(filename + ".tmp", filename)
+        except (OSError, ValueError, TypeError) as msg:
+            logger.warning("Unable to cache bars to %s: %s", filename, msg)
+
+    # ==============================================================================================
+    #
+    # Private Functions
+    #
+    # ==============================================================================================
+    def _get_filename(self, key: tuple):
+        con_id, bar_size, what_to_show, use_regular_trading_hours = key
+        trading_hours = "RTH" if use_regular_trading_hours else "ALL"
+        return f"{self.cache_dir}/{con_id}_{bar_size.replace(' ', '')}_{what_to_show}_" \
+            f"{trading_hours}.npz"
+
+
+# ==================================================================================================
+#
+# Functions
+#
+# ==================================================================================================
+def get_history_start(bar_list: list):
+    """!
+    Returns the start of the day of the last bar, as a timestamp.
+
+    Refetching from the start of that day refreshes the last bar, which may have been incomplete
+    when it was cached, whatever time zone the bar times are in.
+
+    @param bar_list: The bars, oldest first.
+
+    @return history_start: The timestamp.
+    """
+    last_date = _get_date_key(bar_list[-1][0])
+
+    if isinstance(last_date, int):
+        last_date = datetime.datetime.fromtimestamp(last_date).strftime("%Y%m%d")
+
+    return datetime.datetime.strptime(last_date[:8], "%Y%m%d").timestamp()
+
+
+def merge_bars(cached_bars: list, new_bars: list):
+    """!
+    Replaces the cached bars the new bars overlap, and appends the rest.
+
+    The history is trimmed to the length of the cached history, so it covers the same period as the
+    original request.
+
+    @param cached_bars: The cached bars, oldest first.
+    @param new_bars: The new bars, oldest first.
+
+    @return bar_list: The merged bars.
+    """
+    if len(new_bars) == 0:
+        return cached_bars
+
+    first_date = _get_date_key(new_bars[0][0])
+    bar_list = [
+        cached_bar for cached_bar in cached_bars if _get_date_key(cached_bar[0]) < first_date
+    ]
+    bar_list.extend(new_bars)
+    return bar_list[-max(len(cached_bars), len(new_bars)):]
+
+
+def _format_date(seconds: int, date_format: str):
+    """!
+    Returns a cached bar date in the format the bar was received in.
+    """
+    if date_format == EPOCH_DATES:
+        return str(seconds)
+
+    return datetime.datetime.fromtimestamp(seconds, datetime.timezone.utc).strftime(date_format)
+
+
+def _get_date_format(bar_date):
+    """!
+    Returns the strptime format of a bar's date.
+
+    Bar dates are "yyyyMMdd", or "yyyyMMdd HH:mm:ss" followed by the time zone in recent TWS
+    versions, when requested with format_date 1.  The separators and time zone are kept as they are.
+    """
+    bar_date = str(bar_date)
+
+    if bar_date.isdigit() and len(bar_date) > 8:
+        return EPOCH_DATES
+
+    time_start = len(bar_date) - len(bar_date[8:].lstrip())
+
+    if time_start == len(bar_date):
+        return "%Y%m%d"
+
+    return "%Y%m%d" + bar_date[8:time_start] + "%H:%M:%S" + \
+        bar_date[time_start + 8:].replace("%", "%%")
+
+
+def _get_date_key(bar_date):
+    """!
+    Returns a bar's date in a form that sorts by time.
+
+    Bar dates are "yyyyMMdd" or "yyyyMMdd HH:mm:ss" when requested with format_date 1, and seconds
+    since the epoch when requested with format_date 2.
+    """
+    bar_date = str(bar_date)
+
+    if bar_date.isdigit() and len(bar_date) > 8:
+        return int(bar_date)
+
+    return bar_date
+
+
+def _parse_date(bar_date, date_format: str):
+    """!
+    Returns a bar's date in seconds since the epoch.
+
+    Dates without a time zone are stored as though they were UTC, so they format back to the same
+    date whatever the local time zone.
+    """
+    if date_format == EPOCH_DATES:
+        return int(bar_date)
+
+    return calendar.timegm(datetime.datetime.strptime(str(bar_date), date_format).timetuple())
@@ -0,0 +1,182 @@
+"""!
+@package pytrader.libs.applications.broker.common.contractcache
+
+Stores contract details on disk, so they do not have to be requested from the broker on every
+start.
+
+@author G. S. Derber
+@date 2022-2023
+@copyright GNU Affero General Public License
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU Affero General Public License as
+    published by the Free Software Foundation, either version 3 of the
+    License, or (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU Affero General Public License for more details.
+
+    You should have received a copy of the GNU Affero General Public License
+    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+
+@file pytrader/libs/applications/broker/common/contractcache.py
+"""
+# Standard libraries
+import os
+import pickle
+import sqlite3
+import threading
+import time
+
+from contextlib import closing
+
+# 3rd Party libraries
+from ibapi.contract import Contract
+
+# System Library Overrides
+from pytrader.libs.system import logging
+
+# Other Application Libraries
+from pytrader.libs.applications.broker.common.barcache import CACHE_DIR
+
+# Conditional Libraries
+
+# ==================================================================================================
+#
+# Global Variables
+#
+# ==================================================================================================
+## The Base Logger
+logger = logging.getLogger(__name__)
+
+## Seconds cached contract details are used before they are requested again.
+CONTRACT_TTL = 7 * 86400
+
+## The contract fields that identify a contract details request.
+KEY_FIELDS = [
+    "conId", "symbol", "localSymbol", "secType", "exchange", "primaryExchange", "currency",
+    "lastTradeDateOrContractMonth", "strike", "right", "multiplier"
+]
+
+
+# ==================================================================================================
+#
+# Classes
+#
+# ==================================================================================================
+class ContractCache():
+    """!
+    Caches contract details in an SQLite database.
+
+    Details are keyed by the contract they were requested with, and also store the contract id they
+    resolved to.
+    """
+
+    def __init__(self, filename: str = CACHE_DIR + "/contracts.db", ttl: float = CONTRACT_TTL):
+        self.filename = filename
+        self.ttl = ttl
+        self.lock = threading.Lock()
+        self.initialized = False
+
+    def get_details(self, contract_: Contract):
+        """!
+        Returns the cached contract details for a contract.
+
+        Contracts with a contract id are looked up by it, so details cached from any request that
+        resolved to the same contract are used.
+
+        @param contract_: The contract the details were requested with.
+
+        @return contract_details: The contract details, or None if they are not cached or have
+            expired.
+        """
+        if contract_.conId:
+            return self.get_details_by_con_id(contract_.conId)
+
+        return self._load_details("SELECT updated, details FROM contracts WHERE key = ?",
+                                  (get_key(contract_), ), contract_.localSymbol)
+
+    def get_details_by_con_id(self, con_id: int):
+        """!
+        Returns the most recently cached contract details for a contract id.
+
+        @param con_id: The contract id the details resolved to.
+
+        @return contract_details: The contract details, or None if they are not cached or have
+            expired.
+        """
+        return self._load_details(
+            "SELECT updated, details FROM contracts WHERE con_id = ? ORDER BY updated DESC LIMIT 1",
+            (con_id, ), con_id)
+
+    def save_details(self, contract_: Contract, contract_details):
+        """!
+        Saves the contract details for a contract.
+
+        @param contract_: The contract the details were requested with.
+        @param contract_details: The contract details received from the broker.
+
+        @return None
+        """
+        try:
+            with self.lock, closing(self._connect()) as connection:
+                with connection:
+                    connection.execute(
+                        "INSERT OR REPLACE INTO contracts (key, con_id, updated, details) "
+                        "VALUES (?, ?, ?, ?)", (get_key(contract_), contract_details.contract.conId,
+                                                time.time(), pickle.dumps(contract_details)))
+        except (sqlite3.Error, OSError) as msg:
+            logger.warning("Unable to cache contract details: %s", msg)
+
+    # ==============================================================================================
+    #
+    # Private Functions
+    #
+    # ==============================================================================================
+    def _connect(self):
+        os.makedirs(os.path.dirname(self.filename), exist_ok=True)
+        connection = sqlite3.connect(self.filename)
+
+        if not self.initialized:
+            connection.execute("CREATE TABLE IF NOT EXISTS contracts (key TEXT PRIMARY KEY, "
+                               "con_id INTEGER, updated REAL, details BLOB)")
+            connection.execute("CREATE INDEX IF NOT EXISTS contracts_con_id ON contracts (con_id)")
+            self.initialized = True
+
+        return connection
+
+    def _load_details(self, query: str, parameters: tuple, name):
+        """!
+        Returns the contract details found by a query, or None if they are missing or expired.
+
+        @param query: Selects the 'updated' and 'details' columns of at most one row.
+        @param parameters: The query's parameters.
+        @param name: Identifies the contract in log messages.
+        """
+        try:
+            with self.lock, closing(self._connect()) as connection:
+                row = connection.execute(query, parameters).fetchone()
+        except (sqlite3.Error, OSError) as msg:
+            logger.warning("Unable to read cached contract details: %s", msg)
+            return None
+
+        if row is None or time.time() - row[0] > self.ttl:
+            return None
+
+        try:
+            return pickle.loads(row[1])
+        except (pickle.UnpicklingError, AttributeError, EOFError) as msg:
+            logger.warning("Unable to load cached contract details for %s: %s", name, msg)
+            return None
+
+
+# ==================================================================================================
+#
+# Functions
+#
+# ==================================================================================================
+def get_key(contract_: Contract):
+    return "|".join(str(getattr(contract_, field, "")) for field in KEY_FIELDS)
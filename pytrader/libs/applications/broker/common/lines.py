@@ -0,0 +1,180 @@
+"""!
+@package pytrader.libs.applications.broker.common.lines
+
+Shares the account's market data lines between streams.
+
+@author G. S. Derber
+@date 2022-2023
+@copyright GNU Affero General Public License
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU Affero General Public License as
+    published by the Free Software Foundation, either version 3 of the
+    License, or (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU Affero General Public License for more details.
+
+    You should have received a copy of the GNU Affero General Public License
+    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+
+@file pytrader/libs/applications/broker/common/lines.py
+"""
+# Standard libraries
+import itertools
+
+from collections import OrderedDict
+
+# 3rd Party libraries
+
+# System Library Overrides
+from pytrader.libs.system import logging
+
+# Other Application Libraries
+
+# Conditional Libraries
+
+# ==================================================================================================
+#
+# Global Variables
+#
+# ==================================================================================================
+## The Base Logger
+logger = logging.getLogger(__name__)
+
+## Market data lines available to an account without extra subscriptions.
+MAX_MARKET_DATA_LINES = 100
+
+## Priority of each security type's streams.  Lower numbers are served first, and streams with
+## higher numbers can be evicted for them.  Security types not listed have priority 0.
+SECURITY_TYPE_PRIORITY = {"OPT": 1, "FOP": 1}
+
+
+# ==================================================================================================
+#
+# Classes
+#
+# ==================================================================================================
+class LineManager():
+    """!
+    Keeps the streams using market data lines within the account's budget.
+
+    Each stream is a (stream type, ticker) and holds one line however many strategies use it.
+    Requests over budget wait until a line is released, highest priority first.  With eviction,
+    which is off by default, a request takes the line of the least recently used lower priority
+    stream, which waits for a line in turn.
+    """
+
+    def __init__(self, max_lines: int = MAX_MARKET_DATA_LINES, evict: bool = False):
+        self.max_lines = max_lines
+        self.evict = evict
+
+        ## The priority of each stream holding a line, least recently used first.
+        self.lines = OrderedDict()
+
+        ## The priority and arrival order of each stream waiting for a line.
+        self.pending = {}
+
+        ## The functions that start and stop each stream type, keyed by stream type.
+        self.handlers = {}
+        self.sequence = itertools.count()
+
+    def release(self, stream_type: str, ticker: str):
+        """!
+        Releases a stream's line, or its place in the queue, and gives the line to the next waiting
+        stream.  The caller has already cancelled the stream.
+
+        @param stream_type: The type of stream.
+        @param ticker: The stream's ticker.
+
+        @return None
+        """
+        key = (stream_type, ticker)
+        self.pending.pop(key, None)
+
+        if self.lines.pop(key, None) is not None:
+            self._grant_pending()
+
+    def request(self, stream_type: str, ticker: str, sec_type: str = ""):
+        """!
+        Starts a stream when a line is available, otherwise queues it.
+
+        @param stream_type: The type of stream.
+        @param ticker: The stream's ticker.
+        @param sec_type: The security type, which sets the stream's priority.
+
+        @return bool: True if the stream holds a line.
+        """
+        key = (stream_type, ticker)
+
+        if key in self.lines:
+            return True
+
+        priority = SECURITY_TYPE_PRIORITY.get(sec_type, 0)
+
+        if len(self.lines) >= self.max_lines and not self._evict(priority):
+            if key not in self.pending:
+                logger.warning("No market data lines available, queueing %s for %s", stream_type,
+                               ticker)
+                self.pending[key] = (priority, next(self.sequence))
+            return False
+
+        self.pending.pop(key, None)
+        self._grant(key, priority)
+        return True
+
+    def set_handlers(self, stream_type: str, start, stop):
+        """!
+        Sets the functions that start and stop a type of stream.  Each is called with the ticker.
+        """
+        self.handlers[stream_type] = (start, stop)
+
+    def touch(self, stream_type: str, ticker: str):
+        """!
+        Marks a stream as used, so it is the last to be evicted.
+        """
+        key = (stream_type, ticker)
+
+        if key in self.lines:
+            self.lines.move_to_end(key)
+
+    # ==============================================================================================
+    #
+    # Private Functions
+    #
+    # ==============================================================================================
+    def _evict(self, priority: int):
+        """!
+        Stops the least recently used stream with a lower priority, and queues it.
+
+        @return bool: True if a line was freed.
+        """
+        if not self.evict:
+            return False
+
+        for key, line_priority in self.lines.items():
+            if line_priority > priority:
+                stream_type, ticker = key
+                logger.warning("Evicting %s for %s to free a market data line", stream_type,
+                               ticker)
+                self.lines.pop(key)
+                self.pending[key] = (line_priority, next(self.sequence))
+                self.handlers[stream_type][1](ticker)
+                return True
+
+        return False
+
+    def _grant(self, key: tuple, priority: int):
+        stream_type, ticker = key
+        self.lines[key] = priority
+        self.handlers[stream_type][0](ticker)
+
+    def _grant_pending(self):
+        while self.pending and len(self.lines) < self.max_lines:
+            key = min(self.pending, key=self.pending.get)
+            priority, _ = self.pending.pop(key)
+            logger.debug2("Market data line available for %s", key)
+            self._grant(key, priority)
@@ -0,0 +1,140 @@
+"""!
+@package pytrader.libs.applications.broker.common.optioncache
+
+Stores option chain parameters on disk, so option strategies do not wait for them on start.
+
+@author G. S. Derber
+@date 2022-2023
+@copyright GNU Affero General Public License
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU Affero General Public License as
+    published by the Free Software Foundation, either version 3 of the
+    License, or (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU Affero General Public License for more details.
+
+    You should have received a copy of the GNU Affero General Public License
+    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+
+@file pytrader/libs/applications/broker/common/optioncache.py
+"""
+# Standard libraries
+import datetime
+import os
+import pickle
+import sqlite3
+import threading
+
+from contextlib import closing
+
+# 3rd Party libraries
+
+# System Library Overrides
+from pytrader.libs.system import logging
+
+# Other Application Libraries
+from pytrader.libs.applications.broker.common.barcache import CACHE_DIR
+
+# Conditional Libraries
+
+# ==================================================================================================
+#
+# Global Variables
+#
+# ==================================================================================================
+## The Base Logger
+logger = logging.getLogger(__name__)
+
+
+# ==================================================================================================
+#
+# Classes
+#
+# ==================================================================================================
+class OptionCache():
+    """!
+    Caches option chain parameters in an SQLite database, keyed by underlying contract id and
+    exchange.
+
+    Option chains change at most daily, so parameters are current for the day they were received.
+    Older parameters are still returned, so they can be used while the chain is refreshed.
+    """
+
+    def __init__(self, filename: str = CACHE_DIR + "/option_chains.db"):
+        self.filename = filename
+        self.lock = threading.Lock()
+        self.initialized = False
+
+    def get_option_details(self, con_id: int, exchange: str = ""):
+        """!
+        Returns the cached option chain parameters for an underlying.
+
+        @param con_id: The underlying's contract id.
+        @param exchange: The exchange the parameters were requested for.  Empty for all exchanges.
+
+        @return (option_details, current): The option chain parameters, or None if they are not
+            cached, and whether they were received today.
+        """
+        try:
+            with self.lock, closing(self._connect()) as connection:
+                row = connection.execute(
+                    "SELECT trade_date, details FROM option_chains WHERE con_id = ? AND "
+                    "exchange = ?", (con_id, exchange)).fetchone()
+        except (sqlite3.Error, OSError) as msg:
+            logger.warning("Unable to read cached option chain: %s", msg)
+            return None, False
+
+        if row is None:
+            return None, False
+
+        try:
+            option_details = pickle.loads(row[1])
+        except (pickle.UnpicklingError, AttributeError, EOFError) as msg:
+            logger.warning("Unable to load cached option chain for %s: %s", con_id, msg)
+            return None, False
+
+        return option_details, row[0] == datetime.date.today().isoformat()
+
+    def save_option_details(self, con_id: int, option_details: dict, exchange: str = ""):
+        """!
+        Saves the option chain parameters for an underlying.
+
+        @param con_id: The underlying's contract id.
+        @param option_details: The option chain parameters received from the broker.
+        @param exchange: The exchange the parameters were requested for.  Empty for all exchanges.
+
+        @return None
+        """
+        try:
+            with self.lock, closing(self._connect()) as connection:
+                # The connection's own context commits the insert.
+                with connection:
+                    connection.execute(
+                        "INSERT OR REPLACE INTO option_chains (con_id, exchange, trade_date, "
+                        "details) VALUES (?, ?, ?, ?)",
+                        (con_id, exchange, datetime.date.today().isoformat(),
+                         pickle.dumps(option_details)))
+        except (sqlite3.Error, OSError) as msg:
+            logger.warning("Unable to cache option chain: %s", msg)
+
+    # ==============================================================================================
+    #
+    # Private Functions
+    #
+    # ==============================================================================================
+    def _connect(self):
+        os.makedirs(os.path.dirname(self.filename), exist_ok=True)
+        connection = sqlite3.connect(self.filename)
+
+        if not self.initialized:
+            connection.execute("CREATE TABLE IF NOT EXISTS option_chains (con_id INTEGER, "
+                               "exchange TEXT, trade_date TEXT, details BLOB, "
+                               "PRIMARY KEY (con_id, exchange))")
+            self.initialized = True
+
+        return connection
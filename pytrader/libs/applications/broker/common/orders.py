@@ -24,6 +24,10 @@ Manages orders within the Broker Application.
 @file pytrader/libs/applications/broker/common/orders.py
 """
 # Standard libraries
+import copy
+import datetime
+import threading
+import time
 
 # 3rd Party libraries
 
@@ -43,6 +47,12 @@ from pytrader.libs import orders
 ## The Base Logger
 logger = logging.getLogger(__name__)
 
+## Order statuses that end a netted order.
+NET_ORDER_END_STATUSES = ["Cancelled", "ApiCancelled", "Inactive"]
+
+## Seconds the id of an ended net order is kept, to discard final messages the broker repeats.
+ENDED_ORDER_TTL = 600
+
 
 # ==================================================================================================
 #
@@ -54,3 +64,366 @@ class Order(orders.BaseOrder):
     Manages orders within the Broker application.
     """
     pass
+
+
+class OrderNetting():
+    """!
+    Nets market orders for the same contract across strategies.
+
+    Orders that arrive within the netting window are collected per contract.  When the window
+    closes, opposing orders are crossed with each other at the current price, and only the net
+    quantity is sent to the broker.  The net order reuses the order id of one of the orders it
+    replaces, since the broker requires order ids to increase.
+
+    Fills for the net order are allocated to the orders it replaced, oldest first.  Each strategy
+    receives order status, execution and commission messages for its own order ids, as though its
+    order had been placed on its own.  These messages are marked 'netted', so they are not
+    allocated a second time.
+
+    Orders are netted on a timer thread while broker messages are allocated on the data thread,
+    so both hold the lock while they use the netting state.
+    """
+
+    def __init__(self, window: float, place_order, send_message, get_price):
+        """!
+        @param window: Seconds to collect orders for a contract before netting them.
+        @param place_order: Called with an order request and strategy id to place an order.
+        @param send_message: Called with a message to deliver it as though it came from the broker.
+        @param get_price: Called with a ticker; returns the price to cross orders at, or None.
+        """
+        self.window = window
+        self.place_order = place_order
+        self.send_message = send_message
+        self.get_price = get_price
+        self.lock = threading.Lock()
+
+        ## Orders waiting for their contract's window to close, keyed by contract.
+        self.intents = {}
+
+        ## The orders replaced by each net order and the net order's status, keyed by its id.
+        self.net_orders = {}
+
+        ## The netted orders still being filled by a net order, keyed by order id.
+        self.netted = {}
+
+        ## When each net order ended, keyed by its id.  The broker can repeat its final messages.
+        self.ended_orders = {}
+
+        ## Allocated execution ids and their share of each broker execution, for commissions.
+        self.commissions = {}
+        self.cross_count = 0
+
+    def add_order(self, order_request: dict, strategy_id: str) -> bool:
+        """!
+        Adds an order to be netted.
+
+        Only standalone market orders are netted.  Limit prices, brackets and OCA groups depend on
+        the order being placed as it is.
+
+        @param order_request: The order and its contract.
+        @param strategy_id: The strategy placing the order.
+
+        @return bool: False if the order can not be netted and must be placed directly.
+        """
+        new_order = order_request["order"]
+
+        if new_order.orderType != "MKT" or new_order.parentId or not new_order.transmit \
+                or new_order.ocaGroup:
+            return False
+
+        contract = order_request["contract"]
+        key = (contract.localSymbol or contract.symbol, contract.secType)
+        intent = {
+            "order_id": new_order.orderId,
+            "strategy_id": strategy_id,
+            "order": new_order,
+            "contract": contract,
+            "quantity": float(new_order.totalQuantity),
+            "side": 1 if new_order.action == "BUY" else -1,
+            "filled": 0.0,
+            "cost": 0.0
+        }
+
+        with self.lock:
+            if key not in self.intents:
+                self.intents[key] = []
+                timer = threading.Timer(self.window, self._net_orders, args=(key, ))
+                timer.daemon = True
+                timer.start()
+
+            self.intents[key].append(intent)
+
+        logger.debug3("Netting order %s from %s", new_order.orderId, strategy_id)
+        return True
+
+    def allocate(self, response_data: dict) -> bool:
+        """!
+        Allocates a broker message for a net order to the orders it replaced.
+
+        @param response_data: A message from the broker.
+
+        @return bool: True if the message was for a net order and has been allocated.
+        """
+        with self.lock:
+            if response_data.get("order_status"):
+                return self._allocate_status(response_data["order_status"])
+            if response_data.get("order_execution"):
+                return self._allocate_execution(response_data["order_execution"])
+            if response_data.get("commission_report"):
+                return self._allocate_commission(response_data["commission_report"])
+
+        return False
+
+    def cancel_order(self, order_id: int) -> bool:
+        """!
+        Cancels an order that is waiting to be netted.
+
+        @param order_id: The order to cancel.
+
+        @return bool: True if the order belonged to the netting stage.
+        """
+        with self.lock:
+            for intents in self.intents.values():
+                for intent in intents:
+                    if intent["order_id"] == order_id:
+                        intents.remove(intent)
+                        self._send_status(intent, "Cancelled")
+                        return True
+
+            if order_id in self.netted:
+                logger.warning("Order %s has been netted and can no longer be cancelled",
+                               order_id)
+                return True
+
+        return False
+
+    # ==============================================================================================
+    #
+    # Private Functions
+    #
+    # ==============================================================================================
+    def _allocate_commission(self, commission_report: dict) -> bool:
+        exec_id = list(commission_report.keys())[0]
+        report = commission_report[exec_id]
+
+        if report.get("netted") or exec_id not in self.commissions:
+            return False
+
+        for allocated_exec_id, share in self.commissions.pop(exec_id):
+            self._send_commission(allocated_exec_id, report["commission"] * share,
+                                  report["currency"], report["realized_pnl"] * share)
+
+        return True
+
+    def _allocate_execution(self, order_execution: dict) -> bool:
+        order_id = list(order_execution.keys())[0]
+        execution = order_execution[order_id]
+
+        if execution.get("netted"):
+            return False
+        if order_id in self.ended_orders:
+            return True
+        if order_id not in self.net_orders:
+            return False
+
+        shares = execution["shares"]
+        unallocated = shares
+        self.commissions[execution["exec_id"]] = []
+
+        for intent in self.net_orders[order_id]["intents"]:
+            quantity = min(intent["quantity"] - intent["filled"], unallocated)
+
+            if quantity <= 0:
+                continue
+
+            allocated_exec_id = self._fill(intent, quantity, execution["price"],
+                                           execution["exec_id"] + "." + str(intent["order_id"]))
+            self.commissions[execution["exec_id"]].append((allocated_exec_id, quantity / shares))
+            unallocated -= quantity
+
+        self._end_net_order(order_id)
+        return True
+
+    def _allocate_status(self, order_status: dict) -> bool:
+        order_id = list(order_status.keys())[0]
+        status = order_status[order_id]["status"]
+
+        if order_status[order_id].get("netted"):
+            return False
+        if order_id in self.ended_orders:
+            return True
+        if order_id not in self.net_orders:
+            return False
+
+        self.net_orders[order_id]["status"] = status
+
+        # Fills are reported as each order's executions are allocated, so only the statuses of
+        # working and ended orders are passed on.
+        if status != "Filled":
+            for intent in self.net_orders[order_id]["intents"]:
+                if intent["filled"] < intent["quantity"]:
+                    self._send_status(intent, status)
+
+        self._end_net_order(order_id)
+        return True
+
+    def _end_net_order(self, order_id: int):
+        """!
+        Stops allocating a net order's messages once it has ended.  A filled net order ends only
+        once both its Filled status and all of its executions have arrived, in either order.
+        """
+        net_order = self.net_orders[order_id]
+        filled = all(intent["filled"] >= intent["quantity"] for intent in net_order["intents"])
+
+        if net_order["status"] in NET_ORDER_END_STATUSES or (net_order["status"] == "Filled"
+                                                             and filled):
+            self.net_orders.pop(order_id)
+
+            for intent in net_order["intents"]:
+                self.netted.pop(intent["order_id"], None)
+
+            now = time.monotonic()
+            self.ended_orders = {
+                ended_id: end_time
+                for ended_id, end_time in self.ended_orders.items()
+                if now - end_time < ENDED_ORDER_TTL
+            }
+            self.ended_orders[order_id] = now
+
+    def _fill(self, intent: dict, quantity: float, price: float, exec_id: str):
+        """!
+        Reports a fill for a netted order.
+
+        @return exec_id: The execution id the fill was reported with.
+        """
+        intent["filled"] += quantity
+        intent["cost"] += quantity * price
+        contract = intent["contract"]
+
+        message = {
+            "order_execution": {
+                intent["order_id"]: {
+                    "exec_id": exec_id,
+                    "ticker": contract.localSymbol,
+                    "multiplier": float(contract.multiplier) if contract.multiplier else 1.0,
+                    "side": "BOT" if intent["side"] > 0 else "SLD",
+                    "shares": quantity,
+                    "price": price,
+                    "time": datetime.datetime.now().strftime("%Y%m%d %H:%M:%S"),
+                    "netted": True
+                }
+            }
+        }
+        self.send_message(message)
+
+        if intent["filled"] >= intent["quantity"]:
+            self._send_status(intent, "Filled", price)
+
+        return exec_id
+
+    def _net_orders(self, key: tuple):
+        """!
+        Nets the orders collected for a contract once its window closes.
+        """
+        with self.lock:
+            order_requests = self._net_intents(key, self.intents.pop(key, []))
+
+        # Orders are placed without the lock, so the data thread is not held up by the broker.
+        for order_request, strategy_id in order_requests:
+            self.place_order(order_request, strategy_id)
+
+    def _net_intents(self, key: tuple, intents: list):
+        """!
+        Crosses a contract's orders with each other.
+
+        @return order_requests: The (order request, strategy id) of each order left to place.
+        """
+        buy_quantity = sum(intent["quantity"] for intent in intents if intent["side"] > 0)
+        sell_quantity = sum(intent["quantity"] for intent in intents if intent["side"] < 0)
+        crossed = min(buy_quantity, sell_quantity)
+        price = None
+
+        if crossed > 0:
+            price = self.get_price(key[0])
+
+        if len(intents) < 2 or (crossed > 0 and price is None):
+            if len(intents) > 1:
+                logger.warning("No price to cross orders for %s at, placing them separately",
+                               key[0])
+
+            return [self._get_order_request(intent) for intent in intents]
+
+        if crossed > 0:
+            self.cross_count += 1
+            logger.debug2("Crossing %s of %s at %s", crossed, key[0], price)
+
+            for side in [1, -1]:
+                uncrossed = crossed
+
+                for intent in intents:
+                    if intent["side"] == side and uncrossed > 0:
+                        quantity = min(intent["quantity"], uncrossed)
+                        exec_id = self._fill(
+                            intent, quantity, price,
+                            "net" + str(self.cross_count) + "." + str(intent["order_id"]))
+                        self._send_commission(exec_id, 0.0)
+                        uncrossed -= quantity
+
+        remaining = [intent for intent in intents if intent["filled"] < intent["quantity"]]
+
+        if len(remaining) == 0:
+            return []
+
+        for intent in remaining:
+            self.netted[intent["order_id"]] = intent
+
+        net_intent = remaining[0]
+        net_order = copy.copy(net_intent["order"])
+        net_order.totalQuantity = sum(intent["quantity"] - intent["filled"] for intent in remaining)
+        self.net_orders[net_order.orderId] = {"intents": remaining, "status": None}
+
+        logger.debug2("Net order %s for %s: %s %s, replacing %s orders", net_order.orderId, key[0],
+                      net_order.action, net_order.totalQuantity, len(intents))
+        return [({"order": net_order, "contract": net_intent["contract"]},
+                 net_intent["strategy_id"])]
+
+    def _get_order_request(self, intent: dict):
+        return {"order": intent["order"], "contract": intent["contract"]}, intent["strategy_id"]
+
+    def _send_commission(self,
+                         exec_id: str,
+                         commission: float,
+                         currency: str = "USD",
+                         realized_pnl: float = 0.0):
+        message = {
+            "commission_report": {
+                exec_id: {
+                    "commission": commission,
+                    "currency": currency,
+                    "realized_pnl": realized_pnl,
+                    "netted": True
+                }
+            }
+        }
+        self.send_message(message)
+
+    def _send_status(self, intent: dict, status: str, last_fill_price: float = 0.0):
+        average_fill_price = intent["cost"] / intent["filled"] if intent["filled"] > 0 else 0.0
+        message = {
+            "order_status": {
+                intent["order_id"]: {
+                    "status": status,
+                    "filled": intent["filled"],
+                    "remaining": intent["quantity"] - intent["filled"],
+                    "average_fill_price": average_fill_price,
+                    "perm_id": 0,
+                    "parent_id": 0,
+                    "last_fill_price": last_fill_price,
+                    "client_id": 0,
+                    "why_held": "",
+                    "market_cap_price": 0.0,
+                    "netted": True
+                }
+            }
+        }
+        self.send_message(message)
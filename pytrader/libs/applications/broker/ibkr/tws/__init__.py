@@ -22,6 +22,9 @@ The main user interface for the trading program.
 @file pytrader/libs/applications/broker/ibkr/tws/__init__.py
 """
 # System Libraries
+import threading
+
+from queue import Queue
 
 # 3rd Party Libraries
 
@@ -30,7 +33,9 @@ The main user interface for the trading program.
 from pytrader.libs.system import logging
 
 # Other Application Libraries
+from pytrader.libs import orders
 from pytrader.libs.applications.broker.common import BrokerDataThread
+from pytrader.libs.applications.broker.common.lines import LineManager
 from pytrader.libs.applications.broker.ibkr.tws.observers import (
     StrategyBarDataObserver, StrategyContractDataObserver, StrategyMarketDataObserver,
     StrategyOptionDataObserver, StrategyOrderDataObserver, StrategyRealTimeBarObserver)
@@ -38,6 +43,7 @@ from pytrader.libs.applications.broker.ibkr.tws.subjects import (BrokerBarData,
                                                                  BrokerMarketData, BrokerOptionData,
                                                                  BrokerOrderData,
                                                                  BrokerRealTimeBarData)
+from pytrader.libs.events import SubscriptionRegistry
 # Conditional Libraries
 
 # ==================================================================================================
@@ -63,6 +69,12 @@ class TwsDataThread(BrokerDataThread):
         """!
         Initializes the TwsDataThread class.
         """
+        ## Routes streaming data to the strategies subscribed to each ticker.
+        self.subscriptions = SubscriptionRegistry()
+
+        ## Keeps market data and real time bar streams within the account's market data lines.
+        self.line_manager = LineManager()
+
         # Contract Subjects and Observers
         self.contract_subjects = BrokerContractData()
         self.contract_observers = {}
@@ -70,7 +82,7 @@ class TwsDataThread(BrokerDataThread):
         self.bar_subjects = BrokerBarData()
         self.bar_observers = {}
 
-        self.mkt_data_subjects = BrokerMarketData()
+        self.mkt_data_subjects = BrokerMarketData(self.subscriptions, self.line_manager)
         self.mkt_data_observers = {}
 
         self.option_subjects = BrokerOptionData()
@@ -79,7 +91,11 @@ class TwsDataThread(BrokerDataThread):
         self.order_subjects = BrokerOrderData()
         self.order_observers = {}
 
-        self.rtb_subjects = BrokerRealTimeBarData()
+        ## Orders arrive on each strategy's order thread, the command thread and the netting timer,
+        ## while their status is sent from this thread.  Holds off all but one of them at a time.
+        self.order_lock = threading.RLock()
+
+        self.rtb_subjects = BrokerRealTimeBarData(self.subscriptions, self.line_manager)
         self.rtb_observers = {}
 
         super().__init__(*args, **kwargs)
@@ -92,7 +108,32 @@ class TwsDataThread(BrokerDataThread):
 
         @return None.
         """
-        self.order_subjects.cancel_order(order_id)
+        with self.order_lock:
+            self.order_subjects.cancel_order(order_id)
+
+    def cancel_tickers(self, tickers: list, strategy_id: str):
+        """!
+        Stops sending data for tickers to a strategy.
+
+        Streams are only cancelled with the broker once no strategy is using them.
+
+        @param tickers: The tickers to stop sending.
+        @param strategy_id: The strategy that no longer needs the tickers.
+
+        @return None.
+        """
+        self.contract_observers[strategy_id].remove_tickers(tickers)
+        self.bar_observers[strategy_id].remove_tickers(tickers)
+        self.mkt_data_observers[strategy_id].remove_tickers(tickers)
+        self.rtb_observers[strategy_id].remove_tickers(tickers)
+        self.mkt_data_subjects.unsubscribe(self.mkt_data_observers[strategy_id], tickers)
+        self.rtb_subjects.unsubscribe(self.rtb_observers[strategy_id], tickers)
+
+        self.bar_subjects.remove_tickers(self._unused_tickers(tickers, self.bar_observers))
+        self.mkt_data_subjects.cancel_market_data(
+            [ticker for ticker in tickers if not self.mkt_data_subjects.is_subscribed(ticker)])
+        self.rtb_subjects.cancel_real_time_bars(
+            [ticker for ticker in tickers if not self.rtb_subjects.is_subscribed(ticker)])
 
     def create_order(self, order_request: dict, strategy_id: str):
         """!
@@ -106,8 +147,29 @@ class TwsDataThread(BrokerDataThread):
         new_order = order_request["order"]
         order_id = new_order.orderId
 
-        self.order_subjects.create_order(order_contract, new_order, order_id)
-        self.order_observers[strategy_id].add_order_id(order_id)
+        with self.order_lock:
+            # The observer needs the order id before the first order status can arrive.
+            self.track_order(order_id, strategy_id)
+            self._normalize_prices(order_contract, new_order)
+            self.order_subjects.create_order(order_contract, new_order, order_id)
+
+    def get_price(self, ticker: str):
+        return self.mkt_data_subjects.get_price(ticker)
+
+    def modify_order(self, order_request: dict):
+        """!
+        Sends an amended order to the broker, keeping its order id.
+
+        @param order_request: The amended order and its contract.
+
+        @return None.
+        """
+        new_order = order_request["order"]
+
+        with self.order_lock:
+            self._normalize_prices(order_request["contract"], new_order)
+            self.order_subjects.modify_order(order_request["contract"], new_order,
+                                             new_order.orderId)
 
     def request_bar_history(self):
         self.bar_subjects.request_bars()
@@ -119,14 +181,17 @@ class TwsDataThread(BrokerDataThread):
 
         self.option_observers[strategy_id].add_tickers(tickers)
         self.option_subjects.add_tickers(tickers, contracts)
-        self.option_subjects.request_option_details()
-        self.option_subjects.notify()
+
+        with self.option_subjects.details_lock:
+            self.option_subjects.request_option_details()
+            self.option_subjects.notify()
 
     def request_real_time_bars(self, strategy_id):
         tickers = self.contract_observers[strategy_id].get_tickers()
         contracts = self.contract_subjects.get_contracts()
 
         self.rtb_observers[strategy_id].add_tickers(tickers)
+        self.rtb_subjects.subscribe(self.rtb_observers[strategy_id], tickers)
         self.rtb_subjects.add_tickers(tickers, contracts)
         self.rtb_subjects.request_real_time_bars()
 
@@ -135,18 +200,32 @@ class TwsDataThread(BrokerDataThread):
         contracts = self.contract_subjects.get_contracts()
 
         self.mkt_data_observers[strategy_id].add_tickers(tickers)
+        self.mkt_data_subjects.subscribe(self.mkt_data_observers[strategy_id], tickers)
         self.mkt_data_subjects.add_tickers(tickers, contracts)
         self.mkt_data_subjects.request_market_data()
 
     def send_market_data_ticks(self, market_data: dict):
         self.mkt_data_subjects.send_market_data_ticks(market_data)
 
+    def send_commission_report(self, commission_report: dict):
+        with self.order_lock:
+            self.order_subjects.send_commission_report(commission_report)
+
+    def send_order_execution(self, order_execution: dict):
+        with self.order_lock:
+            self.order_subjects.send_order_execution(order_execution)
+
     def send_order_status(self, order_status: dict):
-        self.order_subjects.send_order_status(order_status)
+        with self.order_lock:
+            self.order_subjects.send_order_status(order_status)
 
     def send_real_time_bars(self, real_time_bar: dict):
         self.rtb_subjects.send_real_time_bars(real_time_bar)
 
+    def set_attributes(self, brokerclient, data_queue: dict, broker_queue: Queue) -> None:
+        super().set_attributes(brokerclient, data_queue, broker_queue)
+        self.line_manager.max_lines = brokerclient.get_market_data_lines()
+
     def set_strategies(self, strategy_list: list):
         for strategy in strategy_list:
             # Add Bar Observers
@@ -175,22 +254,28 @@ class TwsDataThread(BrokerDataThread):
             self.rtb_observers[strategy] = StrategyRealTimeBarObserver(self.data_queue[strategy])
             self.rtb_subjects.attach(self.rtb_observers[strategy], self.brokerclient)
 
-    def set_bar_sizes(self, bar_sizes: list, strategy_id: str):
+    def set_bar_sizes(self,
+                      bar_sizes: list,
+                      strategy_id: str,
+                      warmup_bars: dict = None,
+                      history_start: dict = None):
         """!
         Sets bar sizes
 
         @param bar_sizes: Bar sizes to use
+        @param warmup_bars: The number of bars of history the strategy needs for each bar size.
+        @param history_start: The time, in seconds since the epoch, the strategy needs history
+            from for each ticker and bar size.  Set when the strategy already holds older bars.
 
         @return None
         """
         tickers = self.contract_observers[strategy_id].get_tickers()
         contracts = self.contract_subjects.get_contracts()
-        self.bar_subjects.add_bar_sizes(tickers, contracts, bar_sizes)
+        self.bar_subjects.add_bar_sizes(tickers, contracts, bar_sizes, warmup_bars, history_start)
         self.bar_observers[strategy_id].add_ticker_bar_sizes(tickers, bar_sizes)
 
     def set_contracts(self, contracts: dict, strategy_id: str):
-        for ticker, contract_ in contracts.items():
-            self.contract_subjects.request_contract_data(ticker, contract_)
+        self.contract_subjects.request_contracts(contracts)
 
         # We do this after requesting contract detail, so we can check if the ticker has a valid
         # contract.
@@ -199,3 +284,58 @@ class TwsDataThread(BrokerDataThread):
 
         self.contract_observers[strategy_id].add_tickers(tickers)
         self.contract_subjects.notify()
+
+    def set_tick_types(self, tick_types: list, strategy_id: str):
+        """!
+        Sets the market data tick types a strategy uses.  Other tick types are not sent to the
+        strategy.
+
+        @param tick_types: The tick types the strategy uses.
+        @param strategy_id: The strategy using the tick types.
+
+        @return None
+        """
+        self.mkt_data_observers[strategy_id].set_tick_types(tick_types)
+
+        # Subscriptions that are missing generic ticks for the new tick types are renewed.
+        self.mkt_data_subjects.request_market_data()
+
+    def track_order(self, order_id: int, strategy_id: str):
+        """!
+        Sends the order's status, executions and commissions to the strategy that placed it.
+
+        @param order_id: The order's id.
+        @param strategy_id: The strategy that placed the order.
+
+        @return None.
+        """
+        with self.order_lock:
+            self.order_observers[strategy_id].add_order_id(order_id)
+
+    # ==============================================================================================
+    #
+    # Private Functions
+    #
+    # ==============================================================================================
+    def _normalize_prices(self, order_contract, new_order):
+        """!
+        Snaps the order's prices to the contract's price increments, so the broker does not reject
+        them.
+        """
+        price_increments = self.contract_subjects.get_price_increments(order_contract.localSymbol)
+
+        if price_increments is None:
+            logger.debug3("No price increments for %s, rounding prices to the cent",
+                          order_contract.localSymbol)
+            price_increments = orders.DEFAULT_PRICE_INCREMENTS
+
+        orders.normalize_prices(new_order, price_increments)
+
+    def _unused_tickers(self, tickers: list, observers: dict):
+        """!
+        Returns the tickers that none of the observers are using.
+        """
+        return [
+            ticker for ticker in tickers
+            if not any(observer.has_ticker(ticker) for observer in observers.values())
+        ]
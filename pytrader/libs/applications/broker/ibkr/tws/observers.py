@@ -31,6 +31,7 @@ from multiprocessing import Queue
 from pytrader.libs.system import logging
 
 # Other Application Libraries
+from pytrader.libs import marketdata
 from pytrader.libs.events import ContractData, Observer, Subject
 
 # Conditional Libraries
@@ -64,6 +65,13 @@ class BarDataObserver(Observer):
                 if bar_size not in list(self.ticker_bar_sizes[ticker].keys()):
                     self.ticker_bar_sizes[ticker][bar_size] = False
 
+    def has_ticker(self, ticker):
+        return ticker in self.ticker_bar_sizes
+
+    def remove_tickers(self, tickers):
+        for ticker in tickers:
+            self.ticker_bar_sizes.pop(ticker, None)
+
 
 class StrategyBarDataObserver(BarDataObserver):
 
@@ -78,7 +86,7 @@ class StrategyBarDataObserver(BarDataObserver):
                         ohlc_bars = subject.ohlc_bars[ticker][bar_size]
 
                         msg = {"bars": {ticker: {bar_size: ohlc_bars}}}
-                        self.msg_queue.put(msg)
+                        subject.send_message(self.msg_queue, ("bars", ticker, bar_size), msg)
                         self.ticker_bar_sizes[ticker][bar_size] = True
 
 
@@ -93,6 +101,14 @@ class ContractDataObserver(Observer):
             if ticker not in self.tickers:
                 self.tickers.append(ticker)
 
+    def has_ticker(self, ticker):
+        return ticker in self.tickers
+
+    def remove_tickers(self, tickers):
+        for ticker in tickers:
+            if ticker in self.tickers:
+                self.tickers.remove(ticker)
+
     def get_tickers(self):
         return self.tickers
 
@@ -113,22 +129,39 @@ class StrategyContractDataObserver(ContractDataObserver):
 class MarketDataObserver(Observer):
 
     def __init__(self, msg_queue: Queue):
-        self.tickers = []
+        self.tickers = set()
+        self.tick_types = None
         self.msg_queue = msg_queue
 
     def add_tickers(self, tickers):
-        for ticker in tickers:
-            if ticker not in self.tickers:
-                self.tickers.append(ticker)
+        self.tickers.update(tickers)
+
+    def has_ticker(self, ticker):
+        return ticker in self.tickers
+
+    def remove_tickers(self, tickers):
+        self.tickers.difference_update(tickers)
+
+    def set_tick_types(self, tick_types):
+        self.tick_types = set(tick_types)
+
+    def wants_tick(self, market_data):
+        if self.tick_types is None:
+            return True
+
+        if market_data[0] == "tick_news":
+            return marketdata.NEWS_TICK in self.tick_types
+
+        return market_data[1] in self.tick_types
 
 
 class StrategyMarketDataObserver(MarketDataObserver):
 
     def update(self, subject: Subject) -> None:
-        if len(self.tickers) > 0:
-            if subject.ticker in self.tickers:
-                message = {"market_data": {subject.ticker: subject.market_data}}
-                self.msg_queue.put(message)
+        # The subject only notifies observers subscribed to the ticker.
+        if self.wants_tick(subject.market_data):
+            message = {"market_data": {subject.ticker: subject.market_data}}
+            subject.send_message(self.msg_queue, ("market_data", ), message)
 
 
 class OptionDataObserver(Observer):
@@ -142,19 +175,34 @@ class OptionDataObserver(Observer):
             if ticker not in self.tickers:
                 self.tickers.append(ticker)
 
+    def has_ticker(self, ticker):
+        return ticker in self.tickers
+
+    def remove_tickers(self, tickers):
+        for ticker in tickers:
+            if ticker in self.tickers:
+                self.tickers.remove(ticker)
+
 
 class StrategyOptionDataObserver(OptionDataObserver):
 
     def update(self, subject: Subject) -> None:
         if len(self.tickers) > 0:
             for ticker in self.tickers:
+                # Tickers whose option chain could not be retrieved are skipped.
+                if ticker not in subject.option_details:
+                    continue
+
+                if subject.updated_tickers is not None and ticker not in subject.updated_tickers:
+                    continue
+
                 message = {
                     "option_details": {
                         "ticker": ticker,
                         "details": subject.option_details[ticker]
                     }
                 }
-                self.msg_queue.put(message)
+                subject.send_message(self.msg_queue, ("option_details", ticker), message)
 
 
 class OrderDataObserver(Observer):
@@ -173,25 +221,28 @@ class StrategyOrderDataObserver(OrderDataObserver):
     def update(self, subject: Subject) -> None:
         if len(self.order_ids) > 0:
             if subject.order_id in self.order_ids:
-                message = {"order_status": subject.order_status}
-                self.msg_queue.put(message)
+                self.msg_queue.put(subject.order_message)
 
 
 class RealTimeBarObserver(Observer):
 
     def __init__(self, msg_queue: Queue):
-        self.tickers = []
+        self.tickers = set()
         self.msg_queue = msg_queue
 
     def add_tickers(self, tickers):
-        for ticker in tickers:
-            if ticker not in self.tickers:
-                self.tickers.append(ticker)
+        self.tickers.update(tickers)
+
+    def has_ticker(self, ticker):
+        return ticker in self.tickers
+
+    def remove_tickers(self, tickers):
+        self.tickers.difference_update(tickers)
 
 
 class StrategyRealTimeBarObserver(RealTimeBarObserver):
 
     def update(self, subject: Subject) -> None:
-        if subject.ticker in self.tickers:
-            msg = {"real_time_bars": {subject.ticker: {"rtb": subject.ohlc_bar}}}
-            self.msg_queue.put(msg)
+        # The subject only notifies observers subscribed to the ticker.
+        msg = {"real_time_bars": {subject.ticker: {"rtb": subject.ohlc_bar}}}
+        subject.send_message(self.msg_queue, ("real_time_bars", ), msg)
@@ -23,6 +23,12 @@ The main user interface for the trading program.
 """
 # System Libraries
 import datetime
+import math
+import queue
+import threading
+import time
+
+from collections import deque
 
 # 3rd Party Libraries
 from ibapi.contract import Contract
@@ -33,8 +39,12 @@ from ibapi.order import Order
 from pytrader.libs.system import logging
 
 # Other Application Libraries
-from pytrader.libs.events import (BarData, ContractData, MarketData, OptionData, OrderData,
-                                  RealTimeBarData)
+from pytrader.libs import marketdata
+from pytrader.libs.applications.broker.common import barcache, contractcache, optioncache
+from pytrader.libs.applications.broker.common.lines import LineManager
+from pytrader.libs.events import (MARKET_DATA_EVENT, REAL_TIME_BARS_EVENT, BarData, ContractData,
+                                  MarketData, OptionData, OrderData, RealTimeBarData,
+                                  SubscriptionRegistry)
 
 # Conditional Libraries
 
@@ -46,6 +56,44 @@ from pytrader.libs.events import (BarData, ContractData, MarketData, OptionData,
 ## The Base Logger
 logger = logging.getLogger(__name__)
 
+## Historical data requests kept outstanding at once.  TWS allows 50, but fewer keeps the other
+## requests from waiting behind a burst of history.
+MAX_HISTORY_REQUESTS = 8
+
+## Seconds to wait for a historical data request, once it has been sent, before giving up on it.
+HISTORY_TIMEOUT = 120
+
+## The bid, ask and last price tick types kept for pricing.
+QUOTE_TICK_TYPES = [1, 2, 4]
+
+## Length of each duration unit in seconds.  Months and years are approximate.
+DURATION_SECONDS = {"S": 1, "D": 86400, "W": 604800, "M": 2592000, "Y": 31536000}
+
+## Length of regular trading hours in seconds
+RTH_SECONDS = 23400
+
+## Length of each intraday bar size in seconds
+BAR_SECONDS = {
+    "1 secs": 1,
+    "5 secs": 5,
+    "10 secs": 10,
+    "15 secs": 15,
+    "30 secs": 30,
+    "1 min": 60,
+    "2 mins": 120,
+    "3 mins": 180,
+    "5 mins": 300,
+    "10 mins": 600,
+    "15 mins": 900,
+    "20 mins": 1200,
+    "30 mins": 1800,
+    "1 hour": 3600,
+    "2 hours": 7200,
+    "3 hours": 10800,
+    "4 hours": 14400,
+    "8 hours": 28800
+}
+
 
 # ==================================================================================================
 #
@@ -54,45 +102,201 @@ logger = logging.getLogger(__name__)
 # ==================================================================================================
 class BrokerBarData(BarData):
 
+    def __init__(self):
+        super().__init__()
+        ## Number of historical data requests kept outstanding at once.
+        self.max_requests = MAX_HISTORY_REQUESTS
+
+        ## Bar histories from earlier runs.  None to always request the full history.
+        self.bar_cache = barcache.BarCache()
+
+        ## The type of data, trading hours and date format bar histories are requested with.
+        self.what_to_show = "TRADES"
+        self.use_regular_trading_hours = True
+        self.format_date = 1
+
+        ## The warm-up bars and history start each ticker's history was requested for, by bar
+        ## size.
+        self.history_requested = {}
+
     def request_bars(self):
+        """!
+        Requests the bar history for every contract and bar size that does not have it yet, or whose
+        history is shorter than the strategies now need.
+
+        Up to 'max_requests' requests are kept outstanding, and each result is stored as soon as it
+        arrives.  When the history is cached, only the bars since the last cached bar are
+        requested.
+        """
+        history_requests = deque()
+
         for contract_ in list(self.contracts.values()):
             if contract_.localSymbol not in list(self.ohlc_bars.keys()):
                 self.ohlc_bars[contract_.localSymbol] = {}
 
             for bar_size in self.bar_sizes:
-                if bar_size not in list(self.ohlc_bars[contract_.localSymbol].keys()):
-                    self._retrieve_bar_history(contract_, bar_size)
+                if bar_size not in list(self.ohlc_bars[contract_.localSymbol].keys()) or \
+                        not self._history_covered(contract_.localSymbol, bar_size):
+                    if contract_.secType == "OPT" and bar_size == "1 day":
+                        logger.debug9("Option Daily Bar, skipping")
+                    else:
+                        history_requests.append((contract_, bar_size))
+
+        if not history_requests:
+            return
+
+        if not self.brokerclient:
+            raise NotImplementedError
+
+        self._retrieve_bar_histories(history_requests)
+
+    def remove_tickers(self, tickers: list):
+        for ticker in tickers:
+            logger.debug2("Removing Bar Data for Ticker: %s", ticker)
+            self.contracts.pop(ticker, None)
+            self.ohlc_bars.pop(ticker, None)
+
+            if ticker in self.tickers:
+                self.tickers.remove(ticker)
 
     # ==============================================================================================
     #
     # Internal Use only functions.  These should not be used outside the class.
     #
     # ==============================================================================================
-    def _retrieve_bar_history(self, contract_: Contract, bar_size: str):
-        if contract_.secType == "OPT" and bar_size == "1 day":
-            logger.debug9("Option Daily Bar, skipping")
-        else:
-            duration = self._set_duration(bar_size)
+    def _retrieve_bar_histories(self, history_requests: deque):
+        """!
+        Keeps up to 'max_requests' historical data requests outstanding until every request has
+        completed, failed or timed out.
+        """
+        completion_queue = queue.Queue()
+        pending = {}
+        start_time = time.monotonic()
+
+        while history_requests or pending:
+            while history_requests and len(pending) < self.max_requests:
+                contract_, bar_size = history_requests.popleft()
+                duration = self._set_duration(bar_size, contract_.localSymbol)
+                cache = self._get_cached_history(contract_, bar_size, duration)
+
+                if cache and cache[2] is not None:
+                    duration = self._gap_duration(bar_size, barcache.get_history_start(cache[2]))
+                    logger.debug3("%s: %s %s bars cached, requesting %s", contract_.localSymbol,
+                                  len(cache[2]), bar_size, duration)
+
+                req_id = self.brokerclient.req_historical_data(
+                    contract_,
+                    bar_size,
+                    duration_str=duration,
+                    what_to_show=self.what_to_show,
+                    use_regular_trading_hours=self.use_regular_trading_hours,
+                    format_date=self.format_date,
+                    completion_queue=completion_queue)
+                pending[req_id] = (contract_, bar_size, time.monotonic(), cache)
+                self.history_requested.setdefault(contract_.localSymbol, {})[bar_size] = (
+                    self.warmup_bars.get(bar_size),
+                    self.history_start.get(contract_.localSymbol, {}).get(bar_size))
+
+            # Checked on every pass, since a steady stream of completions never leaves the queue
+            # empty.
+            deadline = self._cancel_timed_out_histories(pending)
+
+            if not pending:
+                continue
+
+            try:
+                req_id = completion_queue.get(timeout=max(deadline - time.monotonic(), 0))
+            except queue.Empty:
+                continue
+
+            # A request that timed out has already been cancelled.
+            if req_id not in pending:
+                continue
+
+            contract_, bar_size, request_time, cache = pending.pop(req_id)
+            latency = time.monotonic() - request_time
+            bar_list = self.brokerclient.get_data(req_id)
+
+            if isinstance(bar_list, dict):
+                logger.error("%s: Failed to get %s bars after %.2f seconds: %s",
+                             contract_.localSymbol, bar_size, latency, bar_list["Error"])
+
+                if cache and cache[2] is not None:
+                    logger.warning("%s: Using cached %s bars", contract_.localSymbol, bar_size)
+                    self.ohlc_bars[contract_.localSymbol][bar_size] = cache[2]
+            else:
+                logger.debug2("%s: %s %s Bars received in %.2f seconds", contract_.localSymbol,
+                              len(bar_list), bar_size, latency)
+                self._set_bar_history(contract_, bar_size, bar_list, cache)
+
+        logger.debug("Bar history received in %.2f seconds", time.monotonic() - start_time)
+
+    def _cancel_timed_out_histories(self, pending: dict):
+        """!
+        Cancels the historical data requests that were sent HISTORY_TIMEOUT seconds ago, so the
+        client releases them.  Requests still waiting for the pacing rules do not time out.
+
+        @return deadline: The time the next request times out, or HISTORY_TIMEOUT from now when
+            none have been sent.
+        """
+        now = time.monotonic()
+        deadline = now + HISTORY_TIMEOUT
+
+        for req_id, (contract_, bar_size, _, _) in list(pending.items()):
+            sent_time = self.brokerclient.get_history_sent_time(req_id)
+
+            if sent_time is None:
+                continue
 
-            if self.brokerclient:
-                self._retreive_broker_bar_history(contract_, bar_size, duration)
+            if now - sent_time >= HISTORY_TIMEOUT:
+                logger.error("%s: Timed out waiting for %s bars", contract_.localSymbol, bar_size)
+                pending.pop(req_id)
+                self.brokerclient.cancel_historical_data(req_id)
             else:
-                raise NotImplementedError
+                deadline = min(deadline, sent_time + HISTORY_TIMEOUT)
 
-    def _retreive_broker_bar_history(self, contract_: Contract, bar_size: str, duration: str):
-        new_bar_list = []
+        return deadline
 
-        if duration == "all":
-            logger.debug8("Getting all history")
-        else:
-            req_id = self.brokerclient.req_historical_data(contract_,
-                                                           bar_size,
-                                                           duration_str=duration)
+    def _get_cached_history(self, contract_: Contract, bar_size: str, duration: str):
+        """!
+        Looks up the cached history for a request.
+
+        Histories that start from a strategy's own bars are not cached.  Cached bars are not used
+        when the gap since the last cached bar is longer than the request.  Cache files are not
+        keyed by the date format, so only histories requested with format_date 1 are cached.
+
+        @return cache: The cache key, duration and cached bars, None when the request is not cached.
+            The cached bars are None when the full history must be requested.
+        """
+        if self.bar_cache is None or not contract_.conId:
+            return None
+
+        if self.history_start.get(contract_.localSymbol, {}).get(bar_size) or \
+                self.format_date != 1:
+            return None
 
-        # Bar List is a list of ibapi class Bar.
-        bar_list = self.brokerclient.get_data(req_id)
+        cache_key = (contract_.conId, bar_size, self.what_to_show, self.use_regular_trading_hours)
+        cached_bars = self.bar_cache.get_bars(cache_key, duration)
+
+        if cached_bars is not None:
+            gap = self._gap_duration(bar_size, barcache.get_history_start(cached_bars))
+
+            if self._duration_seconds(gap) >= self._duration_seconds(duration):
+                cached_bars = None
+
+        return (cache_key, duration, cached_bars)
+
+    def _duration_seconds(self, duration: str):
+        length, unit = duration.split()
+        return int(length) * DURATION_SECONDS[unit]
+
+    def _set_bar_history(self,
+                         contract_: Contract,
+                         bar_size: str,
+                         bar_list: list,
+                         cache: tuple = None):
+        new_bar_list = []
         logger.debug9("Bar List: %s", bar_list)
-        logger.debug2("%s: %s Bars received", contract_.localSymbol, bar_size)
 
         # This is done to convert the Bar Class into a list of elements.
         for ohlc_bar in bar_list:
@@ -103,10 +307,60 @@ class BrokerBarData(BarData):
                 float(ohlc_bar.volume), ohlc_bar.wap, ohlc_bar.barCount
             ])
 
+        if cache:
+            cache_key, duration, cached_bars = cache
+
+            if cached_bars is not None:
+                new_bar_list = barcache.merge_bars(cached_bars, new_bar_list)
+
+            self.bar_cache.save_bars(cache_key, duration, new_bar_list)
+
         self.ohlc_bars[contract_.localSymbol][bar_size] = new_bar_list
 
-    def _set_duration(self, size: str):
+    def _history_covered(self, ticker: str, bar_size: str):
+        """!
+        Checks whether a ticker's history covers what the strategies now need.
+
+        A strategy added later may need more warm-up bars than the first one, or the full history
+        when the first one was restored from a checkpoint and only needed the gap since.
+        """
+        if bar_size not in self.history_requested.get(ticker, {}):
+            return True
+
+        requested_warmup, requested_start = self.history_requested[ticker][bar_size]
+        needed_start = self.history_start.get(ticker, {}).get(bar_size)
+
+        if needed_start:
+            return not requested_start or requested_start <= needed_start
+
+        if requested_start:
+            return False
+
+        requested_duration = self._full_duration(bar_size, requested_warmup)
+        needed_duration = self._full_duration(bar_size, self.warmup_bars.get(bar_size))
+
+        return self._duration_seconds(requested_duration) >= self._duration_seconds(needed_duration)
+
+    def _set_duration(self, size: str, ticker: str = None):
         logger.debug5("Setting Duration for Bar Size: %s", size)
+        history_start = self.history_start.get(ticker, {}).get(size)
+
+        if history_start:
+            duration = self._gap_duration(size, history_start)
+            logger.debug9("Duration Set to %s to fill the gap since %s", duration, history_start)
+            return duration
+
+        return self._full_duration(size, self.warmup_bars.get(size))
+
+    def _full_duration(self, size: str, warmup_bars: int = None):
+        """!
+        Returns the duration of a full history, long enough for the warm-up bars when they are set.
+        """
+        if warmup_bars:
+            duration = self._warmup_duration(size, warmup_bars)
+            logger.debug9("Duration Set to %s for %s warmup bars", duration, warmup_bars)
+            return duration
+
         if size == "1 month":
             duration = "2 Y"
         elif size == "1 week":
@@ -127,13 +381,109 @@ class BrokerBarData(BarData):
 
         return duration
 
+    def _gap_duration(self, size: str, history_start: float):
+        """!
+        Returns the smallest duration that covers the time since history_start.  One extra bar is
+        included so the bar in progress at history_start is refreshed.
+        """
+        gap_seconds = datetime.datetime.now().timestamp() - history_start
+
+        if size in BAR_SECONDS:
+            gap_seconds += BAR_SECONDS[size]
+
+            if gap_seconds < 86400:
+                return str(math.ceil(gap_seconds)) + " S"
+
+        return str(math.ceil(gap_seconds / 86400) + 1) + " D"
+
+    def _warmup_duration(self, size: str, bars_needed: int):
+        """!
+        Returns the smallest duration that covers the bars needed during regular trading hours.
+
+        One extra day, week or month is added, since the current period is usually incomplete.
+        """
+        if size == "1 month":
+            months = bars_needed + 1
+            return str(math.ceil(months / 12)) + " Y" if months > 12 else str(months) + " M"
+        elif size == "1 week":
+            weeks = bars_needed + 1
+            return str(math.ceil(weeks / 52)) + " Y" if weeks > 52 else str(weeks) + " W"
+        elif size == "1 day":
+            days = bars_needed + 1
+            return str(math.ceil(days / 252)) + " Y" if days > 252 else str(days) + " D"
+
+        bars_per_day = max(RTH_SECONDS // BAR_SECONDS[size], 1)
+        days = math.ceil(bars_needed / bars_per_day) + 1
+        return str(days) + " D"
+
 
 class BrokerContractData(ContractData):
 
+    def __init__(self):
+        super().__init__()
+        ## The market rule id and minimum tick for each ticker, used to find its price increments.
+        self.price_rules = {}
+
+        ## Contract details from earlier runs.  None to always request them.
+        self.contract_cache = contractcache.ContractCache()
+
+    def get_price_increments(self, ticker: str):
+        """!
+        Returns the valid price increments for a ticker.
+
+        The contract's minimum tick is used until its market rule has been received.
+
+        @param ticker: The contract's ticker.
+
+        @return price_increments: A list of (low edge, increment), or None if the ticker is unknown.
+        """
+        if ticker not in self.price_rules:
+            return None
+
+        market_rule_id, min_tick = self.price_rules[ticker]
+        price_increments = None
+
+        if market_rule_id is not None:
+            price_increments = self.brokerclient.get_market_rule(market_rule_id)
+
+        if price_increments is None and min_tick:
+            price_increments = [(0.0, min_tick)]
+
+        return price_increments
+
     def request_contract_data(self, ticker, contract_):
-        if ticker not in list(self.contracts.keys()):
-            logger.debug9("Requesting Contract Details for contract: %s", ticker)
-            req_id = self.brokerclient.req_contract_details(contract_)
+        self.request_contracts({ticker: contract_})
+
+    def request_contracts(self, contracts: dict):
+        """!
+        Resolves the contracts that are not known yet.
+
+        Cached contract details are used until they expire.  Every other contract is requested at
+        once, and the details are collected as they arrive.
+
+        @param contracts: The contracts to resolve, keyed by ticker.
+
+        @return None
+        """
+        req_ids = {}
+
+        for ticker, contract_ in contracts.items():
+            if ticker in self.contracts or ticker in req_ids:
+                continue
+
+            contract_details = None
+
+            if self.contract_cache is not None:
+                contract_details = self.contract_cache.get_details(contract_)
+
+            if contract_details is not None:
+                logger.debug2("Using Cached Contract Details for Ticker: %s", ticker)
+                self._add_contract(contract_details)
+            else:
+                logger.debug9("Requesting Contract Details for contract: %s", ticker)
+                req_ids[ticker] = self.brokerclient.req_contract_details(contract_)
+
+        for ticker, req_id in req_ids.items():
             contract_details = self.brokerclient.get_data(req_id)
 
             if isinstance(contract_details, (dict, set)):
@@ -141,35 +491,294 @@ class BrokerContractData(ContractData):
                              contract_details["Error"])
             else:
                 logger.debug2("Received Contract Details for Ticker: %s", ticker)
-                new_contract = contract_details.contract
-                self.tickers.append(new_contract.localSymbol)
-                self.contracts[new_contract.localSymbol] = new_contract
+                self._add_contract(contract_details)
+
+                if self.contract_cache is not None:
+                    self.contract_cache.save_details(contracts[ticker], contract_details)
+
+    # ==============================================================================================
+    #
+    # Internal Use only functions.  These should not be used outside the class.
+    #
+    # ==============================================================================================
+    def _add_contract(self, contract_details):
+        new_contract = contract_details.contract
+
+        if new_contract.localSymbol not in self.tickers:
+            self.tickers.append(new_contract.localSymbol)
+
+        self.contracts[new_contract.localSymbol] = new_contract
+        self._set_price_rule(contract_details)
+
+    def _set_price_rule(self, contract_details):
+        """!
+        Stores the contract's market rule id and requests the rule's price increments.
+
+        The contract details list a market rule for each valid exchange.  The rule for the
+        contract's exchange is used, or its primary exchange when it is SMART routed.
+        """
+        new_contract = contract_details.contract
+        exchanges = contract_details.validExchanges.split(",")
+        market_rule_ids = contract_details.marketRuleIds.split(",")
+        market_rule_id = None
+
+        if len(exchanges) == len(market_rule_ids):
+            exchange_rules = dict(zip(exchanges, market_rule_ids))
+            market_rule_id = exchange_rules.get(new_contract.exchange,
+                                                exchange_rules.get(new_contract.primaryExchange))
+
+        if market_rule_id is None and market_rule_ids[0]:
+            market_rule_id = market_rule_ids[0]
+
+        if market_rule_id is not None:
+            market_rule_id = int(market_rule_id)
+            self.brokerclient.req_market_rule(market_rule_id)
+
+        self.price_rules[new_contract.localSymbol] = (market_rule_id, contract_details.minTick)
 
 
 class BrokerMarketData(MarketData):
 
+    def __init__(self,
+                 subscriptions: SubscriptionRegistry = None,
+                 line_manager: LineManager = None):
+        super().__init__(subscriptions)
+        ## The generic ticks requested for each ticker.  None when the default list was requested.
+        self.generic_ticks = {}
+        ## The latest bid, ask and last price for each ticker, keyed by tick type.
+        self.quotes = {}
+        ## Shares the market data lines with the other streams.
+        self.line_manager = line_manager if line_manager is not None else LineManager()
+        self.line_manager.set_handlers(MARKET_DATA_EVENT, self._start_market_data,
+                                       self._stop_market_data)
+
+    def cancel_market_data(self, tickers: list):
+        for ticker in tickers:
+            self._stop_market_data(ticker)
+            self.contracts.pop(ticker, None)
+            self.generic_ticks.pop(ticker, None)
+
+            if ticker in self.tickers:
+                self.tickers.remove(ticker)
+
+        for ticker in tickers:
+            self.line_manager.release(MARKET_DATA_EVENT, ticker)
+
+    def get_price(self, ticker: str):
+        """!
+        Returns the bid/ask midpoint for a ticker, or the last price when there is no quote.
+
+        @param ticker: The ticker to price.
+
+        @return price: The price, or None if no price has been received or the ticker's market
+            data is not streaming.
+        """
+        # Copied first, since this is called from other threads while streams start and stop.
+        if ticker not in list(self.rtmd_ids.values()):
+            return None
+
+        quote = self.quotes.get(ticker, {})
+        bid = quote.get(1, 0.0)
+        ask = quote.get(2, 0.0)
+
+        if bid > 0 and ask > 0:
+            return (bid + ask) / 2
+
+        return quote.get(4)
+
     def request_market_data(self):
         for ticker, contract_ in self.contracts.items():
+            generic_ticks = self._get_generic_ticks(ticker, contract_)
+
             if ticker not in self.rtmd_ids.values():
-                logger.debug2("Requesting Market Data for Ticker: %s", ticker)
-                req_id = self.brokerclient.req_market_data(contract_)
-                self.rtmd_ids[req_id] = ticker
+                self.line_manager.request(MARKET_DATA_EVENT, ticker, contract_.secType)
+            elif self._needs_more_ticks(ticker, generic_ticks):
+                # TWS can not change the generic ticks of a subscription, so it is renewed.
+                for req_id in [key for key, value in self.rtmd_ids.items() if value == ticker]:
+                    self.brokerclient.cancel_mkt_data(req_id)
+                    self.rtmd_ids.pop(req_id)
+
+                if generic_ticks is not None:
+                    generic_ticks = sorted(set(generic_ticks) | set(self.generic_ticks[ticker]))
+
+                self._request_market_data(ticker, contract_, generic_ticks)
 
     def send_market_data_ticks(self, market_data: dict):
         req_id = list(market_data.keys())[0]
+
+        # Ticks can still arrive for a request that was just cancelled.
+        if req_id not in self.rtmd_ids:
+            return
+
         self.ticker = self.rtmd_ids[req_id]
         self.market_data = market_data[req_id]
+        self.line_manager.touch(MARKET_DATA_EVENT, self.ticker)
+
+        if self.market_data[0] == "tick_price" and self.market_data[1] in QUOTE_TICK_TYPES:
+            if self.market_data[2] > 0:
+                self.quotes.setdefault(self.ticker, {})[self.market_data[1]] = self.market_data[2]
+
         self.notify()
 
 
+    # ==============================================================================================
+    #
+    # Internal Use only functions.  These should not be used outside the class.
+    #
+    # ==============================================================================================
+    def _get_generic_ticks(self, ticker: str, contract_: Contract):
+        """!
+        Returns the generic ticks needed by every strategy using the ticker.  Returns None if any of
+        those strategies has not set its tick types.
+        """
+        tick_types = set()
+
+        for observer in self._observers:
+            if observer.has_ticker(ticker):
+                if observer.tick_types is None:
+                    return None
+                tick_types.update(observer.tick_types)
+
+        return marketdata.get_generic_ticks(tick_types, contract_.secType)
+
+    def _needs_more_ticks(self, ticker: str, generic_ticks: list):
+        current_ticks = self.generic_ticks.get(ticker)
+
+        if current_ticks is None:
+            return False
+        elif generic_ticks is None:
+            return True
+        else:
+            return not set(generic_ticks).issubset(current_ticks)
+
+    def _request_market_data(self, ticker: str, contract_: Contract, generic_ticks: list):
+        logger.debug2("Requesting Market Data for Ticker: %s, Generic Ticks: %s", ticker,
+                      generic_ticks)
+
+        if generic_ticks is None:
+            req_id = self.brokerclient.req_market_data(contract_)
+        else:
+            generic_tick_list = ", ".join(str(generic_tick) for generic_tick in generic_ticks)
+            req_id = self.brokerclient.req_market_data(contract_, generic_tick_list)
+
+        self.rtmd_ids[req_id] = ticker
+        self.generic_ticks[ticker] = generic_ticks
+
+    def _start_market_data(self, ticker: str):
+        contract_ = self.contracts[ticker]
+        self._request_market_data(ticker, contract_, self._get_generic_ticks(ticker, contract_))
+
+    def _stop_market_data(self, ticker: str):
+        for req_id in [key for key, value in self.rtmd_ids.items() if value == ticker]:
+            logger.debug2("Cancelling Market Data for Ticker: %s", ticker)
+            self.brokerclient.cancel_mkt_data(req_id)
+            self.rtmd_ids.pop(req_id)
+
+        # The quotes would go stale while the stream is stopped.
+        self.quotes.pop(ticker, None)
+
+
 class BrokerOptionData(OptionData):
 
+    def __init__(self):
+        super().__init__()
+        ## Option chains from earlier requests and runs.  None to always request them.
+        self.option_cache = optioncache.OptionCache()
+
+        ## Tickers whose option chain is being refreshed in the background.
+        self.refreshing = set()
+        self.refresh_lock = threading.Lock()
+
+        ## Held while option details are stored and sent, since refreshed chains are stored and
+        ## sent from the refresh threads.
+        self.details_lock = threading.RLock()
+
     def request_option_details(self):
-        for ticker, contract_ in self.contracts.items():
-            logger.debug2("Requesting Option Details for Ticker: %s", ticker)
-            req_id = self.brokerclient.req_sec_def_opt_params(contract_)
-            option_details = self.brokerclient.get_data(req_id)
-            self.option_details[ticker] = option_details
+        """!
+        Gets the option chain parameters for every ticker.
+
+        Cached parameters are used at once.  Parameters from an earlier day are refreshed in the
+        background, and the refreshed chain is sent to the strategies as soon as it arrives.  Only
+        chains that are not cached at all are waited for.  Hold details_lock until the details
+        have been sent, so a refreshed chain is not overwritten or sent first.
+        """
+        with self.details_lock:
+            for ticker, contract_ in self.contracts.items():
+                option_details = None
+                stale = False
+
+                if self.option_cache is not None and contract_.conId:
+                    option_details, current = self.option_cache.get_option_details(
+                        contract_.conId)
+                    stale = option_details is not None and not current
+
+                if option_details is None:
+                    option_details = self._get_option_details(ticker, contract_)
+
+                if option_details is None:
+                    continue
+
+                self.option_details[ticker] = option_details
+
+                if stale:
+                    self._start_refresh(ticker, contract_)
+
+    # ==============================================================================================
+    #
+    # Internal Use only functions.  These should not be used outside the class.
+    #
+    # ==============================================================================================
+    def _get_option_details(self, ticker: str, contract_: Contract):
+        """!
+        Requests a ticker's option chain parameters.
+
+        @return option_details: The parameters, None if the request failed or the ticker has no
+            options.
+        """
+        logger.debug2("Requesting Option Details for Ticker: %s", ticker)
+        req_id = self.brokerclient.req_sec_def_opt_params(contract_)
+        option_details = self.brokerclient.get_data(req_id)
+
+        if not isinstance(option_details, dict) or "Error" in option_details:
+            logger.error("No option details for %s: %s", ticker, option_details)
+            return None
+
+        if self.option_cache is not None and contract_.conId:
+            self.option_cache.save_option_details(contract_.conId, option_details)
+
+        return option_details
+
+    def _refresh_option_details(self, ticker: str, contract_: Contract):
+        try:
+            option_details = self._get_option_details(ticker, contract_)
+
+            # The cached chain is kept when the refresh fails.
+            if option_details is not None:
+                with self.details_lock:
+                    self.option_details[ticker] = option_details
+                    self.updated_tickers = [ticker]
+
+                    try:
+                        self.notify()
+                    finally:
+                        self.updated_tickers = None
+
+                logger.debug2("Option Details Refreshed for Ticker: %s", ticker)
+        finally:
+            with self.refresh_lock:
+                self.refreshing.discard(ticker)
+
+    def _start_refresh(self, ticker: str, contract_: Contract):
+        with self.refresh_lock:
+            if ticker in self.refreshing:
+                return
+
+            self.refreshing.add(ticker)
+
+        refresh_thread = threading.Thread(target=self._refresh_option_details,
+                                          args=(ticker, contract_),
+                                          daemon=True)
+        refresh_thread.start()
 
 
 class BrokerOrderData(OrderData):
@@ -189,9 +798,43 @@ class BrokerOrderData(OrderData):
         self.valid_order_ids.append(order_id)
         self.brokerclient.place_order(order_contract, new_order, order_id)
 
+    def modify_order(self, order_contract: Contract, new_order: Order, order_id: int):
+        """!
+        Places an order again with its existing id, which the broker treats as a modification.
+
+        Orders that are no longer working are not resent, since that would place a new order.
+        """
+        if order_id not in self.valid_order_ids:
+            logger.warning("Order %s is no longer working, not modifying it", order_id)
+            return
+
+        self.brokerclient.place_order(order_contract, new_order, order_id)
+
+    def send_commission_report(self, commission_report: dict):
+        exec_id = list(commission_report.keys())[0]
+
+        # Commission reports only carry the execution id, so they are matched to the order through
+        # the execution.
+        if exec_id not in self.exec_order_ids:
+            logger.debug3("Commission report for unknown execution: %s", exec_id)
+            return
+
+        self.order_id = self.exec_order_ids.pop(exec_id)
+        report = commission_report[exec_id]
+        report["exec_id"] = exec_id
+        self.order_message = {"commission_report": {self.order_id: report}}
+        self.notify()
+
+    def send_order_execution(self, order_execution: dict):
+        self.order_id = list(order_execution.keys())[0]
+        self.exec_order_ids[order_execution[self.order_id]["exec_id"]] = self.order_id
+        self.order_message = {"order_execution": order_execution}
+        self.notify()
+
     def send_order_status(self, order_status: dict):
         self.order_id = list(order_status.keys())[0]
         self.order_status = order_status
+        self.order_message = {"order_status": order_status}
         status = order_status[self.order_id]["status"]
 
         if status in ["Filled", "Cancelled", "ApiCancelled", "TWS_CLOSED"]:
@@ -203,16 +846,39 @@ class BrokerOrderData(OrderData):
 
 class BrokerRealTimeBarData(RealTimeBarData):
 
+    def __init__(self,
+                 subscriptions: SubscriptionRegistry = None,
+                 line_manager: LineManager = None):
+        super().__init__(subscriptions)
+        ## Shares the market data lines with the other streams.
+        self.line_manager = line_manager if line_manager is not None else LineManager()
+        self.line_manager.set_handlers(REAL_TIME_BARS_EVENT, self._start_real_time_bars,
+                                       self._stop_real_time_bars)
+
+    def cancel_real_time_bars(self, tickers: list):
+        for ticker in tickers:
+            self._stop_real_time_bars(ticker)
+            self.contracts.pop(ticker, None)
+
+            if ticker in self.tickers:
+                self.tickers.remove(ticker)
+
+        for ticker in tickers:
+            self.line_manager.release(REAL_TIME_BARS_EVENT, ticker)
+
     def request_real_time_bars(self):
         for ticker, contract_ in self.contracts.items():
             if ticker not in self.rtb_ids.values():
-                logger.debug2("Requesting Real Time Bars for Ticker: %s", ticker)
-                req_id = self.brokerclient.req_real_time_bars(contract_)
-                self.rtb_ids[req_id] = ticker
+                self.line_manager.request(REAL_TIME_BARS_EVENT, ticker, contract_.secType)
 
     def send_real_time_bars(self, real_time_bar: dict):
         # There should really only be one key.
         req_id = list(real_time_bar.keys())[0]
+
+        # Bars can still arrive for a request that was just cancelled.
+        if req_id not in self.rtb_ids:
+            return
+
         self.ticker = self.rtb_ids[req_id]
 
         rtb = real_time_bar[req_id]
@@ -223,4 +889,21 @@ class BrokerRealTimeBarData(RealTimeBarData):
         rtb[5] = int(rtb[5])
         rtb[6] = float(rtb[6])
         self.ohlc_bar = rtb
+        self.line_manager.touch(REAL_TIME_BARS_EVENT, self.ticker)
         self.notify()
+
+    # ==============================================================================================
+    #
+    # Internal Use only functions.  These should not be used outside the class.
+    #
+    # ==============================================================================================
+    def _start_real_time_bars(self, ticker: str):
+        logger.debug2("Requesting Real Time Bars for Ticker: %s", ticker)
+        req_id = self.brokerclient.req_real_time_bars(self.contracts[ticker])
+        self.rtb_ids[req_id] = ticker
+
+    def _stop_real_time_bars(self, ticker: str):
+        for req_id in [key for key, value in self.rtb_ids.items() if value == ticker]:
+            logger.debug2("Cancelling Real Time Bars for Ticker: %s", ticker)
+            self.brokerclient.cancel_real_time_bars(req_id)
+            self.rtb_ids.pop(req_id)
@@ -24,6 +24,7 @@ Provides the application process manager
 # Standard Libraries
 import importlib
 import multiprocessing
+import threading
 
 from multiprocessing import Queue
 
@@ -49,41 +50,266 @@ logger = logging.getLogger(__name__)
 ## The python formatted location of the strategies
 IMPORT_PATH = "pytrader.strategies."
 
+## The range of order ids reserved for each strategy
+ORDER_ID_RANGE = 1000
+
+## Separates the strategy id from the shard number in a shard id
+SHARD_SEPARATOR = "_shard"
+
 
 # ==================================================================================================
 #
 # Classes
 #
 # ==================================================================================================
+class StrategyHostQueue():
+    """!
+    Stands in for a strategy's data queue, in the broker, when the strategy runs inside a
+    StrategyHost.
+
+    Every hosted strategy's queue writes through the host's StrategyHostWriter.  The broker only
+    puts messages on it.  The host reads the shared queue and calls each strategy itself, so get and
+    empty are not available.
+    """
+
+    def __init__(self, writer, strategy_id: str):
+        self.writer = writer
+        self.strategy_id = strategy_id
+
+    def empty(self):
+        raise NotImplementedError("Hosted strategies receive messages from their StrategyHost")
+
+    def flush(self):
+        self.writer.flush()
+
+    def get(self, *args, **kwargs):
+        raise NotImplementedError("Hosted strategies receive messages from their StrategyHost")
+
+    def put(self, message):
+        self.writer.put(self.strategy_id, message)
+
+
+class StrategyHostWriter():
+    """!
+    Puts the broker's messages for every hosted strategy on the host's queue.
+
+    Messages pickled once for several strategies (see Subject.get_message) are held until the event
+    that sent them ends, then put on the queue once with the ids of every strategy they are for.
+    Other messages are put immediately, after anything held, so every strategy still receives its
+    messages in order.
+    """
+
+    def __init__(self, host_queue: Queue):
+        self.host_queue = host_queue
+
+        ## The held messages, each with the ids of the strategies it is for.
+        self.held = []
+        self.lock = threading.Lock()
+
+    def flush(self):
+        with self.lock:
+            held, self.held = self.held, []
+
+            for message, strategy_ids in held:
+                self.host_queue.put((strategy_ids, message))
+
+    def put(self, strategy_id: str, message):
+        if not isinstance(message, bytes):
+            self.flush()
+            self.host_queue.put(([strategy_id], message))
+            return
+
+        with self.lock:
+            for held_message, strategy_ids in self.held:
+                if held_message is message:
+                    strategy_ids.append(strategy_id)
+                    return
+
+            self.held.append((message, [strategy_id]))
+
+
+class StrategyHost():
+    """!
+    Runs several strategies in one process from one shared data queue.
+
+    Each message on the queue is sent once by the broker, with the ids of every strategy it is for,
+    and is handed to each of them here.
+    """
+
+    def __init__(self, host_queue: Queue):
+        self.host_queue = host_queue
+        self.strategies = {}
+
+    def add_strategy(self, strategy_id: str, strategy):
+        self.strategies[strategy_id] = strategy
+
+    def run(self):
+        """!
+        Starts every hosted strategy, then passes each message to the strategy it is addressed to
+        until all strategies have ended.
+        """
+        running = dict(self.strategies)
+
+        try:
+            for strategy_id, strategy in self.strategies.items():
+                logger.debug("Starting Hosted Strategy: %s", strategy_id)
+                strategy.start_strategy()
+
+            while len(running) > 0:
+                strategy_ids, message = self.host_queue.get()
+
+                for strategy_id in strategy_ids:
+                    if strategy_id in running:
+                        if not running[strategy_id].process_message(message):
+                            logger.debug("Hosted Strategy Finished: %s", strategy_id)
+                            running.pop(strategy_id).end_strategy()
+
+        except KeyboardInterrupt:
+            logger.critical("Received Keyboard Interupt! Ending hosted strategies!")
+            for strategy in running.values():
+                strategy.end_strategy()
+
+
 class StrategyProcess():
     """!
     This prosess manages the various strategies that are running.
     """
 
-    def __init__(self, cmd_queue: Queue, data_queue: dict, next_order_id: int):
+    def __init__(self,
+                 cmd_queue: Queue,
+                 data_queue: dict,
+                 next_order_id: int,
+                 host_queue: Queue = None,
+                 shards: int = 1,
+                 warmup_mode: bool = False,
+                 order_queue: dict = None):
         self.cmd_queue = cmd_queue
         self.data_queue = data_queue
         self.next_order_id = next_order_id
+        self.host_queue = host_queue
+        self.shards = shards
+        self.warmup_mode = warmup_mode
+        self.order_queue = order_queue if order_queue is not None else {}
         self.strategy_process = {}
 
     def run(self, strategy_list):
         """!
         Runs the various strategies.
+
+        When a host queue is set, every strategy runs in this process through a StrategyHost.
+        When shards are set, each strategy's tickers are split across that many processes.
+        Otherwise each strategy runs in its own process.
         """
+        if self.host_queue is not None:
+            self._run_host(strategy_list)
+        elif self.shards > 1:
+            self._run_shards(strategy_list)
+        else:
+            self._run_processes(strategy_list)
+
+    # ==============================================================================================
+    #
+    # Private Functions
+    #
+    # ==============================================================================================
+    def _create_strategy(self, index: int, strategy_id: str):
+        order_id = self.next_order_id + (index * ORDER_ID_RANGE)
+        logger.debug("Order Id for Strategy %s: %s", strategy_id, order_id)
+        module_name = IMPORT_PATH + strategy_id
+        module = importlib.import_module(module_name, __name__)
+        strategy = module.Strategy(self.cmd_queue, self.data_queue[strategy_id], order_id,
+                                   strategy_id)
+        strategy.warmup_mode = self.warmup_mode
+
+        if self.order_queue.get(strategy_id):
+            strategy.set_order_queue(self.order_queue[strategy_id])
+
+        return strategy
+
+    def _create_shard(self, index: int, strategy_id: str, shard: int):
+        shard_id = get_shard_id(strategy_id, shard)
+        shard_range = ORDER_ID_RANGE // self.shards
+        order_id = self.next_order_id + (index * ORDER_ID_RANGE) + (shard * shard_range)
+        logger.debug("Order Id for Strategy %s: %s", shard_id, order_id)
+        module_name = IMPORT_PATH + strategy_id
+        module = importlib.import_module(module_name, __name__)
+        strategy = module.Strategy(self.cmd_queue, self.data_queue[shard_id], order_id, shard_id)
+        strategy.set_shard(shard, self.shards)
+        strategy.warmup_mode = self.warmup_mode
+
+        if self.order_queue.get(shard_id):
+            strategy.set_order_queue(self.order_queue[shard_id])
+
+        return strategy
+
+    def _run_host(self, strategy_list):
+        host = StrategyHost(self.host_queue)
+
+        for index, strategy_id in enumerate(strategy_list):
+            host.add_strategy(strategy_id, self._create_strategy(index, strategy_id))
+
+        host.run()
+
+    def _run_processes(self, strategy_list):
         try:
             for index, strategy_id in enumerate(strategy_list):
-                order_id = self.next_order_id + (index * 1000)
-                logger.debug("Order Id for Strategy %s: %s", strategy_id, order_id)
-                module_name = IMPORT_PATH + strategy_id
-                module = importlib.import_module(module_name, __name__)
-                strategy = module.Strategy(self.cmd_queue, self.data_queue[strategy_id], order_id,
-                                           strategy_id)
+                strategy = self._create_strategy(index, strategy_id)
                 self.strategy_process[strategy_id] = multiprocessing.Process(target=strategy.run,
                                                                              args=())
                 self.strategy_process[strategy_id].start()
 
-        except KeyboardInterrupt as msg:
+        except KeyboardInterrupt:
             logger.critical("Received Keyboard Interupt! Ending strategy processeses!")
         finally:
-            for strategy_id in strategy_list:
-                self.strategy_process[strategy_id].join()
+            for strategy_process in self.strategy_process.values():
+                strategy_process.join()
+
+    def _run_shards(self, strategy_list):
+        try:
+            for index, strategy_id in enumerate(strategy_list):
+                for shard in range(self.shards):
+                    strategy = self._create_shard(index, strategy_id, shard)
+
+                    # With more shards than tickers, the last shards have nothing to run.
+                    if len(strategy.security) == 0:
+                        logger.warning("Shard %s of %s has no tickers, not starting it", shard,
+                                       strategy_id)
+                        continue
+
+                    self.strategy_process[strategy.strategy_id] = multiprocessing.Process(
+                        target=strategy.run, args=())
+                    self.strategy_process[strategy.strategy_id].start()
+
+        except KeyboardInterrupt:
+            logger.critical("Received Keyboard Interupt! Ending strategy processeses!")
+        finally:
+            for strategy_process in self.strategy_process.values():
+                strategy_process.join()
+
+
+# ==================================================================================================
+#
+# Functions
+#
+# ==================================================================================================
+def get_shard_id(strategy_id: str, shard: int):
+    return strategy_id + SHARD_SEPARATOR + str(shard)
+
+
+def get_strategy_ids(strategy_list: list, shards: int = 1):
+    """!
+    Returns the ids the broker will see for the strategies.  Each shard is a separate strategy to
+    the broker, so data is routed to a shard by the tickers it requested.
+
+    @param strategy_list: The strategies to run.
+    @param shards: The number of shards each strategy is split into.
+
+    @return strategy_ids: The strategy ids.
+    """
+    if shards <= 1:
+        return list(strategy_list)
+
+    return [
+        get_shard_id(strategy_id, shard) for strategy_id in strategy_list
+        for shard in range(shards)
+    ]
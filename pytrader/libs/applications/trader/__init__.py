@@ -58,6 +58,8 @@ class ProcessManager():
     def __init__(self):
         self.cmd_queue = multiprocessing.Queue()
         self.data_queue = {}
+        self.order_queue = {}
+        self.host_queue = None
         self.broker_process = None
         self.strategy_process = None
 
@@ -65,16 +67,27 @@ class ProcessManager():
                       address,
                       broker_id: str = BROKER_ID,
                       client_id: int = CLIENT_ID,
-                      strategy_list: list = []):
+                      strategy_list: list = [],
+                      host_strategies: bool = False,
+                      shards: int = 1,
+                      warmup_mode: bool = False,
+                      netting_window: float = 0.0):
         """!
         Runs the various subprocesses.
 
         @param processed_args: A list of arguments.
+        @param host_strategies: Run all strategies in a single process from one shared data queue.
+        @param shards: Split each strategy's tickers across this many processes.
+        @param warmup_mode: Only gather the strategies' contracts, option chains and history, save a
+            checkpoint for each and exit.
+        @param netting_window: Seconds to collect market orders for a contract and net them across
+            strategies.  Orders are not netted when 0.
 
         @return None
         """
         try:
-            self._run_broker_process(address, broker_id, client_id, strategy_list)
+            self._run_broker_process(address, broker_id, client_id, strategy_list,
+                                     host_strategies, shards, warmup_mode, netting_window)
             # This ensures we have the next order ID before doing anything else.
             next_order_id = 0
             while next_order_id == 0:
@@ -83,7 +96,7 @@ class ProcessManager():
                     next_order_id = message["next_order_id"]
 
             if len(strategy_list) > 0:
-                self._run_strategy_process(strategy_list, next_order_id)
+                self._run_strategy_process(strategy_list, next_order_id, shards, warmup_mode)
         except BrokerNotAvailable as msg:
             logger.critical("Broker Not Available. %s", msg)
 
@@ -100,24 +113,43 @@ class ProcessManager():
                             address: str,
                             broker_id: str,
                             client_id: int,
-                            strategy_list: list = []):
+                            strategy_list: list = [],
+                            host_strategies: bool = False,
+                            shards: int = 1,
+                            warmup_mode: bool = False,
+                            netting_window: float = 0.0):
         self.data_queue["Main"] = multiprocessing.Queue()
-
-        if len(strategy_list) > 0:
-            for strategy_id in strategy_list:
-                strategy_data_queue = multiprocessing.Queue()
+        strategy_ids = strategy.get_strategy_ids(strategy_list, shards)
+
+        if host_strategies:
+            self.host_queue = multiprocessing.Queue()
+            host_writer = strategy.StrategyHostWriter(self.host_queue)
+
+        if len(strategy_ids) > 0:
+            for strategy_id in strategy_ids:
+                if host_strategies:
+                    strategy_data_queue = strategy.StrategyHostQueue(host_writer, strategy_id)
+                else:
+                    strategy_data_queue = multiprocessing.Queue()
                 self.data_queue[strategy_id] = strategy_data_queue
+                self.order_queue[strategy_id] = multiprocessing.Queue()
 
         broker_client = broker.BrokerProcess(self.cmd_queue, self.data_queue, address, broker_id,
-                                             client_id)
-        if len(strategy_list) > 0:
-            broker_client.set_strategies(strategy_list)
+                                             client_id, warmup_mode, self.order_queue,
+                                             netting_window)
+        if len(strategy_ids) > 0:
+            broker_client.set_strategies(strategy_ids)
 
         self.broker_process = multiprocessing.Process(target=broker_client.run)
         self.broker_process.start()
 
-    def _run_strategy_process(self, strategy_list: list, next_order_id: int):
-        strat = strategy.StrategyProcess(self.cmd_queue, self.data_queue, next_order_id)
+    def _run_strategy_process(self,
+                              strategy_list: list,
+                              next_order_id: int,
+                              shards: int = 1,
+                              warmup_mode: bool = False):
+        strat = strategy.StrategyProcess(self.cmd_queue, self.data_queue, next_order_id,
+                                         self.host_queue, shards, warmup_mode, self.order_queue)
         self.strategy_process = multiprocessing.Process(target=strat.run, args=(strategy_list, ))
         self.strategy_process.start()
 
@@ -121,6 +121,19 @@ class BasicBars():
     def create_dataframe(self):
         self.bars = self._create_dataframe(self.bar_list)
 
+    def merge_bars(self, bar_list: list):
+        """!
+        Adds history to the bars, skipping any bars that are already held.
+
+        @param bar_list: A list of bars.
+
+        @return None
+        """
+        known_dates = {ohlc_bar[0] for ohlc_bar in self.bar_list}
+        self.bar_list.extend(ohlc_bar for ohlc_bar in bar_list if ohlc_bar[0] not in known_dates)
+        self.bar_list.sort(key=lambda ohlc_bar: ohlc_bar[0])
+        self.create_dataframe()
+
     def rescale(self, size):
         seconds = self._bar_seconds(size)
         bar_datetime = datetime.datetime.strptime(self.bar_list[-1][0], "%Y%m%d %H:%M:%S %Z")
@@ -0,0 +1,188 @@
+"""!@package pytrader.libs.checkpoints
+
+Provides checkpoints of strategy state, so a restarted strategy does not need to rebuild it.
+
+@author G. S. Derber
+@date 2022-2023
+@copyright GNU Affero General Public License
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU Affero General Public License as
+    published by the Free Software Foundation, either version 3 of the
+    License, or (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU Affero General Public License for more details.
+
+    You should have received a copy of the GNU Affero General Public License
+    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+@file pytrader/libs/checkpoints/__init__.py
+"""
+# Standard libraries
+import datetime
+import os
+import pathlib
+import pickle
+import tempfile
+import threading
+
+# 3rd Party libraries
+
+# System Library Overrides
+from pytrader.libs.system import logging
+
+# Other Application Libraries
+
+# ==================================================================================================
+#
+# Global Variables
+#
+# ==================================================================================================
+logger = logging.getLogger(__name__)
+
+## Directory the checkpoints are saved in.
+CHECKPOINT_DIR = os.path.expanduser("~") + "/.config/investing/checkpoints/"
+
+## Threads writing checkpoints in the background, keyed by strategy id.
+background_saves = {}
+
+
+# ==================================================================================================
+#
+# Functions
+#
+# ==================================================================================================
+def get_checkpoint_file(strategy_id: str):
+    return CHECKPOINT_DIR + strategy_id + ".pickle"
+
+
+def load_checkpoint(strategy_id: str):
+    """!
+    Loads the strategy's checkpoint.  Only checkpoints taken today are loaded.
+
+    @param strategy_id: The strategy the checkpoint belongs to.
+
+    @return checkpoint: The checkpointed state, or None if there is no usable checkpoint.
+    """
+    filename = get_checkpoint_file(strategy_id)
+
+    if not os.path.exists(filename):
+        return None
+
+    try:
+        with open(filename, "rb") as checkpoint_file:
+            checkpoint = pickle.load(checkpoint_file)
+    except (OSError, pickle.UnpicklingError, EOFError, AttributeError) as msg:
+        logger.error("Unable to load checkpoint '%s': %s", filename, msg)
+        return None
+
+    timestamp = datetime.datetime.fromtimestamp(checkpoint["timestamp"])
+
+    if timestamp.date() != datetime.date.today():
+        logger.debug2("Ignoring checkpoint from %s", timestamp)
+        return None
+
+    logger.debug("Loaded checkpoint for %s from %s", strategy_id, timestamp)
+    return checkpoint
+
+
+def save_checkpoint(strategy_id: str, checkpoint: dict):
+    """!
+    Saves the strategy's checkpoint.
+
+    The checkpoint is written to a temporary file that then replaces the old checkpoint, so a crash
+    while saving never leaves a partial checkpoint.  A background save still running is waited for
+    first, so it cannot replace this checkpoint with an older one.
+
+    @param strategy_id: The strategy the checkpoint belongs to.
+    @param checkpoint: The state to save.  A 'timestamp' of the current time is added.
+
+    @return None
+    """
+    _wait_for_background_save(strategy_id)
+
+    try:
+        _write_checkpoint(strategy_id, _dump_checkpoint(checkpoint))
+        logger.debug3("Saved checkpoint for %s", strategy_id)
+    except (OSError, pickle.PicklingError) as msg:
+        logger.error("Unable to save checkpoint for %s: %s", strategy_id, msg)
+
+
+def save_checkpoint_background(strategy_id: str, checkpoint: dict):
+    """!
+    Saves the strategy's checkpoint from a writer thread, so the strategy does not wait while the
+    checkpoint is written.
+
+    The checkpoint is pickled before this returns, so the file holds the state as it was when the
+    save started.  Only one background save runs per strategy.
+
+    @param strategy_id: The strategy the checkpoint belongs to.
+    @param checkpoint: The state to save.  A 'timestamp' of the current time is added.
+
+    @return bool: False if the previous background save is still running, and this one was skipped.
+    """
+    writer = background_saves.get(strategy_id)
+
+    if writer is not None and writer.is_alive():
+        logger.debug3("Previous checkpoint for %s is still being saved", strategy_id)
+        return False
+
+    try:
+        checkpoint_data = _dump_checkpoint(checkpoint)
+    except pickle.PicklingError as msg:
+        logger.error("Unable to save checkpoint for %s: %s", strategy_id, msg)
+        return True
+
+    writer = threading.Thread(target=_write_checkpoint_background,
+                              args=(strategy_id, checkpoint_data),
+                              daemon=True)
+    background_saves[strategy_id] = writer
+    writer.start()
+    return True
+
+
+# ==================================================================================================
+#
+# Private Functions
+#
+# ==================================================================================================
+def _dump_checkpoint(checkpoint: dict):
+    checkpoint["timestamp"] = datetime.datetime.now().timestamp()
+    return pickle.dumps(checkpoint, protocol=pickle.HIGHEST_PROTOCOL)
+
+
+def _wait_for_background_save(strategy_id: str):
+    """!
+    Waits for a strategy's background save to finish.
+    """
+    writer = background_saves.pop(strategy_id, None)
+
+    if writer is not None:
+        writer.join()
+
+
+def _write_checkpoint(strategy_id: str, checkpoint_data: bytes):
+    pathlib.Path(CHECKPOINT_DIR).mkdir(parents=True, exist_ok=True)
+    file_descriptor, temp_filename = tempfile.mkstemp(dir=CHECKPOINT_DIR, suffix=".tmp")
+
+    try:
+        with os.fdopen(file_descriptor, "wb") as checkpoint_file:
+            checkpoint_file.write(checkpoint_data)
+
+        os.replace(temp_filename, get_checkpoint_file(strategy_id))
+    except BaseException:
+        if os.path.exists(temp_filename):
+            os.remove(temp_filename)
+
+        raise
+
+
+def _write_checkpoint_background(strategy_id: str, checkpoint_data: bytes):
+    try:
+        _write_checkpoint(strategy_id, checkpoint_data)
+        logger.debug3("Saved checkpoint for %s", strategy_id)
+    except OSError as msg:
+        logger.error("Unable to save checkpoint for %s: %s", strategy_id, msg)
@@ -28,9 +28,11 @@ Provides the client for Interactive Brokers
 """
 # Standard Libraries
 import datetime
+import functools
 import threading
 import time
 
+from concurrent import futures
 from decimal import Decimal
 from queue import Queue
 
@@ -50,6 +52,9 @@ from pytrader import git_branch
 from pytrader.libs.system import logging
 
 # Other Libraries
+from pytrader.libs.clients.broker.ibkr.tws.pacing import PacingScheduler
+from pytrader.libs.clients.broker.ibkr.tws.registry import RequestRegistry
+from pytrader.libs.utilities.exceptions import BrokerRequestError
 
 # ==================================================================================================
 #
@@ -63,23 +68,15 @@ logger = logging.getLogger(__name__)
 #
 # Pacing Violations
 #
-# 1. To avoid pacing violations, historical data can be requested no more than 60 requests in any 10
-# minute period.
-# 2. There are 600 seconds in 10 minutes.
-# 3. Therefore, 1 request every 15 seconds to ensure we don't cross the threshold.
+# Historical data requests for small bars are paced by the PacingScheduler.  See
+# pytrader.libs.clients.broker.ibkr.tws.pacing for the rules.
 #
 # https://interactivebrokers.github.io/tws-api/historical_limitations.html#pacing_violations
 #
 # ==================================================================================================
-## Amount of time to sleep to avoid pacing violations.
-HISTORICAL_DATA_SLEEP_TIME = 0
-
 ##
 CONTRACT_DETAILS_SLEEP_TIME = 0
 
-## Sleep time to avoid pacing violations
-SMALL_BAR_SLEEP_TIME = 15
-
 ## Used to store bar sizes with pacing violations
 SMALL_BAR_SIZES = ["1 secs", "5 secs", "10 secs", "15 secs", "30 secs"]
 
@@ -92,6 +89,24 @@ INTRADAY_BAR_SIZES = SMALL_BAR_SIZES + [
 ## Used to store allowed bar sizes
 BAR_SIZES = INTRADAY_BAR_SIZES + ["1 day", "1 week", "1 month"]
 
+## Errors that end a historical data request without any data.
+HISTORICAL_DATA_ERROR_CODES = [162, 166, 200, 321, 354, 366]
+
+## Errors that fail a request.  Other errors are either for orders, which share the id space, or
+## are notifications.  Some of these codes are also sent for orders, so errors for the ids of
+## placed orders never fail a request.
+REQUEST_ERROR_CODES = [162, 166, 200, 203, 321, 322, 354, 366]
+
+## Seconds get_data waits for a request's data by default.
+REQUEST_TIMEOUT = 60
+
+## Error code, and message text, TWS uses to reject a historical data request for pacing.
+PACING_VIOLATION_CODE = 162
+PACING_VIOLATION_MESSAGE = "pacing violation"
+
+## Generic ticks requested for market data when no list is given
+DEFAULT_GENERIC_TICKS = "221, 232, 233, 236, 258, 293, 294, 295, 318, 375, 411, 456, 595, 619"
+
 
 # ==================================================================================================
 #
@@ -116,14 +131,6 @@ class TwsApiClient(EWrapper, EClient):
         EWrapper.__init__(self)
         EClient.__init__(self, self)
 
-        ## Used to track when the last historical data request was made
-        self.__historical_data_req_timestamp = datetime.datetime(year=1970,
-                                                                 month=1,
-                                                                 day=1,
-                                                                 hour=0,
-                                                                 minute=0,
-                                                                 second=0)
-
         ## Used to track when the last contract details data request was made
         self.__contract_details_data_req_timestamp = datetime.datetime(year=1970,
                                                                        month=1,
@@ -132,16 +139,25 @@ class TwsApiClient(EWrapper, EClient):
                                                                        minute=0,
                                                                        second=0)
 
-        self.__small_bar_data_req_timestamp = datetime.datetime(year=1970,
-                                                                month=1,
-                                                                day=1,
-                                                                hour=0,
-                                                                minute=0,
-                                                                second=0)
+        ## Sends historical data requests as soon as the pacing rules allow.
+        self.pacing = PacingScheduler(self._paced_request_failed)
 
         ## Used to track the number of active historical data requests.
         self.__active_historical_data_requests = 0
 
+        ## Request ids of the active historical data requests.
+        self.historical_data_req_ids = set()
+
+        ## Queues that receive a request id once its request has completed, keyed by request id.
+        self.completion_queues = {}
+
+        ## The request sent to TWS for each set of identical historical data requests.
+        self.history_requests = {}
+
+        ## The key and the waiting identical requests for each request sent to TWS.
+        self.history_waiters = {}
+        self.history_lock = threading.Lock()
+
         ## Used to track the number of available market data lines
         self.__available_market_data_lines = 100
 
@@ -151,12 +167,21 @@ class TwsApiClient(EWrapper, EClient):
         ## Used to track the latest request_id
         self.req_id = 0
 
+        ## Request ids are taken from several threads.
+        self.req_id_lock = threading.Lock()
+
         ## Used to track the next order id
         self.next_order_id = None
 
         ## Used to track if the next valid id is available
         self.next_valid_id_available = threading.Event()
 
+        ## Orders are placed from several threads.
+        self.order_id_lock = threading.Lock()
+
+        ## Ids of the orders placed, so their errors are not mistaken for request errors.
+        self.order_ids = set()
+
         ## Used to track available accounts
         self.accounts = []
 
@@ -166,8 +191,12 @@ class TwsApiClient(EWrapper, EClient):
         ## Used to store any data requested using a request ID.
         self.data = {}
 
-        ## Used to track if requested data is available
-        self.data_available = {}
+        ## Price increments for each market rule id, as a list of (low edge, increment).  Market
+        ## rules rarely change, so each is only requested once.
+        self.market_rules = {}
+
+        ## The future for each request's data.
+        self.requests = RequestRegistry()
 
         ##
         self.__counter = 0
@@ -209,24 +238,100 @@ class TwsApiClient(EWrapper, EClient):
         """
         return self.clientId
 
-    def get_data(self, req_id: int = 0):
+    def cancel_request(self, req_id: int):
+        """!
+        Abandons a request.  Anyone waiting on its future receives a CancelledError, and the
+        client stops tracking it.  A historical data request is also cancelled with TWS.
+
+        @param req_id: The request's identifier
+
+        @return bool: True if the request was cancelled.
+        """
+        cancelled = self.cancel_historical_data(req_id)
+
+        if not cancelled:
+            # Head timestamp requests are paced.
+            self.pacing.cancel(req_id)
+            self.data.pop(req_id, None)
+
+        # The future is removed too, since nobody collects its result.
+        return self.requests.cancel(req_id) or cancelled
+
+    def get_data(self, req_id: int = 0, timeout: float = REQUEST_TIMEOUT):
         """!
         Returns the data received from the request.
 
         @param req_id: The Request ID of the originating request.
+        @param timeout: Seconds to wait for the data.  None to wait until it arrives.
 
-        @return self.data[req_id]: The data from the specific request.
-        @return self.data: If no req_id is provided, returns all data from all requests.
+        @return data: The data from the specific request, or {"Error": msg} if the request failed,
+            timed out or was cancelled.
+        @return self.data: If no req_id is provided, returns the data of requests in progress.
         """
         if req_id > 0:
-            self.data_available[req_id].wait()
-            logger.debug6("Data: %s", self.data[req_id])
+            future = self.requests.get_future(req_id)
+
+            if future is None:
+                logger.error("No data for unknown request %s", req_id)
+                return {"Error": "Unknown request"}
+
+            try:
+                data = future.result(timeout)
+            except BrokerRequestError as msg:
+                data = {"Error": msg.msg}
+            except futures.TimeoutError:
+                logger.error("Timed out waiting for request %s", req_id)
+                data = {"Error": "Timed out"}
+            except futures.CancelledError:
+                data = {"Error": "Cancelled"}
+
+            logger.debug6("Data: %s", data)
+
+            # A request that timed out is abandoned, so the client stops tracking it.  Otherwise
+            # the future is removed so the amount of data does not keep growing.
+            if not future.done():
+                self.cancel_request(req_id)
+            else:
+                self.requests.pop(req_id)
 
-            # We pop this data to prevent the amount of data from constantly growing.
-            return self.data.pop(req_id)
+            return data
         else:
             return self.data
 
+    def get_history_sent_time(self, req_id: int):
+        """!
+        Returns when a historical data request was sent to TWS.  Requests can wait a long time for
+        the pacing rules before they are sent.
+
+        @param req_id: The request's identifier
+
+        @return time: The time.monotonic() the request was sent, None while it waits to be sent.
+        """
+        with self.history_lock:
+            for outstanding_id, (_, waiters) in self.history_waiters.items():
+                if req_id in waiters:
+                    req_id = outstanding_id
+                    break
+
+        return self.pacing.get_sent_time(req_id)
+
+    def get_market_data_lines(self):
+        """!
+        Returns the number of market data lines available to the account.
+        """
+        return self.__available_market_data_lines
+
+    def get_market_rule(self, market_rule_id: int):
+        """!
+        Returns the price increments for a market rule.
+
+        @param market_rule_id: The market rule id.
+
+        @return price_increments: A list of (low edge, increment), or None if the market rule has
+            not been received yet.
+        """
+        return self.market_rules.get(market_rule_id)
+
     def get_next_order_id(self):
         self.next_valid_id_available.wait()
         return self.next_order_id
@@ -265,7 +370,7 @@ class TwsApiClient(EWrapper, EClient):
 
         @return
         """
-        self.req_id += 1
+        self._next_req_id()
 
     def calculate_option_price(self,
                                contract: Contract,
@@ -282,7 +387,7 @@ class TwsApiClient(EWrapper, EClient):
 
         @return
         """
-        self.req_id += 1
+        self._next_req_id()
 
     def cancel_account_summary(self):
         """!
@@ -293,7 +398,7 @@ class TwsApiClient(EWrapper, EClient):
 
         @return
         """
-        self.req_id += 1
+        self._next_req_id()
 
     def cancel_account_updates_multi(self):
         """!
@@ -303,26 +408,57 @@ class TwsApiClient(EWrapper, EClient):
 
         @return
         """
-        self.req_id += 1
+        self._next_req_id()
 
     def cancel_calculate_implied_volatility(self):
-        self.req_id += 1
+        self._next_req_id()
 
     def cancel_head_timestamp(self):
-        self.req_id += 1
-        self.cancelHeadTimeStamp(self.req_id)
+        req_id = self._next_req_id()
+        self.cancelHeadTimeStamp(req_id)
 
-    def cancel_historical_data(self):
-        self.req_id += 1
-        self.__active_historical_data_requests -= 1
-        self.cancelHistoricalData(self.req_id)
+    def cancel_historical_data(self, req_id: int):
+        """!
+        Abandons a historical data request.  It is cancelled with TWS if it has already been sent,
+        and anyone waiting for it, including identical requests, receives a CancelledError.
+
+        A request waiting for an identical request only stops waiting.  The identical request
+        carries on.
 
-    def cancel_mkt_data(self):
-        self.req_id += 1
+        @param req_id: The request's identifier
+
+        @return bool: False if the request is unknown or has already completed.
+        """
+        with self.history_lock:
+            for _, waiters in self.history_waiters.values():
+                if req_id in waiters:
+                    waiters.remove(req_id)
+                    self.completion_queues.pop(req_id, None)
+                    self.requests.cancel(req_id)
+                    return True
+
+        if req_id not in self.historical_data_req_ids:
+            return False
+
+        if self.pacing.cancel(req_id):
+            self.cancelHistoricalData(req_id)
+
+        self._historical_data_complete(req_id, futures.CancelledError())
+        return True
+
+    def cancel_mkt_data(self, req_id: int):
+        """!
+        Cancels a market data subscription.
+
+        @param req_id: The request id of the market data subscription to cancel.
+
+        @return None
+        """
+        self.cancelMktData(req_id)
 
     def cancel_mkt_depth(self, is_smart_depth: bool):
-        self.req_id += 1
-        self.cancelMktDepth(self.req_id, is_smart_depth)
+        req_id = self._next_req_id()
+        self.cancelMktDepth(req_id, is_smart_depth)
 
     def cancel_news_bulletin(self):
         self.cancelNewsBulletin()
@@ -341,6 +477,16 @@ class TwsApiClient(EWrapper, EClient):
         """
         self.cancelOrder(order_id, manual_order_cancel_time)
 
+    def cancel_real_time_bars(self, req_id: int):
+        """!
+        Cancels a real time bar subscription.
+
+        @param req_id: The request id of the real time bar subscription to cancel.
+
+        @return None
+        """
+        self.cancelRealTimeBars(req_id)
+
     def is_connected(self):
         """!
         Indicates whether the API-TWS connection has been closed. NOTE: This function is not
@@ -354,18 +500,26 @@ class TwsApiClient(EWrapper, EClient):
         logger.debug("Order: %s", order)
         if order_id is None:
             self.next_valid_id_available.wait()
-            order_id = self.next_order_id
 
-        self.placeOrder(order_id, contract, order)
+        # The id is taken and used under the lock, so two threads never place orders with the same
+        # id before TWS sends the next valid id.
+        with self.order_id_lock:
+            if order_id is None:
+                order_id = self.next_order_id
+                self.next_order_id += 1
+
+            self.order_ids.add(order_id)
+            self.placeOrder(order_id, contract, order)
+
         self.req_ids()
         return order_id
 
     def req_account_summary(self, account_types: str = "ALL", tags: list = []):
-        self.req_id += 1
+        req_id = self._next_req_id()
         tags_string = ", ".join([str(item) for item in tags])
-        self.data_available[self.req_id] = threading.Event()
-        self.reqAccountSummary(self.req_id, account_types, tags_string)
-        return self.req_id
+        self.requests.create(req_id)
+        self.reqAccountSummary(req_id, account_types, tags_string)
+        return req_id
 
     def req_account_updates(self, subscribe: bool, account_code: str):
         """!
@@ -402,12 +556,28 @@ class TwsApiClient(EWrapper, EClient):
 
         @return req_id: The unique request identifier.
         """
-        self.req_id += 1
+        req_id = self._next_req_id()
         self._contract_details_data_wait()
-        self.data_available[self.req_id] = threading.Event()
-        self.reqContractDetails(self.req_id, contract)
+        self.requests.create(req_id)
+        self.reqContractDetails(req_id, contract)
         self.__contract_details_data_req_timestamp = datetime.datetime.now()
-        return self.req_id
+        return req_id
+
+    def req_market_rule(self, market_rule_id: int):
+        """!
+        Requests the price increments for a market rule, unless they have already been requested.
+        The increments are received at EWrapper::marketRule.
+
+        @param market_rule_id: The market rule id, from the contract details' marketRuleIds.
+
+        @return None
+        """
+        if market_rule_id in self.market_rules:
+            return
+
+        # Marks the rule as requested until the increments arrive.
+        self.market_rules[market_rule_id] = None
+        self.reqMarketRule(market_rule_id)
 
     def req_global_cancel(self):
         """!
@@ -436,20 +606,18 @@ class TwsApiClient(EWrapper, EClient):
         """
         logger.debug("Ticker: %s", contract.symbol)
 
-        self.req_id += 1
-
-        # This request seems to trigger the historical data pacing restrictions.  So, we wait.
-        self._historical_data_wait()
-
-        self.data_available[self.req_id] = threading.Event()
-        self.reqHeadTimeStamp(self.req_id, contract, what_to_show, use_regular_trading_hours,
-                              format_date)
+        req_id = self._next_req_id()
 
-        # This is updated here, rather than in the _historical_data_wait function because we want
-        # to actually make the request before setting a new timer.
-        self.__historical_data_req_timestamp = datetime.datetime.now()
+        # This request counts towards the historical data pacing restrictions.
+        self.requests.create(req_id)
+        contract_key = self._get_pacing_key(contract, what_to_show)
+        self.pacing.submit(
+            req_id,
+            functools.partial(self.reqHeadTimeStamp, req_id, contract, what_to_show,
+                              use_regular_trading_hours, format_date),
+            (contract_key, "head_timestamp", use_regular_trading_hours), contract_key)
 
-        return self.req_id
+        return req_id
 
     def req_historical_data(self,
                             contract: Contract,
@@ -460,7 +628,8 @@ class TwsApiClient(EWrapper, EClient):
                             use_regular_trading_hours: bool = True,
                             format_date: bool = True,
                             keep_up_to_date: bool = False,
-                            chart_options: list = []):
+                            chart_options: list = [],
+                            completion_queue: Queue = None):
         """!
         Requests contracts' historical data. When requesting historical data, a finishing time and
         date is required along with a duration string. For example, having:
@@ -473,6 +642,9 @@ class TwsApiClient(EWrapper, EClient):
         specified. It is possible to specify a timezone optionally. The resulting bars will be
         returned in EWrapper::historicalData
 
+        A request identical to one that is still outstanding is not sent to TWS.  It receives its
+        own request id, and the same data once the outstanding request completes.
+
         @param contract: The contract for which we want to retrieve the data.
         @param bar_size_setting: The size of the bar:
           - 1 sec   - (NOTE: While listed as a valid bar size, this size has NEVER worked for me)
@@ -518,6 +690,8 @@ class TwsApiClient(EWrapper, EClient):
         @param keep_up_to_date: set to True to received continuous updates on most recent bar data.
         If True, and endDateTime cannot be specified.
         @param chart_options: FIXME: TWS API does not document this parameter
+        @param completion_queue: Receives the request id once the data, or an error, has been
+            received.  Lets a caller keep several requests outstanding.
 
         @return req_id: The request identifier
         """
@@ -532,8 +706,6 @@ class TwsApiClient(EWrapper, EClient):
         #
         # ==========================================================================================
         if self.__active_historical_data_requests <= 50:
-            self.__active_historical_data_requests += 1
-
             logger.debug6("Contract: %s", contract)
             logger.debug6("Bar Size: %s", bar_size_setting)
             logger.debug6("End Date Time: %s", end_date_time)
@@ -543,34 +715,55 @@ class TwsApiClient(EWrapper, EClient):
             logger.debug6("Format date: %s", format_date)
             logger.debug6("Keep Up to Date: %s", keep_up_to_date)
             logger.debug6("Chart Options: %s", chart_options)
-            self.req_id += 1
+            req_id = self._next_req_id()
 
             # if keep_up_to_date is true, end_date_time must be blank.
             # https://interactivebrokers.github.io/tws-api/historical_bars.html
             if keep_up_to_date:
                 end_date_time = ""
 
-            if bar_size_setting in SMALL_BAR_SIZES:
-                self._small_bar_data_wait()
-            else:
-                self._historical_data_wait()
+            self.requests.create(req_id)
 
-            logger.debug6("Requesting Historical Bars for: %s", contract.localSymbol)
+            if completion_queue is not None:
+                self.completion_queues[req_id] = completion_queue
 
-            self.data_available[self.req_id] = threading.Event()
-            self.reqHistoricalData(self.req_id, contract, end_date_time, duration_str,
-                                   bar_size_setting, what_to_show, use_regular_trading_hours,
-                                   format_date, keep_up_to_date, chart_options)
+            contract_key = self._get_pacing_key(contract, what_to_show)
+            identical_key = (contract_key, bar_size_setting, end_date_time, duration_str,
+                             use_regular_trading_hours)
 
-            # This is updated here, rather than in the _historical_data_wait function because we
-            # want to actually make the request before setting a new timer.
-            if bar_size_setting in SMALL_BAR_SIZES:
-                self.__small_bar_data_req_timestamp = datetime.datetime.now()
-            else:
-                self.__historical_data_req_timestamp = datetime.datetime.now()
+            # Streaming requests are never shared.
+            if not keep_up_to_date:
+                history_key = identical_key + (format_date, str(chart_options))
 
-            self.data[self.req_id] = []
-            return self.req_id
+                with self.history_lock:
+                    outstanding_id = self.history_requests.get(history_key)
+
+                    if outstanding_id is not None:
+                        logger.debug3("Request %s waits for identical request %s", req_id,
+                                      outstanding_id)
+                        self.history_waiters[outstanding_id][1].append(req_id)
+                        return req_id
+
+                    self.history_requests[history_key] = req_id
+                    self.history_waiters[req_id] = (history_key, [])
+
+            logger.debug6("Requesting Historical Bars for: %s", contract.localSymbol)
+
+            self.__active_historical_data_requests += 1
+            self.data[req_id] = []
+            self.historical_data_req_ids.add(req_id)
+
+            # Only small bars are subject to the pacing rules, but every request waits out a
+            # pacing violation.
+            self.pacing.submit(
+                req_id,
+                functools.partial(self.reqHistoricalData, req_id, contract, end_date_time,
+                                  duration_str, bar_size_setting, what_to_show,
+                                  use_regular_trading_hours, format_date, keep_up_to_date,
+                                  chart_options), identical_key, contract_key,
+                bar_size_setting in SMALL_BAR_SIZES)
+
+            return req_id
         else:
             raise Exception("Too many open historical data requests")
 
@@ -599,16 +792,16 @@ class TwsApiClient(EWrapper, EClient):
 
         @return req_id: The request's identifier
         """
-        self.req_id += 1
+        req_id = self._next_req_id()
 
         # The maximum allowed is 1000 per request
         if number_of_ticks > 1000:
             number_of_ticks = 1000
 
-        self.reqHistoricalTicks(self.req_id, contract, start_date_time, end_date_time,
+        self.reqHistoricalTicks(req_id, contract, start_date_time, end_date_time,
                                 number_of_ticks, what_to_show, use_regular_trading_hours,
                                 ignore_size, misc_options)
-        return self.req_id
+        return req_id
 
     def req_ids(self):
         """!
@@ -631,21 +824,20 @@ class TwsApiClient(EWrapper, EClient):
         """
         self.reqManagedAccounts()
 
-    def req_market_data(
-            self,
-            contract: Contract,
-            generic_tick_list:
-        str = "221, 232, 233, 236, 258, 293, 294, 295, 318, 375, 411, 456, 595, 619",
-            snapshot: bool = False,
-            regulatory_snapshot: bool = False,
-            market_data_options: list = []):
+    def req_market_data(self,
+                        contract: Contract,
+                        generic_tick_list: str = None,
+                        snapshot: bool = False,
+                        regulatory_snapshot: bool = False,
+                        market_data_options: list = []):
         """!
         Requests real time market data. Returns market data for an instrument either in real time or
         10-15 minutes delayed (depending on the market data type specified)
 
         IB API's description of the parameters is incomplete.
         @param contract: The contract for which the data is being requested.
-        @param generic_tick_list: Comma Separated ids of the available generic ticks:
+        @param generic_tick_list: Comma Separated ids of the available generic ticks.  When None, a
+            broad default list is requested.  The available generic ticks are:
             - 100 Option Volume (currently for stocks)
             - 101 Option Open Interest (currently for stocks)
             - 104 Historical Volatility (currently for stocks)
@@ -691,7 +883,7 @@ class TwsApiClient(EWrapper, EClient):
 
         @return req_id: The rquest's identifier
         """
-        self.req_id += 1
+        req_id = self._next_req_id()
 
         if contract.secType == "STK":
             """
@@ -727,15 +919,16 @@ class TwsApiClient(EWrapper, EClient):
               - 619(Creditman Slow Mark Price)
               - 623(EtfFrozenNavLast(fznavlast)
             """
-            if generic_tick_list == "":
-                generic_tick_list = "100, 101, 104, 105, 106, 165, 292"
-            else:
-                generic_tick_list += ", 100, 101, 104, 105, 106, 165, 292"
+            if generic_tick_list is None:
+                generic_tick_list = DEFAULT_GENERIC_TICKS + ", 100, 101, 104, 105, 106, 165, 292"
+
+        if generic_tick_list is None:
+            generic_tick_list = DEFAULT_GENERIC_TICKS
 
-        self.reqMktData(self.req_id, contract, generic_tick_list, snapshot, regulatory_snapshot,
+        self.reqMktData(req_id, contract, generic_tick_list, snapshot, regulatory_snapshot,
                         market_data_options)
 
-        return self.req_id
+        return req_id
 
     def req_real_time_bars(self,
                            contract: Contract,
@@ -772,17 +965,11 @@ class TwsApiClient(EWrapper, EClient):
         logger.debug6("Use Regular Trading Hours: %s", use_regular_trading_hours)
         logger.debug6("Real time bar options: %s", real_time_bar_options)
 
-        self.req_id += 1
+        req_id = self._next_req_id()
 
-        self._small_bar_data_wait()
-
-        self.reqRealTimeBars(self.req_id, contract, bar_size_setting, what_to_show,
+        self.reqRealTimeBars(req_id, contract, bar_size_setting, what_to_show,
                              use_regular_trading_hours, real_time_bar_options)
-
-        # This is updated here, rather than in the _historical_data_wait function because we
-        # want to actually make the request before setting a new timer.
-        self.__small_bar_data_req_timestamp = datetime.datetime.now()
-        return self.req_id
+        return req_id
 
     def req_sec_def_opt_params(self, contract: Contract):
         """!
@@ -792,13 +979,13 @@ class TwsApiClient(EWrapper, EClient):
 
         @return req_id: The Request's identifier
         """
-        self.req_id += 1
-        self.data_available[self.req_id] = threading.Event()
+        req_id = self._next_req_id()
+        self.requests.create(req_id)
 
         # The 3rd parameter, futFopExchange, is set to "" which the API uses to select
         # ALL exchanges.
-        self.reqSecDefOptParams(self.req_id, contract.symbol, "", contract.secType, contract.conId)
-        return self.req_id
+        self.reqSecDefOptParams(req_id, contract.symbol, "", contract.secType, contract.conId)
+        return req_id
 
     def req_tick_by_tick_data(self,
                               tick_queue: Queue,
@@ -819,15 +1006,13 @@ class TwsApiClient(EWrapper, EClient):
         allowed_tick_types = ["Last", "AllLast", "BidAsk", "MidPoint"]
 
         if tick_type in allowed_tick_types:
-            self.req_id += 1
-            self._historical_data_wait()
+            req_id = self._next_req_id()
 
-            self.tick_queue[self.req_id] = tick_queue
+            self.tick_queue[req_id] = tick_queue
 
-            self.reqTickByTickData(self.req_id, contract, tick_type, number_of_ticks, ignore_size)
-            self.__historical_data_req_timestamp = datetime.datetime.now()
+            self.reqTickByTickData(req_id, contract, tick_type, number_of_ticks, ignore_size)
             logger.debug("End Function")
-            return self.req_id
+            return req_id
         else:
             raise Exception("Invalid Tick Type")
 
@@ -929,8 +1114,12 @@ class TwsApiClient(EWrapper, EClient):
 
         @return
         """
-        self.data[req_id] = {"account": account, "tag": tag, "value": value, "currency": currency}
-        self.data_available[req_id].set()
+        self.requests.set_result(req_id, {
+            "account": account,
+            "tag": tag,
+            "value": value,
+            "currency": currency
+        })
 
         logger.debug("Account Summary. ReqId: %s\nAccount: %s, Tag: %s, Value: %s, Currency: %s",
                      req_id, account, tag, value, currency)
@@ -1000,6 +1189,16 @@ class TwsApiClient(EWrapper, EClient):
         @return
         """
         logger.debug("Commission Report: %s", commission_report)
+        msg = {
+            "commission_report": {
+                commission_report.execId: {
+                    "commission": commission_report.commission,
+                    "currency": commission_report.currency,
+                    "realized_pnl": commission_report.realizedPNL
+                }
+            }
+        }
+        self.queue.put(msg)
 
     @iswrapper
     def completedOrder(self, contract: Contract, order: Order, order_state: OrderState):
@@ -1086,7 +1285,6 @@ class TwsApiClient(EWrapper, EClient):
         logger.debug6("Details: %s", details)
 
         self.data[req_id] = details
-        self.data_available[req_id].set()
 
         # if details.contract.secType == "Bond":
         #     logger.debug("Description: %s", details.contract.description)
@@ -1125,6 +1323,7 @@ class TwsApiClient(EWrapper, EClient):
         @return
         """
         logger.debug6("Contract Details Received for request id: %s", req_id)
+        self.requests.set_result(req_id, self.data.pop(req_id, None))
 
     @iswrapper
     def currentTime(self, current_time: int):
@@ -1225,11 +1424,7 @@ class TwsApiClient(EWrapper, EClient):
             else:
                 logger.error("ReqID# %s, Code: %s (%s)", req_id, code, msg)
 
-            if code == 200:
-                self.data[req_id] = {"Error": msg}
-                self.data_available[req_id].set()
-
-            elif code in [103, 10147]:
+            if code in [103, 10147]:
                 msg = {"order_status": {req_id: {"status": "TWS_CLOSED"}}}
                 self.queue.put(msg)
 
@@ -1258,6 +1453,21 @@ class TwsApiClient(EWrapper, EClient):
             else:
                 logger.error("ReqID# %s, Code: %s (%s)", req_id, code, msg)
 
+        if code == PACING_VIOLATION_CODE and PACING_VIOLATION_MESSAGE in msg.lower():
+            if self.pacing.retry(req_id):
+                if req_id in self.historical_data_req_ids:
+                    self.data[req_id] = []
+                return
+
+        # A failed historical data request never receives historicalDataEnd.
+        if req_id in self.historical_data_req_ids and code in HISTORICAL_DATA_ERROR_CODES:
+            self._historical_data_complete(req_id, BrokerRequestError(req_id, code, msg))
+        elif req_id > 0 and code in REQUEST_ERROR_CODES and req_id not in self.order_ids:
+            # Head timestamp requests are paced too.
+            self.pacing.complete(req_id)
+            self.data.pop(req_id, None)
+            self.requests.set_exception(req_id, BrokerRequestError(req_id, code, msg))
+
     @iswrapper
     def execDetails(self, req_id: int, contract: Contract, execution: Execution):
         """!
@@ -1269,8 +1479,21 @@ class TwsApiClient(EWrapper, EClient):
 
         @return
         """
-        msg = {"order_execution": {contract.localSymbol: execution}}
-        logger.debug(msg)
+        logger.debug("Execution: %s, %s", contract.localSymbol, execution)
+        msg = {
+            "order_execution": {
+                execution.orderId: {
+                    "exec_id": execution.execId,
+                    "ticker": contract.localSymbol,
+                    "multiplier": float(contract.multiplier) if contract.multiplier else 1.0,
+                    "side": execution.side,
+                    "shares": float(execution.shares),
+                    "price": execution.price,
+                    "time": execution.time
+                }
+            }
+        }
+        self.queue.put(msg)
 
     @iswrapper
     def execDetailsEnd(self, req_id: int):
@@ -1321,8 +1544,8 @@ class TwsApiClient(EWrapper, EClient):
         """
         logger.debug("Begin Function")
         logger.debug("ReqID: %s, IPO Date: %s", req_id, head_time_stamp)
-        self.data[req_id] = head_time_stamp
-        self.data_available[req_id].set()
+        self.pacing.complete(req_id)
+        self.requests.set_result(req_id, head_time_stamp)
 
         logger.debug("End Function")
 
@@ -1353,13 +1576,14 @@ class TwsApiClient(EWrapper, EClient):
         logger.debug6("ReqID: %s", req_id)
         logger.debug6("Bar: %s", bar)
 
-        self.data[req_id].append(bar)
+        # Bars can still arrive for a request that was just cancelled.
+        if req_id in self.historical_data_req_ids:
+            self.data[req_id].append(bar)
 
     @iswrapper
     def historicalDataEnd(self, req_id: int, start: str, end: str):
         logger.debug6("Data Complete for ReqID: %s from: %s to: %s", req_id, start, end)
-        self.data_available[req_id].set()
-        self.__active_historical_data_requests -= 1
+        self._historical_data_complete(req_id)
 
     @iswrapper
     def historicalDataUpdate(self, req_id: int, bar: BarData):
@@ -1532,8 +1756,11 @@ class TwsApiClient(EWrapper, EClient):
 
         @return
         """
-        logger.debug("Begin Function")
-        logger.debug("End Function")
+        logger.debug6("Market Rule %s: %s", market_rule_id, price_increments)
+        self.market_rules[market_rule_id] = [
+            (price_increment.lowEdge, price_increment.increment)
+            for price_increment in price_increments
+        ]
 
     @iswrapper
     def mktDepthExchanges(self, depth_market_data_sescriptions: list):
@@ -1590,7 +1817,8 @@ class TwsApiClient(EWrapper, EClient):
         # Do I need this here?
         super().nextValidId(order_id)
 
-        self.next_order_id = order_id
+        with self.order_id_lock:
+            self.next_order_id = order_id
 
         msg = {"next_order_id": order_id}
         self.queue.put(msg)
@@ -1984,7 +2212,7 @@ class TwsApiClient(EWrapper, EClient):
         @return
         """
         logger.debug6("SecurityDefinitionOptionParameterEnd. ReqId: %s", req_id)
-        self.data_available[req_id].set()
+        self.requests.set_result(req_id, self.data.pop(req_id, None))
 
     @iswrapper
     def smartComponents(self, req_id: int, the_map: dict):
@@ -2648,25 +2876,67 @@ class TwsApiClient(EWrapper, EClient):
             time.sleep(sleep_time - time_diff.total_seconds())
             time_diff = datetime.datetime.now() - timestamp
 
-    def _historical_data_wait(self):
+    def _next_req_id(self):
         """!
-        Ensure that we wait between historical data requests.
+        Returns a new request id.  Safe to call from any thread.
 
-        @param self
+        @return req_id: The request identifier
+        """
+        with self.req_id_lock:
+            self.req_id += 1
+            return self.req_id
 
-        @return
+    def _get_pacing_key(self, contract: Contract, what_to_show: str):
+        """!
+        Identifies a request's contract, exchange and tick type for the pacing rules.
+
+        @param contract: The contract being requested.
+        @param what_to_show: The type of data being requested.
+
+        @return key: The pacing key.
         """
-        self._data_wait(self.__historical_data_req_timestamp, HISTORICAL_DATA_SLEEP_TIME)
+        return (contract.conId, contract.localSymbol, contract.exchange, what_to_show)
 
-    def _small_bar_data_wait(self):
+    def _historical_data_complete(self, req_id: int, error: Exception = None):
         """!
-        Ensure that we wait between historical data requests.
+        Marks a historical data request as complete and tells anyone waiting for it.
 
-        @param self
+        @param req_id: The request's identifier
+        @param error: The error that ended the request, None if it succeeded.
 
         @return
         """
-        self._data_wait(self.__small_bar_data_req_timestamp, SMALL_BAR_SLEEP_TIME)
+        if req_id not in self.historical_data_req_ids:
+            return
+
+        self.historical_data_req_ids.discard(req_id)
+        self.pacing.complete(req_id)
+        self.__active_historical_data_requests -= 1
+        bar_list = self.data.pop(req_id, [])
+
+        with self.history_lock:
+            history_key, waiters = self.history_waiters.pop(req_id, (None, []))
+            self.history_requests.pop(history_key, None)
+
+        for completed_id in waiters + [req_id]:
+            if error is None:
+                self.requests.set_result(completed_id, bar_list)
+            else:
+                self.requests.set_exception(completed_id, error)
+
+            if completed_id in self.completion_queues:
+                self.completion_queues.pop(completed_id).put(completed_id)
+
+    def _paced_request_failed(self, req_id: int, error: Exception):
+        """!
+        Fails a paced request that could not be sent.
+        """
+        error = BrokerRequestError(req_id, 0, "Failed to send request: " + str(error))
+
+        if req_id in self.historical_data_req_ids:
+            self._historical_data_complete(req_id, error)
+        else:
+            self.requests.set_exception(req_id, error)
 
     def _contract_details_data_wait(self):
         """!
@@ -0,0 +1,321 @@
+"""!
+@package pytrader.libs.clients.broker.ibkr.tws.pacing
+
+Paces historical data requests to the limits TWS enforces.
+
+@author G. S. Derber
+@date 2022-2023
+@copyright GNU Affero General Public License
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU Affero General Public License as
+    published by the Free Software Foundation, either version 3 of the
+    License, or (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU Affero General Public License for more details.
+
+    You should have received a copy of the GNU Affero General Public License
+    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+@file pytrader/libs/clients/broker/ibkr/tws/pacing.py
+"""
+# Standard Libraries
+import threading
+import time
+
+from collections import deque
+
+# 3rd Party Libraries
+
+# Application Libraries
+# System Library Overrides
+from pytrader.libs.system import logging
+
+# Other Libraries
+
+# ==================================================================================================
+#
+# Global Variables
+#
+# ==================================================================================================
+## Instance of Logging class
+logger = logging.getLogger(__name__)
+
+# ==================================================================================================
+#
+# Pacing Violations
+#
+# TWS rejects small bar (30 secs or less) historical data requests that break any of these rules:
+#
+# 1. Making identical historical data requests within 15 seconds.
+# 2. Making six or more historical data requests for the same Contract, Exchange and Tick Type
+#    within two seconds.
+# 3. Making more than 60 requests within any ten minute period.
+#
+# https://interactivebrokers.github.io/tws-api/historical_limitations.html#pacing_violations
+#
+# ==================================================================================================
+## Requests allowed in any ten minute period.
+GLOBAL_REQUEST_LIMIT = 60
+GLOBAL_REQUEST_WINDOW = 600
+
+## Seconds before an identical request is allowed.
+IDENTICAL_REQUEST_WINDOW = 15
+
+## Requests allowed for the same contract, exchange and tick type within two seconds.
+CONTRACT_REQUEST_LIMIT = 5
+CONTRACT_REQUEST_WINDOW = 2
+
+## Seconds all requests are held after the first pacing violation.  Doubles with each further
+## violation, up to MAX_BACKOFF.
+BACKOFF = 15
+MAX_BACKOFF = 600
+
+
+# ==================================================================================================
+#
+# Classes
+#
+# ==================================================================================================
+class PacingRule():
+    """!
+    A sliding window that allows 'limit' requests with the same key within 'window' seconds.
+    """
+
+    def __init__(self, limit: int, window: float):
+        self.limit = limit
+        self.window = window
+        self.history = {}
+
+    def next_allowed(self, key, now: float):
+        """!
+        Returns the time a request with the key is next allowed.
+
+        @param key: The request's key for this rule.
+        @param now: The current time.
+
+        @return time: The time the request is allowed, 'now' if it is allowed immediately.
+        """
+        request_times = self.history.get(key)
+
+        if request_times is None:
+            return now
+
+        while request_times and request_times[0] <= now - self.window:
+            request_times.popleft()
+
+        if len(request_times) == 0:
+            self.history.pop(key)
+            return now
+
+        if len(request_times) < self.limit:
+            return now
+
+        return request_times[0] + self.window
+
+    def record(self, key, now: float):
+        if key not in self.history:
+            self.history[key] = deque()
+
+        self.history[key].append(now)
+
+
+class PacingScheduler():
+    """!
+    Queues paced requests and sends each one as soon as every pacing rule allows it.
+
+    Requests are sent from the scheduler's own thread, so the caller never sleeps.  A request
+    that is blocked does not hold up later requests that are allowed, e.g. for other contracts.
+    When TWS still reports a pacing violation, the request is resent after a backoff.
+    """
+
+    def __init__(self, on_error=None):
+        """!
+        @param on_error: Called with the request id and the exception when sending a request
+            raises.
+        """
+        self.on_error = on_error
+        self.global_rule = PacingRule(GLOBAL_REQUEST_LIMIT, GLOBAL_REQUEST_WINDOW)
+        self.identical_rule = PacingRule(1, IDENTICAL_REQUEST_WINDOW)
+        self.contract_rule = PacingRule(CONTRACT_REQUEST_LIMIT, CONTRACT_REQUEST_WINDOW)
+
+        ## Requests waiting to be sent, oldest first.
+        self.pending = deque()
+
+        ## Sent requests, kept so they can be resent after a pacing violation.
+        self.requests = {}
+
+        self.backoff = 0
+        self.backoff_until = 0.0
+        self.last_violation = 0.0
+        self.condition = threading.Condition()
+        self.thread = None
+
+    def cancel(self, req_id: int):
+        """!
+        Forgets a request, whether or not it has been sent.
+
+        @param req_id: The request's identifier
+
+        @return bool: True if the request had already been sent, so must be cancelled with TWS.
+        """
+        with self.condition:
+            sent = self.requests.pop(req_id, None) is not None
+
+            # A request waiting to be resent after a pacing violation is no longer with TWS.
+            for request in self.pending:
+                if request["req_id"] == req_id:
+                    self.pending.remove(request)
+                    return False
+
+            return sent
+
+    def complete(self, req_id: int):
+        """!
+        Forgets a request once TWS has answered it.
+
+        @param req_id: The request's identifier
+        """
+        with self.condition:
+            self.requests.pop(req_id, None)
+
+    def get_sent_time(self, req_id: int):
+        """!
+        Returns when a request was sent to TWS.
+
+        @param req_id: The request's identifier
+
+        @return time: The time.monotonic() the request was last sent, None if it is waiting to be
+            sent or is unknown.
+        """
+        with self.condition:
+            request = self.requests.get(req_id)
+            return None if request is None else request.get("sent_time")
+
+    def retry(self, req_id: int):
+        """!
+        Resends a request TWS rejected for a pacing violation, after backing off.
+
+        @param req_id: The request's identifier
+
+        @return bool: False if the request is unknown.
+        """
+        with self.condition:
+            request = self.requests.get(req_id)
+
+            if request is None:
+                return False
+
+            now = time.monotonic()
+
+            if now - self.last_violation > MAX_BACKOFF:
+                self.backoff = 0
+
+            self.backoff = min(max(self.backoff * 2, BACKOFF), MAX_BACKOFF)
+            self.backoff_until = now + self.backoff
+            self.last_violation = now
+            request["sent_time"] = None
+            self.pending.appendleft(request)
+            self.condition.notify()
+
+        logger.warning("Pacing violation for request %s, resending in %s seconds", req_id,
+                       self.backoff)
+        return True
+
+    def submit(self, req_id: int, send, identical_key: tuple, contract_key: tuple,
+               paced: bool = True):
+        """!
+        Queues a request to be sent once the pacing rules allow it.
+
+        @param req_id: The request's identifier
+        @param send: Called without arguments to send the request.
+        @param identical_key: Identifies identical requests.
+        @param contract_key: The request's contract, exchange and tick type.
+        @param paced: False for requests the pacing rules do not apply to.  They are only held
+            while backing off from a pacing violation.
+        """
+        request = {
+            "req_id": req_id,
+            "send": send,
+            "identical_key": identical_key,
+            "contract_key": contract_key,
+            "paced": paced,
+            "sent_time": None
+        }
+
+        with self.condition:
+            self.pending.append(request)
+
+            if self.thread is None:
+                self.thread = threading.Thread(target=self._run, daemon=True)
+                self.thread.start()
+
+            self.condition.notify()
+
+    # ==============================================================================================
+    #
+    # Private Functions
+    #
+    # ==============================================================================================
+    def _next_allowed(self, request: dict, now: float):
+        if not request["paced"]:
+            return now
+
+        return max(self.global_rule.next_allowed(None, now),
+                   self.identical_rule.next_allowed(request["identical_key"], now),
+                   self.contract_rule.next_allowed(request["contract_key"], now))
+
+    def _record(self, request: dict, now: float):
+        if request["paced"]:
+            self.global_rule.record(None, now)
+            self.identical_rule.record(request["identical_key"], now)
+            self.contract_rule.record(request["contract_key"], now)
+
+    def _run(self):
+        while True:
+            with self.condition:
+                request = self._wait_for_request()
+                request["sent_time"] = time.monotonic()
+                self._record(request, request["sent_time"])
+                self.requests[request["req_id"]] = request
+
+            logger.debug6("Sending paced request %s", request["req_id"])
+
+            # The thread sends every request, so one that fails must not stop it.  Socket errors
+            # raise OSError, and requests ibapi can not encode raise ValueError or TypeError.
+            try:
+                request["send"]()
+            except (OSError, ValueError, TypeError) as msg:
+                logger.error("Failed to send request %s: %s", request["req_id"], msg)
+                self.complete(request["req_id"])
+
+                if self.on_error is not None:
+                    self.on_error(request["req_id"], msg)
+
+    def _wait_for_request(self):
+        """!
+        Waits until a pending request is allowed, and removes it from the queue.
+
+        @return request: The request to send.
+        """
+        while True:
+            now = time.monotonic()
+            wait_time = None
+
+            if now < self.backoff_until:
+                wait_time = self.backoff_until - now
+            else:
+                for request in self.pending:
+                    next_allowed = self._next_allowed(request, now)
+
+                    if next_allowed <= now:
+                        self.pending.remove(request)
+                        return request
+
+                    if wait_time is None or next_allowed - now < wait_time:
+                        wait_time = next_allowed - now
+
+            self.condition.wait(wait_time)
@@ -0,0 +1,169 @@
+"""!
+@package pytrader.libs.clients.broker.ibkr.tws.registry
+
+Tracks the result of each request made to TWS as a future.
+
+@author G. S. Derber
+@date 2022-2023
+@copyright GNU Affero General Public License
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU Affero General Public License as
+    published by the Free Software Foundation, either version 3 of the
+    License, or (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU Affero General Public License for more details.
+
+    You should have received a copy of the GNU Affero General Public License
+    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+@file pytrader/libs/clients/broker/ibkr/tws/registry.py
+"""
+# Standard Libraries
+import threading
+import time
+
+from concurrent.futures import Future
+
+# 3rd Party Libraries
+
+# Application Libraries
+# System Library Overrides
+from pytrader.libs.system import logging
+
+# Other Libraries
+
+# ==================================================================================================
+#
+# Global Variables
+#
+# ==================================================================================================
+## Instance of Logging class
+logger = logging.getLogger(__name__)
+
+## Seconds a request's future is kept once it is done, if its result is never collected.
+RESULT_TTL = 600
+
+
+# ==================================================================================================
+#
+# Classes
+#
+# ==================================================================================================
+class RequestRegistry():
+    """!
+    Holds a future for each outstanding request, keyed by request id.
+
+    A future is removed when its result is collected, when it is cancelled, or RESULT_TTL seconds
+    after it is done if nobody collects it.
+    """
+
+    def __init__(self):
+        self.futures = {}
+        self.done_times = {}
+        self.lock = threading.Lock()
+
+    def cancel(self, req_id: int):
+        """!
+        Cancels a request's future.  A result that arrives later is discarded.
+
+        @param req_id: The request's identifier
+
+        @return bool: True if the future was cancelled.
+        """
+        future = self.pop(req_id)
+        return future is not None and future.cancel()
+
+    def create(self, req_id: int):
+        """!
+        Creates the future for a new request.
+
+        @param req_id: The request's identifier
+
+        @return future: The request's future.
+        """
+        future = Future()
+
+        with self.lock:
+            self._remove_expired()
+            self.futures[req_id] = future
+
+        return future
+
+    def get_future(self, req_id: int):
+        return self.futures.get(req_id)
+
+    def pop(self, req_id: int):
+        with self.lock:
+            self.done_times.pop(req_id, None)
+            return self.futures.pop(req_id, None)
+
+    def set_exception(self, req_id: int, exception: Exception):
+        """!
+        Fails a request.
+
+        @param req_id: The request's identifier
+        @param exception: The error raised to anyone waiting for the result.
+
+        @return bool: False if the request is unknown or already done.
+        """
+        future = self._get_pending(req_id)
+
+        if future is None:
+            return False
+
+        future.set_exception(exception)
+        return True
+
+    def set_result(self, req_id: int, result):
+        """!
+        Completes a request.
+
+        @param req_id: The request's identifier
+        @param result: The request's data.
+
+        @return bool: False if the request is unknown or already done.
+        """
+        future = self._get_pending(req_id)
+
+        if future is None:
+            return False
+
+        future.set_result(result)
+        return True
+
+    # ==============================================================================================
+    #
+    # Private Functions
+    #
+    # ==============================================================================================
+    def _get_pending(self, req_id: int):
+        """!
+        Returns the future of a request that is not done or cancelled, and marks it as done.
+        """
+        with self.lock:
+            future = self.futures.get(req_id)
+
+            if future is None or req_id in self.done_times:
+                return None
+
+            # Once running, the future can no longer be cancelled before its result is set.
+            if not future.set_running_or_notify_cancel():
+                self.futures.pop(req_id)
+                return None
+
+            self.done_times[req_id] = time.monotonic()
+            return future
+
+    def _remove_expired(self):
+        expiry_time = time.monotonic() - RESULT_TTL
+
+        for req_id, done_time in list(self.done_times.items()):
+            if done_time < expiry_time:
+                logger.debug3("Removing uncollected result for request %s", req_id)
+                self.done_times.pop(req_id)
+                self.futures.pop(req_id, None)
+
@@ -22,10 +22,11 @@ The main user interface for the trading program.
 @file pytrader/libs/events/__init__.py
 """
 # System Libraries
+import pickle
+
 from abc import ABC, abstractmethod
 from threading import Event
 from multiprocessing import Queue
-from typing import List
 
 # 3rd Party Libraries
 
@@ -45,6 +46,10 @@ from pytrader.libs.system import logging
 ## The Base Logger
 logger = logging.getLogger(__name__)
 
+## Event types used as the first part of a subscription key.
+MARKET_DATA_EVENT = "market_data"
+REAL_TIME_BARS_EVENT = "real_time_bars"
+
 
 # ==================================================================================================
 #
@@ -53,6 +58,13 @@ logger = logging.getLogger(__name__)
 # ==================================================================================================
 class Subject(ABC):
 
+    def __init__(self):
+        self._observers = []
+        ## Pickled messages for the current event, shared by every observer.
+        self.messages = {}
+        ## Queues that batch messages until the current event ends.
+        self.batched_queues = []
+
     @abstractmethod
     def attach(self, observer, brokerclient) -> None:
         """!
@@ -71,6 +83,50 @@ class Subject(ABC):
         Notifies all observers about an event.
         """
 
+    def get_message(self, key: tuple, message: dict) -> bytes:
+        """!
+        Returns a message for the current event, pickled only once however many observers send it.
+
+        Every observer's queue receives the same bytes, so the broker's cost does not grow with the
+        number of strategies.  Subjects using this clear 'messages' at the start of each notify.
+
+        @param key: Identifies the message within the current event.
+        @param message: The message.  Only pickled the first time the key is seen.
+
+        @return message: The pickled message.
+        """
+        if key not in self.messages:
+            self.messages[key] = pickle.dumps(message, protocol=pickle.HIGHEST_PROTOCOL)
+
+        return self.messages[key]
+
+    def send_message(self, msg_queue, key: tuple, message: dict) -> None:
+        """!
+        Puts the message for the current event on an observer's queue.
+
+        Queues that batch the messages of an event, e.g. a StrategyHost's, are flushed once the
+        event ends.
+
+        @param msg_queue: The observer's queue.
+        @param key: Identifies the message within the current event.
+        @param message: The message.
+
+        @return None
+        """
+        msg_queue.put(self.get_message(key, message))
+
+        if hasattr(msg_queue, "flush") and msg_queue not in self.batched_queues:
+            self.batched_queues.append(msg_queue)
+
+    def flush_messages(self) -> None:
+        """!
+        Flushes the queues that batched messages during the current event.
+        """
+        for msg_queue in self.batched_queues:
+            msg_queue.flush()
+
+        self.batched_queues = []
+
 
 class Observer(ABC):
     """!
@@ -84,26 +140,98 @@ class Observer(ABC):
         """
 
 
-class BarData(Subject):
+class SubscriptionRegistry():
+    """!
+    Maps each (event type, instrument) to the observers subscribed to it, so an event only reaches
+    its subscribers without checking every observer.
+
+    The subscribers for a key are stored as a tuple that is replaced on every change.  An event
+    being delivered on one thread is never affected by a subscription changing on another.
+    """
+
+    def __init__(self):
+        self.subscriptions = {}
+
+    def get_subscribers(self, event_type: str, instrument: str):
+        return self.subscriptions.get((event_type, instrument), ())
+
+    def is_subscribed(self, event_type: str, instrument: str):
+        return (event_type, instrument) in self.subscriptions
+
+    def subscribe(self, event_type: str, instrument: str, observer: Observer):
+        key = (event_type, instrument)
+        subscribers = self.subscriptions.get(key, ())
+
+        if observer not in subscribers:
+            self.subscriptions[key] = subscribers + (observer, )
 
-    _observers: List[Observer] = []
-    contracts = {}
-    ohlc_bars = {}
+    def unsubscribe(self, event_type: str, instrument: str, observer: Observer):
+        key = (event_type, instrument)
+        subscribers = tuple(
+            subscriber for subscriber in self.subscriptions.get(key, ()) if subscriber != observer)
+
+        if len(subscribers) > 0:
+            self.subscriptions[key] = subscribers
+        else:
+            self.subscriptions.pop(key, None)
+
+
+class BarData(Subject):
 
     def __init__(self):
+        super().__init__()
+        self.contracts = {}
+        self.ohlc_bars = {}
         self.tickers = []
         self.bar_sizes = []
+        self.warmup_bars = {}
+        self.history_start = {}
         self.brokerclient = None
 
-    def add_bar_sizes(self, tickers: list, contracts: dict, bar_sizes: list):
+    def add_bar_sizes(self,
+                      tickers: list,
+                      contracts: dict,
+                      bar_sizes: list,
+                      warmup_bars: dict = None,
+                      history_start: dict = None):
+        if warmup_bars is None:
+            warmup_bars = {}
+        if history_start is None:
+            history_start = {}
+
         for ticker in tickers:
             if ticker not in self.tickers:
                 self.tickers.append(ticker)
 
+            if ticker not in self.history_start:
+                self.history_start[ticker] = {}
+
+            # Likewise the history must start early enough for every strategy.  None means a
+            # strategy has no bars for the ticker yet.
+            for bar_size in bar_sizes:
+                current_start = self.history_start[ticker].get(bar_size, float("inf"))
+                ticker_start = history_start.get(ticker, {})
+
+                if current_start is None or bar_size not in ticker_start:
+                    self.history_start[ticker][bar_size] = None
+                else:
+                    self.history_start[ticker][bar_size] = min(current_start,
+                                                               ticker_start[bar_size])
+
         for bar_size in bar_sizes:
             if bar_size not in self.bar_sizes:
                 self.bar_sizes.append(bar_size)
 
+            # The bars are shared by every strategy, so the history must cover the strategy that
+            # needs the most.  None means a strategy wants the full default history.
+            current_bars = self.warmup_bars.get(bar_size, 0)
+
+            if current_bars is None or bar_size not in warmup_bars:
+                self.warmup_bars[bar_size] = None
+            else:
+                self.warmup_bars[bar_size] = max(current_bars, warmup_bars[bar_size])
+
+
         for ticker, contract_ in contracts.items():
             if ticker not in list(self.contracts.keys()):
                 self.contracts[ticker] = contract_
@@ -119,17 +247,20 @@ class BarData(Subject):
             self._observers.remove(observer)
 
     def notify(self, modifier=None):
+        self.messages = {}
+
         for observer in self._observers:
             if modifier != observer:
                 observer.update(self)
 
+        self.flush_messages()
 
-class ContractData(Subject):
 
-    _observers: List[Observer] = []
-    contracts = {}
+class ContractData(Subject):
 
     def __init__(self):
+        super().__init__()
+        self.contracts = {}
         self.tickers = []
         self.brokerclient = None
 
@@ -162,15 +293,15 @@ class ContractData(Subject):
 
 class MarketData(Subject):
 
-    _observers: list[Observer] = []
-    contracts = {}
-    ticker = None
-    market_data = {}
-    rtmd_ids = {}
-
-    def __init__(self):
+    def __init__(self, subscriptions: SubscriptionRegistry = None):
+        super().__init__()
+        self.contracts = {}
+        self.ticker = None
+        self.market_data = {}
+        self.rtmd_ids = {}
         self.tickers = []
         self.brokerclient = None
+        self.subscriptions = subscriptions if subscriptions is not None else SubscriptionRegistry()
 
     def add_tickers(self, tickers: list, contracts: dict):
         for ticker in tickers:
@@ -190,19 +321,35 @@ class MarketData(Subject):
         if observer in self._observers:
             self._observers.remove(observer)
 
+    def is_subscribed(self, ticker: str):
+        return self.subscriptions.is_subscribed(MARKET_DATA_EVENT, ticker)
+
     def notify(self, modifier=None):
-        for observer in self._observers:
+        self.messages = {}
+
+        for observer in self.subscriptions.get_subscribers(MARKET_DATA_EVENT, self.ticker):
             if modifier != observer:
                 observer.update(self)
 
+        self.flush_messages()
 
-class OptionData(Subject):
+    def subscribe(self, observer: Observer, tickers: list):
+        for ticker in tickers:
+            self.subscriptions.subscribe(MARKET_DATA_EVENT, ticker, observer)
 
-    _observers: List[Observer] = []
-    option_details = {}
-    contracts = {}
+    def unsubscribe(self, observer: Observer, tickers: list):
+        for ticker in tickers:
+            self.subscriptions.unsubscribe(MARKET_DATA_EVENT, ticker, observer)
+
+
+class OptionData(Subject):
 
     def __init__(self):
+        super().__init__()
+        self.option_details = {}
+        ## The tickers whose option details are sent on notify.  None to send every ticker's.
+        self.updated_tickers = None
+        self.contracts = {}
         self.tickers = []
         self.brokerclient = None
 
@@ -226,20 +373,26 @@ class OptionData(Subject):
             self._observers.remove(observer)
 
     def notify(self, modifier=None):
+        self.messages = {}
+
         for observer in self._observers:
             if modifier != observer:
                 observer.update(self)
 
+        self.flush_messages()
 
-class OrderData(Subject):
 
-    _observers: List[Observer] = []
-    valid_order_ids = []
-    order_id = None
-    order_status = {}
+class OrderData(Subject):
 
     def __init__(self):
+        super().__init__()
+        self.valid_order_ids = []
+        self.order_id = None
+        self.order_status = {}
+        self.order_message = {}
         self.brokerclient = None
+        ## Maps execution ids to order ids, until the execution's commission report arrives.
+        self.exec_order_ids = {}
 
     def attach(self, observer: Observer, brokerclient):
         self.brokerclient = brokerclient
@@ -258,12 +411,16 @@ class OrderData(Subject):
 
 
 class RealTimeBarData(Subject):
-    _observers: List[Observer] = []
-    contracts = {}
-    rtb_ids = {}
-    ohlc_bar = []
-    tickers = []
-    ticker = None
+
+    def __init__(self, subscriptions: SubscriptionRegistry = None):
+        super().__init__()
+        self.contracts = {}
+        self.rtb_ids = {}
+        self.ohlc_bar = []
+        self.tickers = []
+        self.ticker = None
+        self.brokerclient = None
+        self.subscriptions = subscriptions if subscriptions is not None else SubscriptionRegistry()
 
     def add_tickers(self, tickers: list, contracts: dict):
         for ticker in tickers:
@@ -284,11 +441,26 @@ class RealTimeBarData(Subject):
         if observer in self._observers:
             self._observers.remove(observer)
 
+    def is_subscribed(self, ticker: str):
+        return self.subscriptions.is_subscribed(REAL_TIME_BARS_EVENT, ticker)
+
     def notify(self, modifier=None):
-        for observer in self._observers:
+        self.messages = {}
+
+        for observer in self.subscriptions.get_subscribers(REAL_TIME_BARS_EVENT, self.ticker):
             if modifier != observer:
                 observer.update(self)
 
+        self.flush_messages()
+
+    def subscribe(self, observer: Observer, tickers: list):
+        for ticker in tickers:
+            self.subscriptions.subscribe(REAL_TIME_BARS_EVENT, ticker, observer)
+
+    def unsubscribe(self, observer: Observer, tickers: list):
+        for ticker in tickers:
+            self.subscriptions.unsubscribe(REAL_TIME_BARS_EVENT, ticker, observer)
+
 
 class TickSubject(Subject):
     pass
@@ -25,6 +25,7 @@ Provides real-time market data
 # Standard libraries
 
 # 3rd Party libraries
+import numpy
 import pandas
 
 # System Library Overrides
@@ -39,6 +40,104 @@ from pytrader.libs.system import logging
 # ==================================================================================================
 logger = logging.getLogger(__name__)
 
+## Maps the TWS tick type id to the name of the market data field it updates.
+## https://interactivebrokers.github.io/tws-api/tick_types.html
+TICK_FIELDS = {
+    0: "bid_size",
+    1: "bid",
+    2: "ask",
+    3: "ask_size",
+    4: "last",
+    5: "last_size",
+    6: "high",
+    7: "low",
+    8: "volume",
+    9: "close",
+    10: "bid_option_computation",
+    11: "ask_option_computation",
+    12: "last_option_computation",
+    13: "model_option_computation",
+    14: "open",
+    15: "13week_low",
+    16: "13week_high",
+    17: "26week_low",
+    18: "26week_high",
+    19: "52week_low",
+    20: "52week_high",
+    21: "average_volume",
+    23: "option_historical_volatility",
+    24: "option_implied_volatility",
+    27: "option_call_open_interest",
+    28: "option_put_open_interest",
+    29: "option_call_volume",
+    30: "option_put_volume",
+    32: "bid_exchange",
+    33: "ask_exchange",
+    34: "auction_volume",
+    35: "auction_price",
+    36: "auction_imbalance",
+    37: "mark",
+    45: "last_timestamp",
+    46: "shortable",
+    48: "rt_volume",
+    49: "halted",
+    54: "trade_count",
+    55: "trade_rate",
+    56: "volume_per_minute",
+    57: "last_rth_trade",
+    59: "dividends",
+    63: "3min_volume",
+    64: "5min_volume",
+    65: "10min_volume",
+    77: "rt_trade_volume",
+    79: "creditman_slow_mark_price",
+    84: "last_exchange",
+    87: "average_option_volume",
+    89: "shortable_shares"
+}
+
+## Tick types TWS sends for every market data request, without asking for any generic ticks.
+DEFAULT_TICK_TYPES = [0, 1, 2, 3, 4, 5, 6, 7, 8, 9, 10, 11, 12, 13, 14, 32, 33, 45, 49, 84]
+
+## Tick types every strategy receives.  The snapshot's prices and 'on_open' depend on these.
+BASE_TICK_TYPES = [1, 2, 4, 6, 7, 9, 14]
+
+## Stands in for a tick type for news headlines, which TWS sends without a tick type id.
+NEWS_TICK = "news"
+
+## Maps each generic tick id to the tick types it adds to a market data request.
+## https://interactivebrokers.github.io/tws-api/tick_types.html
+GENERIC_TICKS = {
+    100: [29, 30],
+    101: [27, 28],
+    104: [23],
+    105: [87],
+    106: [24],
+    165: [15, 16, 17, 18, 19, 20, 21],
+    221: [37],
+    225: [34, 35, 36],
+    233: [48],
+    236: [46, 89],
+    292: [NEWS_TICK],
+    293: [54],
+    294: [55],
+    295: [56],
+    318: [57],
+    375: [77],
+    456: [59],
+    595: [63, 64, 65],
+    619: [79]
+}
+
+## Generic ticks TWS only accepts for stocks.
+STOCK_GENERIC_TICKS = [100, 101, 104, 105, 106, 165, 292]
+
+## Column of each field in the snapshot array.
+FIELD_SLOTS = {field: slot for slot, field in enumerate(TICK_FIELDS.values())}
+
+## Column of each tick type id in the snapshot array.
+TICK_SLOTS = {tick_type: FIELD_SLOTS[field] for tick_type, field in TICK_FIELDS.items()}
+
 
 # ==================================================================================================
 #
@@ -77,3 +176,206 @@ class BasicMktData():
 
 class MarketData(BasicMktData):
     pass
+
+
+class MarketDataSnapshot():
+    """!
+    Contains the latest level 1 market data for every instrument a strategy follows.
+
+    The values are held in a single two dimensional float array, with one row per instrument and
+    one column per tick field, so an update is a single in place assignment and a whole column (for
+    example every bid) can be read as a vector.  Ticks that are not numeric (exchanges, timestamp
+    strings) are kept in a per instrument dictionary.
+    """
+
+    def __init__(self, capacity: int = 64):
+        """!
+        Initializes the class
+
+        @param capacity: The number of instrument rows to allocate initially.
+
+        @return None
+        """
+        ## The latest value of every numeric tick field, indexed by [instrument slot, field slot]
+        self.values = numpy.zeros((capacity, len(FIELD_SLOTS)), dtype=numpy.float64)
+
+        ## Maps each ticker to its instrument slot
+        self.slots = {}
+
+        ## Tickers in instrument slot order
+        self.tickers = []
+
+        ## Non numeric tick values, indexed by instrument slot
+        self.other_values = []
+
+    def __contains__(self, ticker: str):
+        return ticker in self.slots
+
+    def __len__(self):
+        return len(self.tickers)
+
+    def __repr__(self):
+        class_name = type(self).__name__
+        return f"{class_name}({len(self.tickers)} instruments: {self.tickers})"
+
+    def add_instrument(self, ticker: str):
+        """!
+        Adds an instrument to the snapshot if it does not already exist.
+
+        @param ticker: The instrument to add.
+
+        @return slot: The instrument slot for the ticker.
+        """
+        slot = self.slots.get(ticker)
+
+        if slot is None:
+            slot = len(self.tickers)
+
+            if slot == self.values.shape[0]:
+                self._grow()
+
+            self.slots[ticker] = slot
+            self.tickers.append(ticker)
+            self.other_values.append({})
+
+        return slot
+
+    def get(self, ticker: str, field: str):
+        """!
+        Returns the latest value of a single field for an instrument.
+
+        @param ticker: The instrument.
+        @param field: The name of the tick field, as listed in TICK_FIELDS.
+
+        @return value: The latest value, 0 if nothing has been received.
+        """
+        slot = self.slots[ticker]
+        field_slot = FIELD_SLOTS[field]
+        other = self.other_values[slot]
+
+        if field in other:
+            return other[field]
+
+        return self.values[slot, field_slot]
+
+    def get_column(self, field: str, tickers: list = None):
+        """!
+        Returns a field for several instruments as a vector.
+
+        @param field: The name of the tick field, as listed in TICK_FIELDS.
+        @param tickers: The instruments to return.  Defaults to every instrument, in slot order.
+
+        @return numpy.ndarray: The values of the field.
+        """
+        field_slot = FIELD_SLOTS[field]
+
+        if tickers is None:
+            return self.values[:len(self.tickers), field_slot]
+
+        return self.values[self.get_slots(tickers), field_slot]
+
+    def get_mids(self, tickers: list = None):
+        """!
+        Returns the bid/ask midpoint for several instruments as a vector.
+
+        @param tickers: The instruments to return.  Defaults to every instrument, in slot order.
+
+        @return numpy.ndarray: The midpoints.
+        """
+        return (self.get_column("bid", tickers) + self.get_column("ask", tickers)) / 2
+
+    def get_slots(self, tickers: list):
+        """!
+        Returns the instrument slots for a list of tickers, for use as a numpy index.
+
+        @param tickers: The instruments.
+
+        @return numpy.ndarray: The instrument slots.
+        """
+        return numpy.fromiter((self.slots[ticker] for ticker in tickers),
+                              dtype=numpy.intp,
+                              count=len(tickers))
+
+    def update(self, ticker: str, tick_type: int, value):
+        """!
+        Stores the latest value for a tick.
+
+        @param ticker: The instrument the tick is for.
+        @param tick_type: The TWS tick type id.
+        @param value: The tick's value.
+
+        @return bool: False if the tick type is not tracked by the snapshot.
+        """
+        field_slot = TICK_SLOTS.get(tick_type)
+
+        if field_slot is None:
+            return False
+
+        slot = self.slots[ticker]
+
+        try:
+            self.values[slot, field_slot] = value
+        except (TypeError, ValueError):
+            self.other_values[slot][TICK_FIELDS[tick_type]] = value
+        else:
+            if self.other_values[slot]:
+                self.other_values[slot].pop(TICK_FIELDS[tick_type], None)
+
+        return True
+
+    # ==============================================================================================
+    #
+    # Private Functions
+    #
+    # ==============================================================================================
+    def _grow(self):
+        rows, columns = self.values.shape
+        values = numpy.zeros((rows * 2, columns), dtype=numpy.float64)
+        values[:rows] = self.values
+        self.values = values
+
+
+# ==================================================================================================
+#
+# Functions
+#
+# ==================================================================================================
+def get_generic_ticks(tick_types, sec_type: str = "STK"):
+    """!
+    Returns the fewest generic ticks needed to receive the tick types.
+
+    @param tick_types: The tick types wanted.
+    @param sec_type: The security type of the contract.  Some generic ticks are stock only.
+
+    @return generic_ticks: A sorted list of generic tick ids.
+    """
+    generic_ticks = []
+
+    for generic_tick, generic_tick_types in GENERIC_TICKS.items():
+        if sec_type != "STK" and generic_tick in STOCK_GENERIC_TICKS:
+            continue
+
+        if any(tick_type in tick_types for tick_type in generic_tick_types):
+            generic_ticks.append(generic_tick)
+
+    return generic_ticks
+
+
+def get_tick_types(fields):
+    """!
+    Converts a list of tick type ids and/or field names into tick type ids.
+
+    @param fields: Tick type ids, or field names from TICK_FIELDS.
+
+    @return tick_types: A set of tick type ids.
+    """
+    field_ticks = {field: tick_type for tick_type, field in TICK_FIELDS.items()}
+    tick_types = set(BASE_TICK_TYPES)
+
+    for field in fields:
+        if field in field_ticks:
+            tick_types.add(field_ticks[field])
+        else:
+            tick_types.add(field)
+
+    return tick_types
@@ -0,0 +1,266 @@
+"""!@package pytrader.libs.options
+
+Provides option chain indexing.
+
+@author G. S. Derber
+@date 2022-2023
+@copyright GNU Affero General Public License
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU Affero General Public License as
+    published by the Free Software Foundation, either version 3 of the
+    License, or (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU Affero General Public License for more details.
+
+    You should have received a copy of the GNU Affero General Public License
+    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+@file pytrader/libs/options/__init__.py
+"""
+# Standard libraries
+import datetime
+
+# 3rd Party libraries
+import numpy
+
+# System Library Overrides
+from pytrader.libs.system import logging
+
+# Other Application Libraries
+
+# ==================================================================================================
+#
+# Global Variables
+#
+# ==================================================================================================
+## The Base Logger
+logger = logging.getLogger(__name__)
+
+## Option chains that have already been built, keyed by the underlying's ticker.
+option_chains = {}
+
+
+# ==================================================================================================
+#
+# Classes
+#
+# ==================================================================================================
+class OptionChain():
+    """!
+    An index of the strikes and expirations available for an underlying.
+
+    Strikes are held in a sorted array and expirations are parsed once, so selecting the strikes
+    around a price or the first expiration after a number of days is a binary search.
+    """
+
+    def __init__(self, ticker: str, expirations, strikes):
+        """!
+        Initializes the class
+
+        @param ticker: The underlying's ticker.
+        @param expirations: The expirations, formatted as YYYYMMDD.
+        @param strikes: The strikes.
+
+        @return None
+        """
+        ## The underlying's ticker
+        self.ticker = ticker
+
+        ## Sorted, unique strikes
+        self.strikes = numpy.unique(numpy.asarray(list(strikes), dtype=numpy.float64))
+
+        ## Sorted expirations, formatted as YYYYMMDD
+        self.expirations = sorted(set(expirations))
+
+        ## Expiration dates, in the same order as self.expirations
+        self.expiration_dates = numpy.array(
+            [f"{item[:4]}-{item[4:6]}-{item[6:8]}" for item in self.expirations],
+            dtype="datetime64[D]")
+
+    def __repr__(self):
+        class_name = type(self).__name__
+        return f"{class_name}({self.ticker}: {len(self.expirations)} expirations, " \
+            f"{len(self.strikes)} strikes)"
+
+    def get_days_to_expiration(self, today: datetime.date = None):
+        """!
+        Returns the number of days to each expiration.
+
+        @param today: The date to count from.  Defaults to today.
+
+        @return numpy.ndarray: Days to expiration, in the same order as self.expirations.
+        """
+        if today is None:
+            today = datetime.date.today()
+
+        return (self.expiration_dates - numpy.datetime64(today, "D")).astype(numpy.int64)
+
+    def select_expiration(self, days_to_expiration: int, today: datetime.date = None):
+        """!
+        Returns the first expiration at least a number of days away.
+
+        @param days_to_expiration: The minimum number of days to expiration.
+        @param today: The date to count from.  Defaults to today.
+
+        @return str: The expiration formatted as YYYYMMDD, or None if no expiration is far enough
+            away.
+        """
+        if today is None:
+            today = datetime.date.today()
+
+        min_expiry = numpy.datetime64(today, "D") + days_to_expiration
+        index = numpy.searchsorted(self.expiration_dates, min_expiry, side="left")
+
+        if index < len(self.expirations):
+            return self.expirations[index]
+
+        return None
+
+    def select_strikes(self, price: float, num_strikes: int):
+        """!
+        Returns the strikes around a price.
+
+        The strikes bracketing the price are found, and num_strikes // 2 strikes are added on
+        either side of the lower one.
+
+        @param price: The price to center the strikes on.
+        @param num_strikes: The number of strikes wanted.
+
+        @return list: The selected strikes, in ascending order.
+        """
+        strikes_len = len(self.strikes)
+
+        if strikes_len < 2:
+            return self.strikes.tolist()
+
+        lower_index = self.get_strike_index(price)
+        half_width = num_strikes // 2
+
+        begin_ = max(lower_index - half_width, 0)
+        end_ = lower_index + half_width + 1
+
+        return self.strikes[begin_:end_].tolist()
+
+    def get_strike_index(self, price: float):
+        """!
+        Returns the index of the strike at or just below a price.
+
+        @param price: The price.
+
+        @return int: The index of the lower strike bracketing the price.
+        """
+        index = int(numpy.searchsorted(self.strikes, float(price), side="right")) - 1
+        return min(max(index, 0), len(self.strikes) - 2)
+
+
+class OptionWindow():
+    """!
+    Keeps a window of strikes centred on the underlying's price.
+
+    The window is only moved once the price has drifted a number of strikes (the hysteresis) away
+    from the strike the window was centred on, so a price oscillating around a strike does not cause
+    subscriptions to be repeatedly added and cancelled.
+    """
+
+    def __init__(self, chain: OptionChain, num_strikes: int, hysteresis: int = 2):
+        """!
+        Initializes the class
+
+        @param chain: The option chain to select strikes from.
+        @param num_strikes: The number of strikes in the window.
+        @param hysteresis: The number of strikes the price must move before the window is moved.
+
+        @return None
+        """
+        ## The option chain
+        self.chain = chain
+
+        ## The number of strikes in the window
+        self.num_strikes = num_strikes
+
+        ## The number of strikes the price must move before re-centring
+        self.hysteresis = max(hysteresis, 1)
+
+        ## Index in the chain of the strike the window is centred on
+        self.center_index = None
+
+        ## The strikes currently in the window
+        self.strikes = []
+
+    def __repr__(self):
+        class_name = type(self).__name__
+        return f"{class_name}({self.chain.ticker}: {self.strikes})"
+
+    def set_chain(self, chain: OptionChain):
+        """!
+        Replaces the option chain, e.g. when a newer chain is received.  The window is re-centred on
+        the next update.
+
+        @param chain: The new option chain.
+
+        @return None
+        """
+        if chain is not self.chain:
+            self.chain = chain
+            self.center_index = None
+
+    def update(self, price: float):
+        """!
+        Moves the window if the price has moved far enough from the centre.
+
+        @param price: The underlying's current price.
+
+        @return (added, removed): Strikes that entered and strikes that left the window.
+        """
+        index = self.chain.get_strike_index(price)
+
+        if self.center_index is not None and abs(index - self.center_index) < self.hysteresis:
+            return [], []
+
+        new_strikes = self.chain.select_strikes(price, self.num_strikes)
+
+        added = [strike for strike in new_strikes if strike not in self.strikes]
+        removed = [strike for strike in self.strikes if strike not in new_strikes]
+
+        if self.center_index is not None:
+            logger.debug2("Re-centring %s strikes from %s to %s", self.chain.ticker,
+                          self.chain.strikes[self.center_index], self.chain.strikes[index])
+
+        self.center_index = index
+        self.strikes = new_strikes
+
+        return added, removed
+
+
+# ==================================================================================================
+#
+# Functions
+#
+# ==================================================================================================
+def get_option_chain(ticker: str, option_details: dict = None):
+    """!
+    Returns the option chain for an underlying, building it whenever details are received.
+
+    Chains are kept for the life of the process, so every strategy that trades options on the same
+    underlying shares one index.  The broker sends fresh details each day, so the chain is rebuilt
+    when they are passed in, unless they match the chain already built.
+
+    @param ticker: The underlying's ticker.
+    @param option_details: The option details received from the broker.
+
+    @return OptionChain: The option chain, or None if it has not been built.
+    """
+    if option_details is not None:
+        chain = OptionChain(ticker, option_details["expirations"], option_details["strikes"])
+        current_chain = option_chains.get(ticker)
+
+        if current_chain is None or current_chain.expirations != chain.expirations or \
+                not numpy.array_equal(current_chain.strikes, chain.strikes):
+            option_chains[ticker] = chain
+            logger.debug2("Option Chain Created: %s", chain)
+
+    return option_chains.get(ticker)
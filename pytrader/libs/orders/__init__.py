@@ -21,9 +21,14 @@ Provides order management.
 
 @file pytrader/libs/orders/__init__.py
 """
+import copy
+import math
+import time
+
 from multiprocessing import Queue
 
 from ibapi import order
+from ibapi.common import UNSET_DOUBLE
 from ibapi.contract import Contract
 from pytrader.libs.system import logging
 from pytrader.libs.utilities.config import Config
@@ -36,6 +41,30 @@ from pytrader.libs.utilities.config import Config
 ## The Base Logger
 logger = logging.getLogger(__name__)
 
+## The broker account orders are placed in.  Read from the config once per process.
+_account = None
+
+## Minimum number of seconds between amendments sent for the same order.
+AMEND_INTERVAL = 1.0
+
+## Seconds to wait for the broker to acknowledge an amendment before sending the next one anyway.
+AMEND_TIMEOUT = 10.0
+
+## Order statuses after which an order can no longer be amended.
+FINAL_STATUSES = ["Filled", "Cancelled", "ApiCancelled", "Inactive", "TWS_CLOSED"]
+
+## Status of an order while the broker has not acknowledged its latest amendment.
+PENDING_MODIFY = "PendingModify"
+
+## Order types whose auxiliary price is a stop price.
+STOP_ORDER_TYPES = ["STP", "STP LMT"]
+
+## Price increments used when a contract's are not known: prices are rounded to the cent.
+DEFAULT_PRICE_INCREMENTS = [(0.0, 0.01)]
+
+## Order statuses showing the broker is working an order, so it has been transmitted.
+WORKING_STATUSES = ["PreSubmitted", "Submitted"]
+
 
 # ==================================================================================================
 #
@@ -51,6 +80,15 @@ class BaseOrder():
         self.status = None
         self.strategy_id = strategy
 
+        ## Changes waiting to be sent, held while an earlier amendment is pending or too recent.
+        self.amendment = {}
+        self.last_amend_time = 0.0
+        self.pending_modify = False
+
+        ## Set once the broker works the order.  An untransmitted order in a bracket is sent when
+        ## the bracket's last order is transmitted.
+        self.transmitted = False
+
     def get_order(self):
         return self.order
 
@@ -65,13 +103,9 @@ class BaseOrder():
         self.order.orderType = order_type
         self.order.totalQuantity = quantity
         self.order.transmit = transmit
-
-        conf = Config()
-        conf.read_config()
-        self.order.account = conf.brokerclient_account
+        self.order.account = get_account()
 
     def set_limit_order_price(self, price: float):
-        price = round(price, 2)
         self.order.lmtPrice = price
 
     def set_order_id(self, order_id: int):
@@ -84,10 +118,18 @@ class BaseOrder():
         self.order.parentId = order_id
 
     def set_status(self, status: str):
+        """!
+        Sets the order's status.  Any status from the broker acknowledges a pending amendment.
+        """
         self.status = status
 
+        if status != PENDING_MODIFY:
+            self.pending_modify = False
+
+        if status in WORKING_STATUSES:
+            self.transmitted = True
+
     def set_stop_price(self, price: float):
-        price = round(price, 2)
         self.order.auxPrice = price
 
 
@@ -105,6 +147,89 @@ class Order(BaseOrder):
         logger.debug9("Sending order message: %s", message)
         self.data_queue.put(message)
 
+    def amend(self, price: float = None, stop_price: float = None, quantity: int = None):
+        """!
+        Changes a working order's prices or quantity, keeping its order id.
+
+        The order is placed again with the same id, which the broker treats as a modification.  An
+        order is amended at most once every AMEND_INTERVAL seconds, and not while the broker has
+        yet to acknowledge the previous amendment, for up to AMEND_TIMEOUT seconds.  Changes made
+        in the meantime are combined and held until send_amendment() can send them.
+
+        @param price: The new limit price.
+        @param stop_price: The new stop price.
+        @param quantity: The new quantity.
+
+        @return bool: False if the order can no longer be amended.
+        """
+        if self.status in FINAL_STATUSES:
+            logger.warning("Order %s is %s and can not be amended", self.order.orderId,
+                           self.status)
+            return False
+
+        if price is not None:
+            self.amendment["price"] = price
+        if stop_price is not None:
+            self.amendment["stop_price"] = stop_price
+        if quantity is not None:
+            self.amendment["quantity"] = quantity
+
+        self.send_amendment()
+        return True
+
+    def has_amendment(self):
+        return len(self.amendment) > 0
+
+    def send_amendment(self):
+        """!
+        Sends the held amendment, if the order is ready for one.
+
+        @return bool: True if the amendment was sent.
+        """
+        if not self.amendment or self.status in FINAL_STATUSES:
+            self.amendment = {}
+            return False
+
+        amend_age = time.monotonic() - self.last_amend_time
+
+        if self.pending_modify and amend_age >= AMEND_TIMEOUT:
+            logger.warning("Order %s amendment not acknowledged after %s seconds",
+                           self.order.orderId, AMEND_TIMEOUT)
+            self.pending_modify = False
+
+        if self.pending_modify or amend_age < AMEND_INTERVAL:
+            logger.debug3("Holding amendment for order %s: %s", self.order.orderId,
+                          self.amendment)
+            return False
+
+        if "price" in self.amendment:
+            self.set_limit_order_price(self.amendment["price"])
+        if "stop_price" in self.amendment:
+            self.set_stop_price(self.amendment["stop_price"])
+        if "quantity" in self.amendment:
+            self.order.totalQuantity = self.amendment["quantity"]
+
+        # Orders held untransmitted in a bracket stay held until the bracket is transmitted, while
+        # the modification of a transmitted order must itself be transmitted.
+        if self.transmitted:
+            self.order.transmit = True
+        self.amendment = {}
+        self.pending_modify = True
+        self.last_amend_time = time.monotonic()
+        self.status = PENDING_MODIFY
+
+        message = {
+            self.strategy_id: {
+                "modify_order": {
+                    "order": self.order,
+                    "contract": self.contract
+                }
+            }
+        }
+        logger.debug9("Sending order modification: %s", message)
+        self.data_queue.put(message)
+        return True
+
     def send_order_cancel(self):
         message = {self.strategy_id: {"cancel_order": self.order.orderId}}
         self.data_queue.put(message)
@@ -200,3 +325,208 @@ class Order(BaseOrder):
     # def _send_order(self, order):
     #     message = {"place_order": order}
     #     self.cmd_queue.put(message)
+
+
+class OrderFactory():
+    """!
+    Builds orders for a strategy from prebuilt templates.
+
+    A template holds every field that is the same for each order of a contract, action and order
+    type, so a new order only copies the template and sets its id, quantity and prices.
+    """
+
+    def __init__(self, data_queue: Queue, strategy_id: str):
+        self.data_queue = data_queue
+        self.strategy_id = strategy_id
+        self.templates = {}
+
+    def create_order(self,
+                     contract: Contract,
+                     order_id: int,
+                     action: str,
+                     order_type: str,
+                     quantity: int,
+                     price: float = None,
+                     stop_price: float = None,
+                     transmit: bool = True):
+        """!
+        Creates an order.
+
+        @param contract: The contract to trade.
+        @param order_id: The order's id.
+        @param action: BUY or SELL
+        @param order_type: The order type, e.g. MKT, LMT, STP
+        @param quantity: The quantity to trade.
+        @param price: The limit price.
+        @param stop_price: The stop price.
+        @param transmit: Set to False to hold the order until a later order is transmitted.
+
+        @return new_order: The order.
+        """
+        new_order = Order(self.data_queue, contract, self.strategy_id)
+        # Deep copied, so list fields such as conditions and algoParams are not shared with the
+        # template.
+        new_order.order = copy.deepcopy(self._get_template(contract, action, order_type))
+        new_order.order.orderId = order_id
+        new_order.order.totalQuantity = quantity
+        new_order.order.transmit = transmit
+
+        if price is not None:
+            new_order.set_limit_order_price(price)
+        if stop_price is not None:
+            new_order.set_stop_price(stop_price)
+
+        return new_order
+
+    def create_bracket(self,
+                       contract: Contract,
+                       order_id: int,
+                       action: str,
+                       order_type: str,
+                       quantity: int,
+                       price: float = None,
+                       profit_target: float = None,
+                       stop_loss: float = None):
+        """!
+        Creates a bracket: a parent order with optional profit target and stop loss orders.
+
+        Only the last order is transmitted, so TWS never works a parent without its children.
+
+        @param contract: The contract to trade.
+        @param order_id: The parent order's id.  Children use the following ids.
+        @param action: BUY or SELL for the parent order.
+        @param order_type: The parent's order type.
+        @param quantity: The quantity to trade.
+        @param price: The parent's limit price.
+        @param profit_target: The profit target's limit price.
+        @param stop_loss: The stop loss's stop price.
+
+        @return bracket: The list of orders, parent first.
+        """
+        child_action = "SELL" if action == "BUY" else "BUY"
+        has_children = profit_target is not None or stop_loss is not None
+
+        parent = self.create_order(contract, order_id, action, order_type, quantity, price,
+                                   transmit=not has_children)
+        bracket = [parent]
+
+        if profit_target is not None:
+            order_id += 1
+            bracket.append(
+                self.create_order(contract, order_id, child_action, "LMT", quantity,
+                                  profit_target, transmit=stop_loss is None))
+
+        if stop_loss is not None:
+            order_id += 1
+            bracket.append(
+                self.create_order(contract, order_id, child_action, "STP", quantity,
+                                  stop_price=stop_loss))
+
+        for child in bracket[1:]:
+            child.set_parent_order_id(parent.order.orderId)
+
+        return bracket
+
+    def send_bracket(self, bracket: list):
+        """!
+        Sends every order of a bracket to the broker in one message.
+
+        @param bracket: The orders, parent first.
+
+        @return None
+        """
+        message = {
+            self.strategy_id: {
+                "place_bracket": [{
+                    "order": bracket_order.order,
+                    "contract": bracket_order.contract
+                } for bracket_order in bracket]
+            }
+        }
+        logger.debug9("Sending bracket message: %s", message)
+        self.data_queue.put(message)
+
+    def _get_template(self, contract: Contract, action: str, order_type: str):
+        key = (contract.localSymbol or contract.symbol, contract.secType, action, order_type)
+
+        if key not in self.templates:
+            template = order.Order()
+            template.action = action
+            template.orderType = order_type
+            template.account = get_account()
+            self.templates[key] = template
+
+        return self.templates[key]
+
+
+# ==================================================================================================
+#
+# Functions
+#
+# ==================================================================================================
+def get_account():
+    """!
+    Returns the broker account from the config, reading the config only the first time.
+    """
+    global _account
+
+    if _account is None:
+        conf = Config()
+        conf.read_config()
+        _account = conf.brokerclient_account
+
+    return _account
+
+
+def normalize_prices(broker_order: order.Order, price_increments: list):
+    """!
+    Snaps an order's limit and stop prices to valid price increments.
+
+    Prices are rounded passively: a buy limit rounds down and a sell limit rounds up, while a buy
+    stop rounds up and a sell stop rounds down.  A price is never moved to where it would fill or
+    trigger sooner than requested.
+
+    @param broker_order: The order to normalize.
+    @param price_increments: A list of (low edge, increment), sorted by low edge.
+
+    @return None
+    """
+    buy = broker_order.action == "BUY"
+
+    if broker_order.lmtPrice not in (None, UNSET_DOUBLE):
+        broker_order.lmtPrice = snap_price(broker_order.lmtPrice, price_increments, not buy)
+
+    if broker_order.orderType in STOP_ORDER_TYPES and broker_order.auxPrice not in (None,
+                                                                                     UNSET_DOUBLE):
+        broker_order.auxPrice = snap_price(broker_order.auxPrice, price_increments, buy)
+
+
+def snap_price(price: float, price_increments: list, round_up: bool):
+    """!
+    Snaps a price to a multiple of the increment for its price range.
+
+    @param price: The price to snap.
+    @param price_increments: A list of (low edge, increment), sorted by low edge.
+    @param round_up: Round up to the next increment instead of down.
+
+    @return price: The snapped price.
+    """
+    increment = price_increments[0][1]
+
+    for low_edge, edge_increment in price_increments:
+        if price >= low_edge:
+            increment = edge_increment
+
+    if increment <= 0:
+        return price
+
+    # The small tolerance keeps prices already on an increment from moving due to float error.
+    steps = price / increment
+
+    if round_up:
+        steps = math.ceil(steps - 1e-9)
+    else:
+        steps = math.floor(steps + 1e-9)
+
+    decimals = max(0, -math.floor(math.log10(increment))) + 2
+    return round(steps * increment, decimals)
@@ -0,0 +1,226 @@
+"""!@package pytrader.libs.positions
+
+Provides position and profit and loss tracking for strategies.
+
+@author G. S. Derber
+@date 2022-2023
+@copyright GNU Affero General Public License
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU Affero General Public License as
+    published by the Free Software Foundation, either version 3 of the
+    License, or (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU Affero General Public License for more details.
+
+    You should have received a copy of the GNU Affero General Public License
+    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+@file pytrader/libs/positions/__init__.py
+"""
+# Standard libraries
+
+# 3rd Party libraries
+
+# System Library Overrides
+from pytrader.libs.system import logging
+
+# Other Application Libraries
+
+# ==================================================================================================
+#
+# Global Variables
+#
+# ==================================================================================================
+logger = logging.getLogger(__name__)
+
+## Execution sides that add to a position.  Anything else reduces it.
+BUY_SIDES = ["BOT", "BUY"]
+
+
+# ==================================================================================================
+#
+# Classes
+#
+# ==================================================================================================
+class Position():
+    """!
+    A position in a single contract.
+    """
+
+    def __init__(self, ticker: str, multiplier: float = 1.0):
+        self.ticker = ticker
+        self.multiplier = multiplier
+
+        ## Signed quantity.  Negative for a short position.
+        self.quantity = 0.0
+        self.average_cost = 0.0
+        self.last_price = 0.0
+        self.realized_pnl = 0.0
+        self.unrealized_pnl = 0.0
+        self.commissions = 0.0
+
+    def __repr__(self):
+        return f"Position({self.ticker}: {self.quantity} @ {self.average_cost}, " \
+            f"Realized: {self.realized_pnl}, Unrealized: {self.unrealized_pnl})"
+
+    def add_fill(self, quantity: float, price: float):
+        """!
+        Updates the position with a fill.
+
+        @param quantity: Signed fill quantity.  Negative for sells.
+        @param price: The fill price.
+
+        @return None
+        """
+        if self.quantity == 0 or (self.quantity > 0) == (quantity > 0):
+            total_cost = self.average_cost * abs(self.quantity) + price * abs(quantity)
+            self.quantity += quantity
+            self.average_cost = total_cost / abs(self.quantity)
+        else:
+            closed = min(abs(quantity), abs(self.quantity))
+            direction = 1 if self.quantity > 0 else -1
+            self.realized_pnl += closed * (price - self.average_cost) * direction * self.multiplier
+            self.quantity += quantity
+
+            if self.quantity == 0:
+                self.average_cost = 0.0
+            elif (self.quantity > 0) != (direction > 0):
+                # The fill closed the position and opened one the other way.
+                self.average_cost = price
+
+        if self.last_price == 0.0:
+            self.last_price = price
+
+        self.mark(self.last_price)
+
+    def mark(self, price: float):
+        """!
+        Marks the position to market.
+
+        @param price: The current price of the contract.
+
+        @return change: The change in unrealized profit and loss.
+        """
+        self.last_price = price
+        unrealized_pnl = (price - self.average_cost) * self.quantity * self.multiplier
+        change = unrealized_pnl - self.unrealized_pnl
+        self.unrealized_pnl = unrealized_pnl
+        return change
+
+
+class PositionBook():
+    """!
+    Tracks a strategy's positions and profit and loss.
+
+    Totals are kept up to date as fills and prices arrive, so reading them never scans positions or
+    orders.
+    """
+
+    def __init__(self):
+        self.positions = {}
+        self.realized_pnl = 0.0
+        self.unrealized_pnl = 0.0
+        self.commissions = 0.0
+
+        ## Maps execution ids to tickers.  Used to ignore repeated executions and to match
+        ## commission reports.
+        self.executions = {}
+
+    def __contains__(self, ticker: str):
+        return ticker in self.positions
+
+    def __repr__(self):
+        return f"PositionBook(Realized: {self.realized_pnl}, Unrealized: {self.unrealized_pnl}, " \
+            f"Commissions: {self.commissions}, Positions: {list(self.positions.values())})"
+
+    def add_commission(self, exec_id: str, commission: float):
+        """!
+        Adds the commission for an execution.
+
+        @param exec_id: The execution the commission is for.
+        @param commission: The commission charged.
+
+        @return None
+        """
+        ticker = self.executions.get(exec_id)
+
+        if ticker is None:
+            logger.warning("Commission received for unknown execution: %s", exec_id)
+            return
+
+        self.positions[ticker].commissions += commission
+        self.commissions += commission
+
+    def add_execution(self, execution: dict):
+        """!
+        Adds an execution to its position.
+
+        @param execution: The execution, as sent by the broker.
+
+        @return None
+        """
+        if execution["exec_id"] in self.executions:
+            logger.debug3("Ignoring repeated execution: %s", execution["exec_id"])
+            return
+
+        ticker = execution["ticker"]
+        self.executions[execution["exec_id"]] = ticker
+
+        if ticker not in self.positions:
+            self.positions[ticker] = Position(ticker, execution.get("multiplier", 1.0))
+
+        position = self.positions[ticker]
+        quantity = execution["shares"]
+
+        if execution["side"] not in BUY_SIDES:
+            quantity = -quantity
+
+        realized_pnl = position.realized_pnl
+        unrealized_pnl = position.unrealized_pnl
+
+        position.add_fill(quantity, execution["price"])
+
+        self.realized_pnl += position.realized_pnl - realized_pnl
+        self.unrealized_pnl += position.unrealized_pnl - unrealized_pnl
+        logger.debug2("Position Updated: %s", position)
+
+    def get_position(self, ticker: str):
+        return self.positions.get(ticker)
+
+    def get_quantity(self, ticker: str):
+        if ticker in self.positions:
+            return self.positions[ticker].quantity
+        return 0.0
+
+    def get_realized_pnl(self, ticker: str = None):
+        if ticker is None:
+            return self.realized_pnl
+        elif ticker in self.positions:
+            return self.positions[ticker].realized_pnl
+        return 0.0
+
+    def get_unrealized_pnl(self, ticker: str = None):
+        if ticker is None:
+            return self.unrealized_pnl
+        elif ticker in self.positions:
+            return self.positions[ticker].unrealized_pnl
+        return 0.0
+
+    def get_total_pnl(self, ticker: str = None):
+        return self.get_realized_pnl(ticker) + self.get_unrealized_pnl(ticker)
+
+    def mark(self, ticker: str, price: float):
+        """!
+        Marks a position to market.
+
+        @param ticker: The contract's ticker.
+        @param price: The current price of the contract.
+
+        @return None
+        """
+        if ticker in self.positions and price > 0:
+            self.unrealized_pnl += self.positions[ticker].mark(price)
@@ -50,6 +50,18 @@ class BrokerNotAvailable(BrokerError):
     """
 
 
+class BrokerRequestError(BrokerError):
+    """!
+    Used when the broker returns an error for a request.
+    """
+
+    def __init__(self, req_id: int, code: int, msg: str):
+        super().__init__(msg)
+        self.req_id = req_id
+        self.code = code
+        self.msg = msg
+
+
 class BrokerWarning(Warning):
     """!
     Used for Broker Related Warnings
@@ -26,6 +26,9 @@ Provides the Base Class for a Strategy.
 """
 # System libraries
 import datetime
+import pickle
+import queue
+import time
 from abc import ABCMeta, abstractmethod
 from multiprocessing import Queue
 from threading import Event
@@ -34,7 +37,7 @@ from threading import Event
 from ibapi import contract
 # from pytrader.libs import contracts
 # Application Libraries
-from pytrader.libs import bars, ticks
+from pytrader.libs import bars, checkpoints, marketdata, options, orders, positions, ticks
 # System Library Overrides
 from pytrader.libs.system import logging
 
@@ -46,6 +49,68 @@ from pytrader.libs.system import logging
 ## The Base Logger
 logger = logging.getLogger(__name__)
 
+## Number of spans of history an indicator needs before its values settle.  Indicators not listed
+## need one span.
+INDICATOR_WARMUP_SPANS = {"adx": 2, "atr": 2, "dmi": 2, "ema": 3, "kvo": 3}
+
+## Tick types that change the price positions are marked at.
+MARK_TICK_TYPES = [1, 2, 4]
+
+## Maps each tick type id to the strategy function that handles it.
+TICK_HANDLERS = {
+    0: "on_bid_size",
+    1: "on_bid",
+    2: "on_ask",
+    3: "on_ask_size",
+    4: "on_last",
+    5: "on_last_size",
+    6: "on_high",
+    7: "on_low",
+    8: "on_volume",
+    9: "on_close",
+    10: "on_bid_option_computation",
+    11: "on_ask_option_computation",
+    12: "on_last_option_computation",
+    13: "on_model_option_computation",
+    14: "on_open",
+    15: "on_13week_low",
+    16: "on_13week_high",
+    17: "on_26week_low",
+    18: "on_26week_high",
+    19: "on_52week_low",
+    20: "on_52week_high",
+    21: "on_average_volume",
+    23: "on_option_historical_volatility",
+    24: "on_option_implied_volatility",
+    27: "on_option_call_open_interest",
+    28: "on_option_put_open_interest",
+    29: "on_option_call_volume",
+    30: "on_option_put_volume",
+    32: "on_bid_exchange",
+    33: "on_ask_exchange",
+    34: "on_auction_volume",
+    35: "on_auction_price",
+    36: "on_auction_imbalance",
+    37: "on_mark",
+    45: "on_last_timestamp",
+    46: "on_shortable",
+    48: "on_rt_volume",
+    49: "on_halt",
+    54: "on_trade_count",
+    55: "on_trade_rate",
+    56: "on_volume_per_minute",
+    57: "on_last_rth_trade",
+    59: "on_dividends",
+    63: "on_3min_volume",
+    64: "on_5min_volume",
+    65: "on_10min_volume",
+    84: "on_last_exchange",
+    77: "on_rt_trade_volume",
+    79: "on_creditman_slow_mark_price",
+    87: "on_average_option_volume",
+    89: "on_shortable_shares"
+}
+
 
 # ==================================================================================================
 #
@@ -73,23 +138,63 @@ class Strategy():
         self.use_options = False
         self.quantity = 0
         self.num_strikes = 0
+        self.strike_hysteresis = 2
         self.bar_sizes = []
         self.days_to_expiration = 0
 
+        ## Number of bars of history needed for each bar size.  Bar sizes not listed get the
+        ## broker's default history.
+        self.warmup_bars = {}
+        self.indicators = {}
+
         self.contracts = {}
         self.bars = {}
         self.ticks = {}
-        self.market_data = {}
+        self.market_data = marketdata.MarketDataSnapshot()
+        self.tick_handlers = {
+            tick_type: getattr(self, handler)
+            for tick_type, handler in TICK_HANDLERS.items()
+        }
+
+        ## Tick types or market data fields the strategy uses.  When None, they are found from the
+        ## 'on_*' functions the strategy defines.
+        self.tick_types = None
         self.orders = {}
         self.order_ids = {}
         self.order_prices = {}
+        ## Ids of orders with amendments held back by the amendment rate limit.
+        self.held_amendments = set()
 
         self.expirations = {}
-        self.all_strikes = {}
+        self.option_chains = {}
+        self.option_windows = {}
         self.strikes = {}
+        ## Option contracts outside the strike window that are kept for their working orders, as
+        ## (underlying, strike), keyed by contract name.
+        self.kept_options = {}
 
         self.long_position = []
         self.short_position = []
+        self.positions = positions.PositionBook()
+        ## Orders are sent on the order queue when the broker provides one, otherwise they share the
+        ## command queue.
+        self.order_queue = self.cmd_queue
+        self.order_factory = orders.OrderFactory(self.order_queue, self.strategy_id)
+
+        ## In warm-up mode the strategy only gathers contracts, option chains and bar history, saves
+        ## a checkpoint and ends.  No live data is requested and no orders are placed.
+        self.warmup_mode = False
+        ## Seconds to wait for warm-up data before giving up.
+        self.warmup_timeout = 900
+        self.warmup_start = 0
+
+        ## Set to False to neither load nor save checkpoints.
+        self.use_checkpoints = True
+        ## Seconds between checkpoints.  0 only saves a checkpoint when the strategy ends.
+        self.checkpoint_interval = 300
+        self.checkpoint_time = 0
+        ## Time each ticker's bar history is needed from, when restored from a checkpoint.
+        self.history_start = {}
 
     @abstractmethod
     def continue_strategy(self):
@@ -342,26 +447,19 @@ class Strategy():
         logger.debug10("Begin Function")
 
         try:
-            self._create_contracts()
-            self._send_contracts()
-
-            logger.debug9("Use Options: %s", self.use_options)
-            if self.use_options:
-                self._req_option_details()
+            self.start_strategy()
 
-            self._send_bar_sizes()
-            self._req_bar_history()
-            self._req_market_data()
-            self._req_real_time_bars()
-            # #self._req_tick_by_tick_data()
-
-            self.on_start()
+            timeout = self.warmup_timeout if self.warmup_mode else None
 
             continue_strategy = True
             while continue_strategy:
-                message = self.data_queue.get()
-                self._process_message(message)
-                continue_strategy = self.continue_strategy()
+                try:
+                    message = self.data_queue.get(timeout=timeout)
+                except queue.Empty:
+                    logger.error("%s: Timed out waiting for warm-up data", self.strategy_id)
+                    break
+
+                continue_strategy = self.process_message(message)
 
         except KeyboardInterrupt as msg:
             logger.critical("Received Keyboard Interupt! Ending Strategy '%s'.",
@@ -370,7 +468,118 @@ class Strategy():
         #     logger.critical("We fucked up: %s", msg)
 
         finally:
-            self.on_end()
+            self.end_strategy()
+
+    def start_strategy(self):
+        """!
+        Sends the initial requests to the broker and starts the strategy.
+
+        Used by 'run', and by a strategy host that runs several strategies in one process.
+        """
+        self._create_contracts()
+
+        if self.use_checkpoints:
+            self._restore_checkpoint()
+
+        self._send_contracts()
+
+        logger.debug9("Use Options: %s", self.use_options)
+        if self.use_options:
+            if all(ticker in self.option_chains for ticker in self.security):
+                for ticker, window in self.option_windows.items():
+                    self._create_option_contracts(ticker, window.strikes)
+            else:
+                self._req_option_details()
+
+            self._create_kept_option_contracts()
+
+        self._send_bar_sizes()
+        self._req_bar_history()
+        self.checkpoint_time = time.time()
+
+        if self.warmup_mode:
+            self.warmup_start = time.time()
+            return
+
+        self._send_tick_types()
+        self._req_market_data()
+        self._req_real_time_bars()
+        # #self._req_tick_by_tick_data()
+
+        self.on_start()
+
+    def process_message(self, message) -> bool:
+        """!
+        Processes a single message from the broker.
+
+        @param message: The message received from the broker.
+
+        @return continue_strategy: False once the strategy should end.
+        """
+        # Messages shared by several strategies arrive pickled once by the broker.
+        if isinstance(message, bytes):
+            message = pickle.loads(message)
+
+        self._process_message(message)
+
+        if self.held_amendments:
+            self._send_amendments()
+
+        if self.warmup_mode:
+            return not self._warmup_complete()
+
+        if self.use_checkpoints and self.checkpoint_interval > 0:
+            if time.time() - self.checkpoint_time >= self.checkpoint_interval:
+                self.save_checkpoint(background=True)
+
+        return self.continue_strategy()
+
+    def end_strategy(self):
+        """!
+        Ends the strategy.
+        """
+        if self.warmup_mode:
+            self.save_checkpoint()
+            return
+
+        self.on_end()
+
+        if self.use_checkpoints:
+            self.save_checkpoint()
+
+    def amend_order(self,
+                    order_id: int,
+                    price: float = None,
+                    stop_price: float = None,
+                    quantity: int = None):
+        """!
+        Changes a working order's prices or quantity without cancelling it.
+
+        @param order_id: The order to amend.
+        @param price: The new limit price.
+        @param stop_price: The new stop price.
+        @param quantity: The new quantity.
+
+        @return bool: False if the order can not be amended.
+        """
+        ticker = self.order_ids.get(order_id)
+
+        if ticker is None or order_id not in self.orders.get(ticker, {}):
+            logger.warning("Unable to amend unknown order: %s", order_id)
+            return False
+
+        working_order = self.orders[ticker][order_id]
+
+        if not working_order.amend(price, stop_price, quantity):
+            return False
+
+        if price is not None or stop_price is not None:
+            self.order_prices[order_id] = price if price is not None else stop_price
+
+        if working_order.has_amendment():
+            self.held_amendments.add(order_id)
+
+        return True
 
     def cancel_orders(self, order_id: int = 0):
         if order_id == 0:
@@ -378,48 +587,159 @@ class Strategy():
         else:
             logger.warning("Order Cancelation not implemented")
 
-    def select_options(self, ticker, tick):
-        if self.use_options:
-            if not self.strikes.get(ticker):
-                self.select_option_strikes(ticker, tick)
-                self._create_option_contracts(ticker)
+    def get_tick_types(self):
+        """!
+        Returns the tick types the strategy uses.
 
-                # Re-send requests to get data for options as well
-                self._send_bar_sizes()
-                self._req_bar_history()
-                self._req_market_data()
-                self._req_real_time_bars()
+        The price ticks in marketdata.BASE_TICK_TYPES are always included.
 
-    def select_option_strikes(self, ticker, price):
-        x = 0
-        y = 1
+        @return tick_types: A set of tick type ids.
+        """
+        if self.tick_types is not None:
+            return marketdata.get_tick_types(self.tick_types)
 
-        if ticker in self.security:
+        tick_types = set(marketdata.BASE_TICK_TYPES)
 
-            logger.debug9("Price: %s", str(price))
-            price_f = float(price)
+        for tick_type, handler in TICK_HANDLERS.items():
+            if getattr(type(self), handler) is not getattr(Strategy, handler):
+                tick_types.add(tick_type)
+
+        if type(self).on_news is not Strategy.on_news:
+            tick_types.add(marketdata.NEWS_TICK)
 
-            num_strikes = self.num_strikes // 2
+        return tick_types
 
-            strikes_len = len(self.all_strikes[ticker])
+    def open_long_position(self,
+                           ticker: str,
+                           order_type: str = "MKT",
+                           price: float = None,
+                           profit_target: float = None,
+                           stop_loss: float = None):
+        """!
+        Buys the strategy's quantity of a ticker, with an optional profit target and stop loss.
+
+        @return order_id: The parent order's id.
+        """
+        order_id = self._place_bracket(ticker, "BUY", order_type, price, profit_target, stop_loss)
+        self.long_position.append(ticker)
+        return order_id
+
+    def open_short_position(self,
+                            ticker: str,
+                            order_type: str = "MKT",
+                            price: float = None,
+                            profit_target: float = None,
+                            stop_loss: float = None):
+        """!
+        Sells short the strategy's quantity of a ticker, with an optional profit target and stop
+        loss.
+
+        @return order_id: The parent order's id.
+        """
+        order_id = self._place_bracket(ticker, "SELL", order_type, price, profit_target, stop_loss)
+        self.short_position.append(ticker)
+        return order_id
+
+    def register_indicator(self, bar_size: str, indicator: str, span: int):
+        """!
+        Registers an indicator the strategy calculates, so only the history it needs is requested.
+
+        @param bar_size: The bar size the indicator is calculated on.
+        @param indicator: The name of the indicator, e.g. 'ema'.
+        @param span: The indicator's span in bars.
+
+        @return None
+        """
+        if bar_size not in self.indicators:
+            self.indicators[bar_size] = []
+        self.indicators[bar_size].append((indicator, span))
+
+        bars_needed = span * INDICATOR_WARMUP_SPANS.get(indicator.lower(), 1) + 1
+        self.warmup_bars[bar_size] = max(self.warmup_bars.get(bar_size, 0), bars_needed)
+        logger.debug3("Warmup Bars for %s: %s", bar_size, self.warmup_bars[bar_size])
+
+    def set_order_queue(self, order_queue: Queue):
+        """!
+        Sends orders on a dedicated queue, so they do not wait behind other commands.
 
-            while y < strikes_len:
+        @param order_queue: The queue the broker reads this strategy's orders from.
+        """
+        self.order_queue = order_queue
+        self.order_factory.data_queue = order_queue
 
-                lower_price = float(self.all_strikes[ticker][x])
-                upper_price = float(self.all_strikes[ticker][y])
+    def set_shard(self, shard: int, shards: int):
+        """!
+        Limits the strategy to its share of the tickers when it runs as one of several shards.
 
-                if lower_price <= price_f <= upper_price:
-                    begin_ = x - num_strikes
-                    end_ = y + num_strikes
+        @param shard: The number of this shard.
+        @param shards: The total number of shards.
+        """
+        self.security = self.security[shard::shards]
+        logger.debug2("Shard %s of %s Tickers: %s", shard, shards, self.security)
 
-                    begin_ = max(begin_, 0)
-                    logger.debug9("All strikes for ticker: %s, %s", ticker,
-                                  self.all_strikes[ticker])
-                    self.strikes[ticker] = self.all_strikes[ticker][begin_:end_]
+    def save_checkpoint(self, background: bool = False):
+        """!
+        Saves the strategy's bars, option selections and orders, so a restart can continue from
+        them.
 
-                x += 1
-                y += 1
+        @param background: Save from a child process, so the strategy keeps processing messages.
+        """
+        saved_orders = {}
 
+        for local_symbol, symbol_orders in self.orders.items():
+            saved_orders[local_symbol] = {
+                order_id: (order_.contract, order_.order, order_.status)
+                for order_id, order_ in symbol_orders.items()
+            }
+
+        checkpoint = {
+            "bars": self.bars,
+            "expirations": self.expirations,
+            "option_chains": self.option_chains,
+            "option_windows": self.option_windows,
+            "strikes": self.strikes,
+            "kept_options": self.kept_options,
+            "orders": saved_orders,
+            "order_ids": self.order_ids,
+            "order_prices": self.order_prices,
+            "positions": self.positions
+        }
+        if background:
+            if not checkpoints.save_checkpoint_background(self.strategy_id, checkpoint):
+                return
+        else:
+            checkpoints.save_checkpoint(self.strategy_id, checkpoint)
+
+        self.checkpoint_time = time.time()
+
+    def select_options(self, ticker, tick):
+        if self.use_options and ticker in self.security and self.expirations.get(ticker):
+            if ticker not in self.option_windows:
+                self.option_windows[ticker] = options.OptionWindow(self.option_chains[ticker],
+                                                                   self.num_strikes,
+                                                                   self.strike_hysteresis)
+
+            added, removed = self.option_windows[ticker].update(tick)
+            self.strikes[ticker] = self.option_windows[ticker].strikes
+
+            if removed:
+                self._cancel_option_contracts(ticker, removed)
+
+            if added:
+                self._create_option_contracts(ticker, added)
+
+                # Re-send requests to get data for options as well.  The broker only requests data
+                # for contracts it does not already have.
+                self._send_bar_sizes()
+                self._req_bar_history()
+                self._req_market_data()
+                self._req_real_time_bars()
+
+    def select_option_strikes(self, ticker, price):
+        if ticker in self.security:
+            logger.debug9("Price: %s", str(price))
+            self.strikes[ticker] = self.option_chains[ticker].select_strikes(
+                price, self.num_strikes)
             logger.debug2("Selected Strikes for %s: %s", ticker, self.strikes[ticker])
 
     # ==============================================================================================
@@ -463,11 +783,77 @@ class Strategy():
 
         logger.debug9("Contracts: %s", self.contracts)
 
-    def _create_option_contracts(self, ticker):
+    def _cancel_option_contracts(self, ticker, strikes: list):
+        """!
+        Stops receiving data for option contracts that are no longer needed.
+
+        Contracts with working orders are kept until their last order ends.
+        """
+        tickers = []
+
+        for strike in strikes:
+            for right in ["CALL", "PUT"]:
+                contract_name = self._gen_option_contract_name(ticker, right, strike)
+
+                if self.orders.get(contract_name):
+                    logger.debug2("Keeping %s, it has working orders", contract_name)
+                    self.kept_options[contract_name] = (ticker, strike)
+                else:
+                    tickers.append(contract_name)
+
+        self._cancel_tickers(tickers)
+
+    def _cancel_tickers(self, tickers: list):
+        for contract_name in tickers:
+            self.contracts.pop(contract_name, None)
+            self.bars.pop(contract_name, None)
+
+        if tickers:
+            logger.debug2("Cancelling data for option contracts: %s", tickers)
+            message = {self.strategy_id: {"cancel": {"tickers": tickers}}}
+            self.cmd_queue.put(message)
+
+    def _release_kept_option(self, contract_name: str):
+        """!
+        Cancels an option contract kept outside the strike window once its last order has ended.
+        Contracts the window has moved back over are kept.
+        """
+        if contract_name not in self.kept_options or self.orders.get(contract_name):
+            return
+
+        ticker, strike = self.kept_options.pop(contract_name)
+
+        if strike not in self.strikes.get(ticker, []):
+            self._cancel_tickers([contract_name])
+
+    def _create_kept_option_contracts(self):
+        """!
+        Requests data again for the option contracts kept outside the strike window when the
+        strategy is restored from a checkpoint.  Their contracts are taken from their orders.
+        """
+        contracts = {}
+
+        for contract_name in list(self.kept_options):
+            kept_orders = self.orders.get(contract_name)
+
+            if not kept_orders:
+                self.kept_options.pop(contract_name)
+                continue
+
+            contracts[contract_name] = next(iter(kept_orders.values())).contract
+
+        if contracts:
+            logger.debug2("Requesting data for kept option contracts: %s", list(contracts))
+            self._send_contracts(contracts)
+
+    def _create_option_contracts(self, ticker, strikes: list = None):
         contracts = {}
 
+        if strikes is None:
+            strikes = self.strikes[ticker]
+
         if ticker in self.security:
-            for strike in self.strikes[ticker]:
+            for strike in strikes:
                 for right in ["CALL", "PUT"]:
                     contract_name = self._gen_option_contract_name(ticker, right, strike)
                     contracts[contract_name] = self._create_contract(ticker, "OPT", "SMART", "USD",
@@ -485,6 +871,95 @@ class Strategy():
         option_name = local_symbol + self.expirations[ticker][-6:] + right[0] + strike_str
         return option_name
 
+    def _warmup_complete(self):
+        """!
+        Checks if all the warm-up data has been received, or the warm-up has run out of time.
+        """
+        if time.time() - self.warmup_start > self.warmup_timeout:
+            logger.error("%s: Warm-up timed out", self.strategy_id)
+            return True
+
+        for ticker in self.security:
+            if not all(bar_size in self.bars.get(ticker, {}) for bar_size in self.bar_sizes):
+                return False
+
+            if self.use_options and ticker not in self.option_chains:
+                return False
+
+        logger.info("%s: Warm-up complete", self.strategy_id)
+        return True
+
+    def _restore_checkpoint(self):
+        checkpoint = checkpoints.load_checkpoint(self.strategy_id)
+
+        if checkpoint is None:
+            return
+
+        self.bars = checkpoint["bars"]
+        self.expirations = checkpoint["expirations"]
+        self.option_chains = checkpoint["option_chains"]
+        self.option_windows = checkpoint["option_windows"]
+        self.strikes = checkpoint["strikes"]
+        self.kept_options = checkpoint.get("kept_options", {})
+        self.order_ids = checkpoint["order_ids"]
+        self.order_prices = checkpoint["order_prices"]
+        self.positions = checkpoint.get("positions", self.positions)
+
+        for ticker, chain in self.option_chains.items():
+            options.option_chains.setdefault(ticker, chain)
+
+        for local_symbol, saved_orders in checkpoint["orders"].items():
+            self.orders[local_symbol] = {}
+
+            for order_id, (order_contract, broker_order, status) in saved_orders.items():
+                restored_order = orders.Order(self.order_queue, order_contract, self.strategy_id)
+                restored_order.order = broker_order
+                restored_order.set_status(status)
+                self.orders[local_symbol][order_id] = restored_order
+
+        # Only the bars since the checkpoint need to be requested.
+        for ticker, ticker_bars in self.bars.items():
+            self.history_start[ticker] = {
+                bar_size: checkpoint["timestamp"]
+                for bar_size in ticker_bars if bar_size in self.bar_sizes
+            }
+        logger.debug("%s: Restored from checkpoint", self.strategy_id)
+
+    def _mark_position(self, ticker):
+        """!
+        Marks a position at the bid/ask midpoint, or the last price when there is no quote.
+        """
+        bid = self.market_data.get(ticker, "bid")
+        ask = self.market_data.get(ticker, "ask")
+
+        if bid > 0 and ask > 0:
+            self.positions.mark(ticker, (bid + ask) / 2)
+        else:
+            self.positions.mark(ticker, self.market_data.get(ticker, "last"))
+
+    def _place_bracket(self, ticker, action, order_type, price, profit_target, stop_loss):
+        bracket = self.order_factory.create_bracket(self.contracts[ticker], self.next_order_id,
+                                                    action, order_type, self.quantity, price,
+                                                    profit_target, stop_loss)
+        self.next_order_id += len(bracket)
+
+        if ticker not in self.orders:
+            self.orders[ticker] = {}
+
+        prices = [price] + [child for child in (profit_target, stop_loss) if child is not None]
+
+        for bracket_order, order_price in zip(bracket, prices):
+            self.orders[ticker][bracket_order.order.orderId] = bracket_order
+            self.order_ids[bracket_order.order.orderId] = ticker
+            self.order_prices[bracket_order.order.orderId] = order_price
+
+        self.order_factory.send_bracket(bracket)
+        logger.info("%s %s order placed for %s, Quantity: %s, Price: %s, Profit Target: %s, "
+                    "Stop Loss: %s", action, order_type, ticker, self.quantity, price,
+                    profit_target, stop_loss)
+
+        return bracket[0].order.orderId
+
     def _process_5sec_rtb(self, bar_data):
         ticker, bar_size = self._process_bars(bar_data)
 
@@ -515,7 +990,10 @@ class Strategy():
             logger.debug8("%s: %s - %s Bars received", self.strategy_id, ticker, bar_size)
 
         if bar_size in list(self.bars[ticker].keys()):
-            self.bars[ticker][bar_size].append_bar(bar_list)
+            if bar_list and isinstance(bar_list[0], list):
+                self.bars[ticker][bar_size].merge_bars(bar_list)
+            else:
+                self.bars[ticker][bar_size].append_bar(bar_list)
         else:
             self.bars[ticker][bar_size] = bars.Bars(ticker, bar_size=bar_size, bar_list=bar_list)
             self.bars[ticker][bar_size].create_dataframe()
@@ -525,17 +1003,8 @@ class Strategy():
     def _process_contracts(self, contracts):
         self.contracts = contracts
 
-        for item in list(self.contracts.keys()):
-            self.market_data[item] = {
-                "bid": 0,
-                "ask": 0,
-                "last": 0,
-                "open": 0,
-                "high": 0,
-                "low": 0,
-                "close": 0,
-                "mark": 0
-            }
+        for item in self.contracts:
+            self.market_data.add_instrument(item)
 
     def _process_data(self, data: dict):
         if data.get("contracts"):
@@ -559,6 +1028,12 @@ class Strategy():
         if data.get("order_status"):
             logger.debug9("Processing Order Status")
             self._process_order_status(data["order_status"])
+        if data.get("order_execution"):
+            logger.debug9("Processing Order Execution")
+            self._process_order_execution(data["order_execution"])
+        if data.get("commission_report"):
+            logger.debug9("Processing Commission Report")
+            self._process_commission_report(data["commission_report"])
 
     def _process_message(self, message):
         if isinstance(message, dict):
@@ -589,114 +1064,7 @@ class Strategy():
 
         @return None
         """
-        func_map = {
-            0: self.on_bid_size,
-            1: self.on_bid,
-            2: self.on_ask,
-            3: self.on_ask_size,
-            4: self.on_last,
-            5: self.on_last_size,
-            6: self.on_high,
-            7: self.on_low,
-            8: self.on_volume,
-            9: self.on_close,
-            10: self.on_bid_option_computation,
-            11: self.on_ask_option_computation,
-            12: self.on_last_option_computation,
-            13: self.on_model_option_computation,
-            14: self.on_open,
-            15: self.on_13week_low,
-            16: self.on_13week_high,
-            17: self.on_26week_low,
-            18: self.on_26week_high,
-            19: self.on_52week_low,
-            20: self.on_52week_high,
-            21: self.on_average_volume,
-            23: self.on_option_historical_volatility,
-            24: self.on_option_implied_volatility,
-            27: self.on_option_call_open_interest,
-            28: self.on_option_put_open_interest,
-            29: self.on_option_call_volume,
-            30: self.on_option_put_volume,
-            32: self.on_bid_exchange,
-            33: self.on_ask_exchange,
-            34: self.on_auction_volume,
-            35: self.on_auction_price,
-            36: self.on_auction_imbalance,
-            37: self.on_mark,
-            45: self.on_last_timestamp,
-            46: self.on_shortable,
-            48: self.on_rt_volume,
-            49: self.on_halt,
-            54: self.on_trade_count,
-            55: self.on_trade_rate,
-            56: self.on_volume_per_minute,
-            57: self.on_last_rth_trade,
-            59: self.on_dividends,
-            63: self.on_3min_volume,
-            64: self.on_5min_volume,
-            65: self.on_10min_volume,
-            84: self.on_last_exchange,
-            77: self.on_rt_trade_volume,
-            79: self.on_creditman_slow_mark_price,
-            87: self.on_average_option_volume,
-            89: self.on_shortable_shares
-        }
-        data_map = {
-            0: "bid_size",
-            1: "bid",
-            2: "ask",
-            3: "ask_size",
-            4: "last",
-            5: "last_size",
-            6: "high",
-            7: "low",
-            8: "volume",
-            9: "close",
-            10: "bid_option_computation",
-            11: "ask_option_computation",
-            12: "last_option_computation",
-            13: "model_option_computation",
-            14: "open",
-            15: "13week_low",
-            16: "13week_high",
-            17: "26week_low",
-            18: "26week_high",
-            19: "52week_low",
-            20: "52week_high",
-            21: "average_volume",
-            23: "option_historical_volatility",
-            24: "option_implied_volatility",
-            27: "option_call_open_interest",
-            28: "option_put_open_interest",
-            29: "option_call_volume",
-            30: "option_put_volume",
-            32: "bid_exchange",
-            33: "ask_exchange",
-            34: "auction_volume",
-            35: "auction_price",
-            36: "auction_imbalance",
-            37: "mark",
-            45: "last_timestamp",
-            46: "shortable",
-            48: "rt_volume",
-            49: "halted",
-            54: "trade_count",
-            55: "trade_rate",
-            56: "volume_per_minute",
-            57: "last_rth_trade",
-            59: "dividends",
-            63: "3min_volume",
-            64: "5min_volume",
-            65: "10min_volume",
-            84: "last_exchange",
-            77: "rt_trade_volume",
-            79: "creditman_slow_mark_price",
-            87: "average_option_volume",
-            89: "shortable_shares"
-        }
-
-        logger.debug9("Func Map: %s", func_map)
+        func_map = self.tick_handlers
         logger.debug9("Tick Type ID: %s", market_data[1])
         logger.debug9("Broker Function: %s", func_map.get(market_data[1]))
 
@@ -718,21 +1086,23 @@ class Strategy():
         if market_data[1] == 14:
             # We really only want to run 'on_open' function one time, while we may received the data
             # multiple times.
-            if self.market_data[ticker]["open"] == 0:
-                self.market_data[ticker]["open"] = market_data[2]
+            if ticker in self.market_data and self.market_data.get(ticker, "open") == 0:
+                self.market_data.update(ticker, market_data[1], market_data[2])
                 func = func_map.get(market_data[1])
                 func(ticker, market_data[2])
-        elif market_data[1] in list(func_map.keys()):
+        elif market_data[1] in func_map:
             func = func_map.get(market_data[1])
             func(ticker, market_data[2])
 
             try:
-                self.market_data[ticker][data_map[market_data[1]]] = market_data[2]
-                logger.debug9("Market Data for ticker %s: %s", ticker, self.market_data[ticker])
+                self.market_data.update(ticker, market_data[1], market_data[2])
+
+                if market_data[1] in MARK_TICK_TYPES and ticker in self.positions:
+                    self._mark_position(ticker)
             except KeyError as msg:
-                logger.critical("Key Error: %s not in market_data dictionary for strategy: %s",
+                logger.critical("Key Error: %s not in market_data snapshot for strategy: %s",
                                 ticker, self.strategy_id)
-                logger.critical("Market Data Dictionary: %s", self.market_data)
+                logger.critical("Market Data Snapshot: %s", self.market_data)
                 logger.critical("Message: %s", msg)
 
         else:
@@ -742,12 +1112,23 @@ class Strategy():
     def _process_option_details(self, option_details):
         ticker = option_details["ticker"]
         details = option_details["details"]
-        expirations = list(details["expirations"])
-        strikes = list(details["strikes"])
-        expirations.sort()
-        strikes.sort()
-        self._select_expiration(ticker, expirations)
-        self.all_strikes[ticker] = strikes
+        self.option_chains[ticker] = options.get_option_chain(ticker, details)
+
+        if ticker in self.option_windows:
+            self.option_windows[ticker].set_chain(self.option_chains[ticker])
+
+        self._select_expiration(ticker)
+
+    def _process_commission_report(self, commission_report):
+        for report in commission_report.values():
+            self.positions.add_commission(report["exec_id"], report["commission"])
+
+    def _process_order_execution(self, order_execution):
+        for execution in order_execution.values():
+            self.positions.add_execution(execution)
+
+            if execution["ticker"] in self.market_data:
+                self._mark_position(execution["ticker"])
 
     def _process_order_status(self, order_status):
         logger.debug8("Order Status: %s", order_status)
@@ -767,6 +1148,8 @@ class Strategy():
             if status in ["Filled", "Cancelled", "ApiCancelled", "TWS_CLOSED"]:
                 self.orders[local_symbol].pop(order_id, None)
                 self.order_ids.pop(order_id, None)
+                self.held_amendments.discard(order_id)
+                self._release_kept_option(local_symbol)
             else:
                 if order_id in list(self.orders[local_symbol].keys()):
                     self.orders[local_symbol][order_id].set_status(status)
@@ -818,25 +1201,49 @@ class Strategy():
         message = {self.strategy_id: {"req": "tick_by_tick_data"}}
         self.cmd_queue.put(message)
 
-    def _select_expiration(self, ticker, expirations):
-        logger.debug9("Expirations List: %s", expirations)
-        min_expiry = datetime.datetime.today() + datetime.timedelta(days=self.days_to_expiration)
+    def _select_expiration(self, ticker):
+        expiry = self.option_chains[ticker].select_expiration(self.days_to_expiration)
 
-        # We want to make sure we are checking based on midnight of the day
-        min_expiry = datetime.datetime.combine(min_expiry, datetime.datetime.min.time())
-        logger.debug9("Earliest Expiry: %s", min_expiry)
+        if expiry is None:
+            logger.error("No expiration for %s at least %s days away", ticker,
+                         self.days_to_expiration)
+        else:
+            self.expirations[ticker] = expiry
+            logger.debug2("Expiry for %s: %s", ticker, expiry)
+
+    def _send_amendments(self):
+        """!
+        Sends the held amendments that the rate limit now allows.
+        """
+        for order_id in list(self.held_amendments):
+            ticker = self.order_ids.get(order_id)
+            working_order = self.orders.get(ticker, {}).get(order_id)
 
-        expiry_date = datetime.datetime(year=1970, month=1, day=1)
+            if working_order is None:
+                self.held_amendments.discard(order_id)
+                continue
 
-        while expiry_date < min_expiry:
-            item = expirations.pop(0)
-            expiry_date = datetime.datetime.strptime(item, "%Y%m%d")
-            self.expirations[ticker] = item
+            working_order.send_amendment()
 
-        logger.debug2("Expiry for %s: %s", ticker, expiry_date)
+            if not working_order.has_amendment():
+                self.held_amendments.discard(order_id)
 
     def _send_bar_sizes(self):
-        message = {self.strategy_id: {"set": {"bar_sizes": self.bar_sizes}}}
+        message = {
+            self.strategy_id: {
+                "set": {
+                    "bar_sizes": self.bar_sizes,
+                    "warmup_bars": self.warmup_bars,
+                    "history_start": self.history_start
+                }
+            }
+        }
+        self.cmd_queue.put(message)
+
+    def _send_tick_types(self):
+        tick_types = list(self.get_tick_types())
+        logger.debug2("%s: Tick Types: %s", self.strategy_id, tick_types)
+        message = {self.strategy_id: {"set": {"tick_types": tick_types}}}
         self.cmd_queue.put(message)
 
     def _send_contracts(self, contracts: dict = {}):
@@ -65,6 +65,10 @@ class Strategy(strategies.Strategy):
         self.days_to_expiration = 1
         self.num_strikes = 14
 
+        for bar_size in self.bar_sizes:
+            self.register_indicator(bar_size, "ema", self.short_period)
+            self.register_indicator(bar_size, "ema", self.long_period)
+
         self.endtime = datetime.datetime.combine(datetime.date.today(),
                                                  datetime.time(hour=15, minute=55))
 
@@ -94,6 +94,24 @@ def init(args):
                         help="Strategies to run.  If not specified no strategies will run.")
     parser.add_argument("-b", "--broker", choices=["twsapi"], default=BROKER_ID, help="Broker")
     parser.add_argument("-c", "--client-id", default=CLIENT_ID, help="Broker Client Id")
+    parser.add_argument("--warmup",
+                        action="store_true",
+                        help="Gather contracts, option chains and bar history for the strategies, "
+                        "save a checkpoint and exit.  Intended to be run before the market opens.")
+    parser.add_argument("--net-orders",
+                        type=float,
+                        default=0.0,
+                        metavar="SECONDS",
+                        help="Net market orders for the same contract across strategies, "
+                        "collecting them for this many seconds.")
+    strategy_mode = parser.add_mutually_exclusive_group()
+    strategy_mode.add_argument("--host-strategies",
+                               action="store_true",
+                               help="Run all strategies in one process sharing one data queue.")
+    strategy_mode.add_argument("--shards",
+                               type=int,
+                               default=1,
+                               help="Split each strategy's tickers across this many processes.")
 
     parser.set_defaults(debug=False, verbosity=0, loglevel='INFO')
 
@@ -115,7 +133,9 @@ def init(args):
                 address = broker_address(args, conf)
                 process_manager = trader.ProcessManager()
 
-                process_manager.run_processes(address, args.broker, args.client_id, args.strategies)
+                process_manager.run_processes(address, args.broker, args.client_id, args.strategies,
+                                              args.host_strategies, args.shards, args.warmup,
+                                              args.net_orders)
             except Exception as msg:
                 parser.print_help()
                 logger.critical(msg)
@@ -123,7 +143,9 @@ def init(args):
             logger.debug8("Starting Client")
             address = broker_address(args, conf)
             process_manager = trader.ProcessManager()
-            process_manager.run_processes(address, args.broker, args.client_id, args.strategies)
+            process_manager.run_processes(address, args.broker, args.client_id, args.strategies,
+                                          args.host_strategies, args.shards, args.warmup,
+                                          args.net_orders)
         return 0
 
     except argparse.ArgumentError as msg:
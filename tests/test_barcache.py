@@ -0,0 +1,116 @@
+"""!
+@package tests.test_barcache
+
+Tests merging and caching bar histories.
+
+@author G. S. Derber
+@date 2022-2023
+@copyright GNU Affero General Public License
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU Affero General Public License as
+    published by the Free Software Foundation, either version 3 of the
+    License, or (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU Affero General Public License for more details.
+
+    You should have received a copy of the GNU Affero General Public License
+    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+@file tests/test_barcache.py
+"""
+# Standard Libraries
+import datetime
+
+# 3rd Party Libraries
+
+# Application Libraries
+from pytrader.libs.applications.broker.common import barcache
+
+
+# ==================================================================================================
+#
+# Functions
+#
+# ==================================================================================================
+def make_bar(date, close: float):
+    return [date, close, close, close, close, 100.0, close, 10]
+
+
+def test_merge_bars_replaces_overlap():
+    cached_bars = [make_bar("20230103 09:30:00", 1.0), make_bar("20230103 09:31:00", 2.0)]
+    new_bars = [make_bar("20230103 09:31:00", 3.0), make_bar("20230103 09:32:00", 4.0)]
+
+    bar_list = barcache.merge_bars(cached_bars, new_bars)
+
+    # Trimmed to the length of the cached history.
+    assert [ohlc_bar[4] for ohlc_bar in bar_list] == [3.0, 4.0]
+
+
+def test_merge_bars_keeps_history_length():
+    cached_bars = [make_bar("2023010" + str(day), float(day)) for day in range(3, 7)]
+    new_bars = [make_bar("20230106", 7.0), make_bar("20230109", 8.0)]
+
+    bar_list = barcache.merge_bars(cached_bars, new_bars)
+
+    assert [ohlc_bar[0] for ohlc_bar in bar_list] == ["20230104", "20230105", "20230106",
+                                                        "20230109"]
+    assert bar_list[2][4] == 7.0
+
+
+def test_merge_bars_without_new_bars():
+    cached_bars = [make_bar("20230103", 1.0)]
+
+    assert barcache.merge_bars(cached_bars, []) is cached_bars
+
+
+def test_merge_bars_with_epoch_dates():
+    # Epoch seconds of different lengths would sort wrongly as strings.
+    cached_bars = [make_bar("999999960", 1.0), make_bar("999999990", 2.0)]
+    new_bars = [make_bar("1000000020", 3.0)]
+
+    bar_list = barcache.merge_bars(cached_bars, new_bars)
+
+    assert [ohlc_bar[4] for ohlc_bar in bar_list] == [2.0, 3.0]
+
+
+def test_get_history_start():
+    bar_list = [make_bar("20230103 09:30:00", 1.0), make_bar("20230104 15:59:00", 2.0)]
+
+    assert barcache.get_history_start(bar_list) == datetime.datetime(2023, 1, 4).timestamp()
+
+
+def test_get_history_start_with_epoch_dates():
+    last_time = datetime.datetime(2023, 1, 4, 15, 59)
+    bar_list = [make_bar(str(int(last_time.timestamp())), 1.0)]
+
+    assert barcache.get_history_start(bar_list) == datetime.datetime(2023, 1, 4).timestamp()
+
+
+def test_cache_round_trip(tmp_path):
+    cache = barcache.BarCache(str(tmp_path))
+    key = (1234, "1 min", "TRADES", True)
+    bar_list = [make_bar("20230103 09:30:00", 1.0), make_bar("20230103 09:31:00", 2.0)]
+
+    assert cache.get_bars(key, "1 D") is None
+
+    cache.save_bars(key, "1 D", bar_list)
+
+    assert cache.get_bars(key, "1 D") == bar_list
+    assert cache.get_bars(key, "2 D") is None
+    assert cache.get_bars((1234, "1 min", "TRADES", False), "1 D") is None
+
+
+def test_cache_keeps_date_formats(tmp_path):
+    cache = barcache.BarCache(str(tmp_path))
+    key = (1234, "1 min", "TRADES", True)
+
+    for bar_dates in [["20230103", "20230104"], ["20230103  09:30:00", "20230103  09:31:00"],
+                      ["20230103 09:30:00 US/Eastern", "20230103 09:31:00 US/Eastern"]]:
+        bar_list = [make_bar(bar_date, 1.0) for bar_date in bar_dates]
+        cache.save_bars(key, "1 D", bar_list)
+
+        assert cache.get_bars(key, "1 D") == bar_list
@@ -0,0 +1,157 @@
+"""!
+@package tests.test_lines
+
+Tests sharing market data lines between streams.
+
+@author G. S. Derber
+@date 2022-2023
+@copyright GNU Affero General Public License
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU Affero General Public License as
+    published by the Free Software Foundation, either version 3 of the
+    License, or (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU Affero General Public License for more details.
+
+    You should have received a copy of the GNU Affero General Public License
+    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+@file tests/test_lines.py
+"""
+# Standard Libraries
+
+# 3rd Party Libraries
+from ibapi.contract import Contract
+
+# Application Libraries
+from pytrader.libs.applications.broker.common.lines import LineManager
+from pytrader.libs.applications.broker.ibkr.tws.subjects import BrokerMarketData
+from pytrader.libs.events import MARKET_DATA_EVENT
+
+
+# ==================================================================================================
+#
+# Classes
+#
+# ==================================================================================================
+class FakeClient():
+
+    def __init__(self):
+        self.req_id = 0
+
+    def cancel_mkt_data(self, req_id: int):
+        pass
+
+    def req_market_data(self, _contract_: Contract, _generic_tick_list: str = ""):
+        self.req_id += 1
+        return self.req_id
+
+
+# ==================================================================================================
+#
+# Functions
+#
+# ==================================================================================================
+def make_contract(ticker: str, sec_type: str):
+    contract_ = Contract()
+    contract_.localSymbol = ticker
+    contract_.secType = sec_type
+    return contract_
+
+
+def make_manager(max_lines: int, evict: bool = False):
+    """!
+    Returns a line manager and the list of (action, ticker) calls made to its handlers.
+    """
+    calls = []
+    line_manager = LineManager(max_lines, evict)
+    line_manager.set_handlers("mkt", lambda ticker: calls.append(("start", ticker)),
+                              lambda ticker: calls.append(("stop", ticker)))
+    return line_manager, calls
+
+
+def test_grants_lines_within_budget():
+    line_manager, calls = make_manager(2)
+
+    assert line_manager.request("mkt", "AAA", "STK")
+    assert line_manager.request("mkt", "BBB", "STK")
+
+    # A stream holds one line however often it is requested.
+    assert line_manager.request("mkt", "AAA", "STK")
+    assert calls == [("start", "AAA"), ("start", "BBB")]
+
+
+def test_queues_requests_over_budget_without_eviction():
+    line_manager, calls = make_manager(1)
+    line_manager.request("mkt", "AAA", "OPT")
+
+    assert not line_manager.request("mkt", "BBB", "STK")
+    assert ("mkt", "BBB") in line_manager.pending
+    assert calls == [("start", "AAA")]
+
+
+def test_evicts_least_recently_used_lower_priority_stream():
+    line_manager, calls = make_manager(2, evict=True)
+    line_manager.request("mkt", "OPT1", "OPT")
+    line_manager.request("mkt", "OPT2", "OPT")
+    line_manager.touch("mkt", "OPT1")
+
+    assert line_manager.request("mkt", "AAA", "STK")
+    assert calls[2:] == [("stop", "OPT2"), ("start", "AAA")]
+    assert ("mkt", "OPT2") in line_manager.pending
+
+
+def test_does_not_evict_equal_priority_stream():
+    line_manager, calls = make_manager(1, evict=True)
+    line_manager.request("mkt", "AAA", "STK")
+
+    assert not line_manager.request("mkt", "BBB", "STK")
+    assert calls == [("start", "AAA")]
+
+
+def test_release_grants_highest_priority_then_oldest():
+    line_manager, calls = make_manager(1)
+    line_manager.request("mkt", "AAA", "STK")
+    line_manager.request("mkt", "OPT1", "OPT")
+    line_manager.request("mkt", "BBB", "STK")
+    line_manager.request("mkt", "CCC", "STK")
+
+    line_manager.release("mkt", "AAA")
+    line_manager.release("mkt", "BBB")
+
+    assert calls == [("start", "AAA"), ("start", "BBB"), ("start", "CCC")]
+    assert list(line_manager.pending) == [("mkt", "OPT1")]
+
+
+def test_release_of_queued_stream_removes_it():
+    line_manager, calls = make_manager(1)
+    line_manager.request("mkt", "AAA", "STK")
+    line_manager.request("mkt", "BBB", "STK")
+
+    line_manager.release("mkt", "BBB")
+    line_manager.release("mkt", "AAA")
+
+    assert calls == [("start", "AAA")]
+    assert len(line_manager.lines) == 0
+    assert len(line_manager.pending) == 0
+
+
+def test_evicted_stream_has_no_price():
+    line_manager = LineManager(1, evict=True)
+    mkt_data = BrokerMarketData(line_manager=line_manager)
+    mkt_data.brokerclient = FakeClient()
+    mkt_data.contracts = {"OPT1": make_contract("OPT1", "OPT"), "AAA": make_contract("AAA", "STK")}
+
+    line_manager.request(MARKET_DATA_EVENT, "OPT1", "OPT")
+    mkt_data.send_market_data_ticks({1: ["tick_price", 1, 1.0]})
+    mkt_data.send_market_data_ticks({1: ["tick_price", 2, 1.2]})
+    assert mkt_data.get_price("OPT1") == 1.1
+
+    line_manager.request(MARKET_DATA_EVENT, "AAA", "STK")
+
+    assert mkt_data.get_price("OPT1") is None
+    assert "OPT1" not in mkt_data.quotes
@@ -0,0 +1,233 @@
+"""!
+@package tests.test_netting
+
+Tests netting market orders across strategies.
+
+@author G. S. Derber
+@date 2022-2023
+@copyright GNU Affero General Public License
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU Affero General Public License as
+    published by the Free Software Foundation, either version 3 of the
+    License, or (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU Affero General Public License for more details.
+
+    You should have received a copy of the GNU Affero General Public License
+    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+@file tests/test_netting.py
+"""
+# Standard Libraries
+import threading
+
+# 3rd Party Libraries
+from ibapi.contract import Contract
+from ibapi.order import Order
+
+# Application Libraries
+from pytrader.libs.applications.broker.common.orders import OrderNetting
+
+## The netting key of the contract used by every test.
+KEY = ("SPY", "STK")
+
+
+# ==================================================================================================
+#
+# Functions
+#
+# ==================================================================================================
+def make_netting(price: float = 100.0, window: float = 0.01):
+    """!
+    Returns order netting and the lists of orders it placed and messages it sent.
+    """
+    placed = []
+    messages = []
+    netting = OrderNetting(window, lambda order_request, strategy_id: placed.append(
+        (order_request["order"], strategy_id)), messages.append, lambda ticker: price)
+    return netting, placed, messages
+
+
+def make_request(order_id: int, action: str, quantity: float):
+    contract_ = Contract()
+    contract_.localSymbol = KEY[0]
+    contract_.secType = KEY[1]
+
+    new_order = Order()
+    new_order.orderId = order_id
+    new_order.action = action
+    new_order.orderType = "MKT"
+    new_order.totalQuantity = quantity
+    return {"order": new_order, "contract": contract_}
+
+
+def wait_for_window():
+    """!
+    Waits for the netting windows that are open to close and their orders to be netted.
+    """
+    for thread in threading.enumerate():
+        if isinstance(thread, threading.Timer):
+            thread.join()
+
+
+def get_messages(messages: list, message_type: str):
+    """!
+    Returns the (id, message) of each message of a type.
+    """
+    return [
+        list(message[message_type].items())[0] for message in messages if message_type in message
+    ]
+
+
+def test_opposing_orders_cross_at_price():
+    netting, placed, messages = make_netting()
+    netting.add_order(make_request(1, "BUY", 10), "strategy_a")
+    netting.add_order(make_request(2, "SELL", 4), "strategy_b")
+
+    wait_for_window()
+
+    assert len(placed) == 1
+    assert placed[0][0].orderId == 1
+    assert placed[0][0].action == "BUY"
+    assert placed[0][0].totalQuantity == 6
+    assert placed[0][1] == "strategy_a"
+
+    executions = get_messages(messages, "order_execution")
+    assert [(order_id, execution["shares"], execution["price"])
+            for order_id, execution in executions] == [(1, 4, 100.0), (2, 4, 100.0)]
+
+    statuses = get_messages(messages, "order_status")
+    assert statuses == [(2, statuses[0][1])]
+    assert statuses[0][1]["status"] == "Filled"
+    assert statuses[0][1]["average_fill_price"] == 100.0
+
+
+def test_orders_placed_separately_without_price():
+    netting, placed, messages = make_netting(None)
+    netting.add_order(make_request(1, "BUY", 10), "strategy_a")
+    netting.add_order(make_request(2, "SELL", 4), "strategy_b")
+
+    wait_for_window()
+
+    assert [(new_order.orderId, new_order.totalQuantity) for new_order, _ in placed] == [(1, 10),
+                                                                                         (2, 4)]
+    assert not messages
+
+
+def test_executions_allocated_oldest_first():
+    netting, placed, messages = make_netting()
+    netting.add_order(make_request(1, "BUY", 5), "strategy_a")
+    netting.add_order(make_request(2, "BUY", 3), "strategy_b")
+    wait_for_window()
+
+    assert placed[0][0].totalQuantity == 8
+
+    assert netting.allocate(
+        {"order_execution": {
+            1: {
+                "exec_id": "E1",
+                "shares": 6,
+                "price": 101.0
+            }
+        }})
+
+    executions = get_messages(messages, "order_execution")
+    assert [(order_id, execution["exec_id"], execution["shares"])
+            for order_id, execution in executions] == [(1, "E1.1", 5), (2, "E1.2", 1)]
+
+    # The first order is filled; the second is still working.
+    assert [(order_id, status["status"])
+            for order_id, status in get_messages(messages, "order_status")] == [(1, "Filled")]
+    assert 1 in netting.net_orders
+
+
+def test_commission_split_per_share():
+    netting, _, messages = make_netting()
+    netting.add_order(make_request(1, "BUY", 5), "strategy_a")
+    netting.add_order(make_request(2, "BUY", 3), "strategy_b")
+    wait_for_window()
+    netting.allocate({"order_execution": {1: {"exec_id": "E1", "shares": 8, "price": 101.0}}})
+
+    assert netting.allocate({
+        "commission_report": {
+            "E1": {
+                "commission": 4.0,
+                "currency": "USD",
+                "realized_pnl": 8.0
+            }
+        }
+    })
+
+    commissions = get_messages(messages, "commission_report")
+    assert [(exec_id, report["commission"], report["realized_pnl"])
+            for exec_id, report in commissions] == [("E1.1", 2.5, 5.0), ("E1.2", 1.5, 3.0)]
+    assert "E1" not in netting.commissions
+
+
+def test_repeated_final_messages_discarded():
+    netting, _, messages = make_netting()
+    netting.add_order(make_request(1, "BUY", 5), "strategy_a")
+    netting.add_order(make_request(2, "BUY", 3), "strategy_b")
+    wait_for_window()
+
+    filled = {"order_status": {1: {"status": "Filled"}}}
+    assert netting.allocate(filled)
+    assert netting.allocate({"order_execution": {1: {"exec_id": "E1", "shares": 8, "price": 1.0}}})
+
+    assert not netting.net_orders
+    assert not netting.netted
+    assert 1 in netting.ended_orders
+
+    sent = len(messages)
+    assert netting.allocate(filled)
+    assert netting.allocate({"order_execution": {1: {"exec_id": "E1", "shares": 8, "price": 1.0}}})
+    assert len(messages) == sent
+
+
+def test_netted_messages_not_allocated_again():
+    netting, _, _ = make_netting()
+    netting.add_order(make_request(1, "BUY", 5), "strategy_a")
+    netting.add_order(make_request(2, "BUY", 3), "strategy_b")
+    wait_for_window()
+
+    assert not netting.allocate({"order_status": {1: {"status": "Filled", "netted": True}}})
+    assert not netting.allocate({"order_status": {7: {"status": "Filled"}}})
+
+
+def test_cancel_during_window():
+    netting, placed, messages = make_netting(window=0.5)
+    netting.add_order(make_request(1, "BUY", 5), "strategy_a")
+    netting.add_order(make_request(2, "SELL", 5), "strategy_b")
+
+    assert netting.cancel_order(2)
+    assert [(order_id, status["status"])
+            for order_id, status in get_messages(messages, "order_status")] == [(2, "Cancelled")]
+
+    wait_for_window()
+
+    # Only the remaining order is placed, uncrossed.
+    assert [(new_order.orderId, new_order.totalQuantity) for new_order, _ in placed] == [(1, 5)]
+    assert not netting.cancel_order(3)
+
+
+def test_netted_order_can_not_be_cancelled():
+    netting, _, _ = make_netting()
+    netting.add_order(make_request(1, "BUY", 5), "strategy_a")
+    netting.add_order(make_request(2, "BUY", 3), "strategy_b")
+    wait_for_window()
+
+    assert netting.cancel_order(2)
+    assert 2 in netting.netted
+
+
+def test_only_standalone_market_orders_netted():
+    netting, _, _ = make_netting()
+    order_request = make_request(1, "BUY", 5)
+    order_request["order"].orderType = "LMT"
+
+    assert not netting.add_order(order_request, "strategy_a")
+    assert not netting.intents
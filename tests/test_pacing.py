@@ -0,0 +1,168 @@
+"""!
+@package tests.test_pacing
+
+Tests the historical data pacing rules and scheduler.
+
+@author G. S. Derber
+@date 2022-2023
+@copyright GNU Affero General Public License
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU Affero General Public License as
+    published by the Free Software Foundation, either version 3 of the
+    License, or (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU Affero General Public License for more details.
+
+    You should have received a copy of the GNU Affero General Public License
+    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+@file tests/test_pacing.py
+"""
+# Standard Libraries
+import threading
+import time
+
+# 3rd Party Libraries
+
+# Application Libraries
+from pytrader.libs.clients.broker.ibkr.tws import pacing
+
+
+# ==================================================================================================
+#
+# Functions
+#
+# ==================================================================================================
+def send_to(sent: list, req_id: int):
+    event = threading.Event()
+
+    def send():
+        sent.append(req_id)
+        event.set()
+
+    return send, event
+
+
+def test_rule_allows_requests_up_to_limit():
+    rule = pacing.PacingRule(2, 10)
+
+    assert rule.next_allowed("key", 0) == 0
+    rule.record("key", 0)
+    rule.record("key", 1)
+
+    assert rule.next_allowed("key", 2) == 10
+    assert rule.next_allowed("other", 2) == 2
+
+
+def test_rule_forgets_requests_outside_window():
+    rule = pacing.PacingRule(1, 10)
+    rule.record("key", 0)
+
+    assert rule.next_allowed("key", 10) == 10
+    assert "key" not in rule.history
+
+
+def test_scheduler_sends_request_and_records_sent_time():
+    scheduler = pacing.PacingScheduler()
+    sent = []
+    send, event = send_to(sent, 1)
+
+    scheduler.submit(1, send, ("identical", ), ("contract", ))
+
+    assert event.wait(1)
+    assert sent == [1]
+    assert scheduler.get_sent_time(1) is not None
+
+    scheduler.complete(1)
+    assert scheduler.get_sent_time(1) is None
+
+
+def test_scheduler_holds_identical_request_without_blocking_others():
+    scheduler = pacing.PacingScheduler()
+    scheduler.identical_rule = pacing.PacingRule(1, 0.3)
+    sent = []
+    first, first_event = send_to(sent, 1)
+    identical, identical_event = send_to(sent, 2)
+    other, other_event = send_to(sent, 3)
+
+    scheduler.submit(1, first, ("identical", ), ("contract", ))
+    assert first_event.wait(1)
+    scheduler.submit(2, identical, ("identical", ), ("contract", ))
+    scheduler.submit(3, other, ("other", ), ("contract", ))
+
+    assert other_event.wait(1)
+    assert sent == [1, 3]
+    assert scheduler.get_sent_time(2) is None
+
+    assert identical_event.wait(1)
+    assert sent == [1, 3, 2]
+
+
+def test_scheduler_survives_failed_send():
+    errors = []
+    scheduler = pacing.PacingScheduler(lambda req_id, error: errors.append((req_id, str(error))))
+    sent = []
+    send, event = send_to(sent, 2)
+
+    def fail():
+        raise OSError("Not connected")
+
+    scheduler.submit(1, fail, ("first", ), ("contract", ))
+    scheduler.submit(2, send, ("second", ), ("contract", ))
+
+    assert event.wait(1)
+    assert errors == [(1, "Not connected")]
+    assert 1 not in scheduler.requests
+
+
+def test_scheduler_cancel():
+    scheduler = pacing.PacingScheduler()
+    scheduler.backoff_until = time.monotonic() + 60
+    sent = []
+    send, _ = send_to(sent, 1)
+
+    scheduler.submit(1, send, ("identical", ), ("contract", ))
+
+    # A request waiting to be sent does not need to be cancelled with TWS.
+    assert scheduler.cancel(1) is False
+    assert len(scheduler.pending) == 0
+
+    scheduler.backoff_until = 0.0
+    scheduler.submit(2, send_to(sent, 2)[0], ("identical", ), ("contract", ))
+    deadline = time.monotonic() + 1
+
+    while scheduler.get_sent_time(2) is None and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+    assert scheduler.cancel(2) is True
+    assert 2 not in scheduler.requests
+    assert sent == [2]
+
+
+def test_scheduler_retry_backs_off(monkeypatch):
+    monkeypatch.setattr(pacing, "BACKOFF", 0.2)
+    scheduler = pacing.PacingScheduler()
+    sent = []
+    event = threading.Event()
+
+    def send():
+        sent.append(time.monotonic())
+
+        if len(sent) == 2:
+            event.set()
+
+    scheduler.submit(1, send, ("identical", ), ("contract", ), paced=False)
+    deadline = time.monotonic() + 1
+
+    while not sent and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+    assert scheduler.retry(1) is True
+    assert scheduler.get_sent_time(1) is None
+    assert event.wait(1)
+    assert sent[1] - sent[0] >= 0.2
+    assert scheduler.retry(99) is False
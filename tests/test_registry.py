@@ -0,0 +1,104 @@
+"""!
+@package tests.test_registry
+
+Tests tracking request results as futures.
+
+@author G. S. Derber
+@date 2022-2023
+@copyright GNU Affero General Public License
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU Affero General Public License as
+    published by the Free Software Foundation, either version 3 of the
+    License, or (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU Affero General Public License for more details.
+
+    You should have received a copy of the GNU Affero General Public License
+    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+@file tests/test_registry.py
+"""
+# Standard Libraries
+from concurrent import futures
+
+# 3rd Party Libraries
+import pytest
+
+# Application Libraries
+from pytrader.libs.clients.broker.ibkr.tws import registry
+from pytrader.libs.utilities.exceptions import BrokerRequestError
+
+
+# ==================================================================================================
+#
+# Functions
+#
+# ==================================================================================================
+def test_set_result():
+    requests = registry.RequestRegistry()
+    future = requests.create(1)
+
+    assert requests.set_result(1, ["bar"])
+    assert future.result(0) == ["bar"]
+    assert requests.pop(1) is future
+    assert requests.get_future(1) is None
+
+
+def test_result_is_set_once():
+    requests = registry.RequestRegistry()
+    future = requests.create(1)
+
+    assert requests.set_result(1, "first")
+    assert not requests.set_result(1, "second")
+    assert not requests.set_exception(1, BrokerRequestError(1, 162, "Error"))
+    assert future.result(0) == "first"
+
+
+def test_set_exception():
+    requests = registry.RequestRegistry()
+    future = requests.create(1)
+
+    assert requests.set_exception(1, BrokerRequestError(1, 162, "No data"))
+
+    with pytest.raises(BrokerRequestError):
+        future.result(0)
+
+
+def test_unknown_request():
+    requests = registry.RequestRegistry()
+
+    assert not requests.set_result(1, "data")
+    assert not requests.cancel(1)
+    assert requests.pop(1) is None
+
+
+def test_cancel_discards_late_result():
+    requests = registry.RequestRegistry()
+    future = requests.create(1)
+
+    assert requests.cancel(1)
+    assert future.cancelled()
+    assert not requests.set_result(1, "late")
+    assert requests.get_future(1) is None
+
+    with pytest.raises(futures.CancelledError):
+        future.result(0)
+
+
+def test_uncollected_results_expire(monkeypatch):
+    requests = registry.RequestRegistry()
+    requests.create(1)
+    requests.set_result(1, "data")
+    requests.create(2)
+
+    monkeypatch.setattr(registry, "RESULT_TTL", -1)
+    requests.create(3)
+
+    # Only done requests expire.
+    assert requests.get_future(1) is None
+    assert requests.get_future(2) is not None
+    assert requests.get_future(3) is not None